@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -55,14 +56,51 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.LoadSheddingMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.PathDispatchMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Run by 'PathDispatchMiddleware' for every path outside SESSION_FREE_PATHS
+SESSION_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Token-authenticated API and probes never use sessions, CSRF or messages
+SESSION_FREE_PATHS = ['/api/', '/health/']
+
+# The admin's required middleware is in SESSION_MIDDLEWARE instead
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
+LOAD_SHEDDING = {
+    # Seconds a request may queue before Django, by view priority
+    'MAX_QUEUE_DELAY': {'critical': 10, 'read': 3, 'write': 2, 'bulk': 1},
+    # The proxy's uwsgi_read_timeout, later responses are never seen
+    'TIMEOUT': 60,
+    # Concurrent requests per process, uWSGI's --threads, 0 for no limit
+    'MAX_IN_FLIGHT': int(os.environ.get('LOAD_SHEDDING_MAX_IN_FLIGHT', 8)),
+}
+
+JOBS = {
+    # Jobs each run_worker process runs at once, in threads
+    'CONCURRENCY': int(os.environ.get('JOBS_CONCURRENCY', 4)),
+    # Seconds an idle worker waits before looking for jobs again
+    'POLL_INTERVAL': 1,
+    # Seconds before the first retry of a failed job, doubling up to max
+    'RETRY_DELAY': 10,
+    'RETRY_MAX_DELAY': 3600,
+    # Seconds between heartbeats of running jobs, and without one after
+    # which a job's worker is presumed dead
+    'HEARTBEAT_INTERVAL': 30,
+    'STALE_AFTER': 300,
+    # Days finished jobs are kept for the admin
+    'KEEP_DAYS': 7,
+}
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -97,6 +135,44 @@ DATABASES = {
     }
 }
 
+# Read replicas for safe recipe API requests, i.e. 'replica0', 'replica1'
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))
+):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a user reads from the primary after writing
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.environ.get('DB_REPLICA_PIN_SECONDS', 5)
+)
+# Replicas lagging further behind (in seconds) aren't read from
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 2))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Shared between uWSGI workers when REDIS_URL is set, else per process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -135,11 +211,76 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/static/'
-MEDIA_URL = '/static/media/'
+# Served by core.views.MediaView to the owners of the images only
+MEDIA_URL = '/api/media/'
 
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Internal nginx location sending media files once the app authorized the
+# request, see proxy/default.conf.tpl. The app sends them itself if empty.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '' if DEBUG else '/protected-media/'
+)
+
+# Uploads are named by content hash, shared and reference counted
+DEFAULT_FILE_STORAGE = 'core.images.ContentAddressedStorage'
+# Seconds an unreferenced image is kept before deletion, covering the
+# time between an upload and saving the object referencing it
+IMAGE_COLLECT_AFTER = 3600
+
+# Limits of uploaded images, the size and pixels are checked before
+# decoding them. Images are shrunk to MAX_DIMENSION pixels a side.
+IMAGE_UPLOADS = {
+    'MAX_SIZE': 20 * 1024 * 1024,
+    'MAX_PIXELS': 25_000_000,
+    'MAX_DIMENSION': 4096,
+}
+
+# Recipe images resized on request to one of SIZES (fitting within the
+# width and height), cached under MEDIA_ROOT evicting the least recently
+# used beyond MAX_BYTES
+RESIZED_IMAGES = {
+    'SIZES': ['160x160', '320x320', '640x480', '1280x960'],
+    'MAX_BYTES': int(
+        os.environ.get('RESIZED_IMAGES_MAX_BYTES', 1024 * 1024 * 1024)
+    ),
+    # Share of MAX_BYTES evictions free the cache down to, so the next
+    # one only runs once the rest was filled again
+    'LOW_WATER': 0.9,
+}
+
+# Object storage for uploads when S3_BUCKET is set, i.e. MinIO locally
+AWS_STORAGE_BUCKET_NAME = os.environ.get('S3_BUCKET')
+if AWS_STORAGE_BUCKET_NAME:
+    DEFAULT_FILE_STORAGE = 'storages.backends.s3.S3Storage'
+    AWS_S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    AWS_S3_REGION_NAME = os.environ.get('S3_REGION')
+    AWS_S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY')
+    AWS_S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_KEY')
+    AWS_S3_SIGNATURE_VERSION = 's3v4'
+    AWS_S3_FILE_OVERWRITE = False
+
+# Images uploaded by clients straight to the bucket (needs S3_BUCKET)
+DIRECT_UPLOADS = {
+    # Where clients reach the bucket, if not at S3_ENDPOINT_URL
+    'ENDPOINT_URL': os.environ.get('S3_PUBLIC_ENDPOINT_URL'),
+    'MAX_SIZE': 20 * 1024 * 1024,
+    # Seconds an upload URL is valid, below IMAGE_COLLECT_AFTER
+    'EXPIRE_AFTER': 900,
+}
+
+RESUMABLE_UPLOADS = {
+    # Parts of uploads in progress, outside the publicly served media
+    'DIR': os.environ.get('RESUMABLE_UPLOADS_DIR', '/vol/uploads'),
+    'MAX_SIZE': 20 * 1024 * 1024,
+    # Seconds after creation an upload and its part are deleted
+    'EXPIRE_AFTER': 24 * 3600,
+}
+
+# Hashed file names plus '.gz'/'.br' siblings, written by collectstatic
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -153,8 +294,55 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TokenBucketThrottle',
+    ),
+    # Per user, or per IP address for anonymous requests
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+        'read': os.environ.get('THROTTLE_READ_RATE', '600/min'),
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '120/min'),
+    },
+    # Proxies in front of the app adding to X-Forwarded-For. nginx passes
+    # the client's address as REMOTE_ADDR, so the header is ignored
+    'NUM_PROXIES': int(os.environ.get('THROTTLE_NUM_PROXIES', 0)),
 }
 
+# Seconds delta sync tokens trail the clock, covering transactions still
+# in flight and clock skew between app servers
+SYNC_TOKEN_MARGIN = 5
+# Days tombstones of deleted objects are kept, clients that synced before
+# get all their data again
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+# 'postgres' sends recipe change events between app servers with
+# LISTEN/NOTIFY, 'local' only within a process
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'postgres')
+# Seconds between keepalives on event streams, and before a stream ends
+# so its client reconnects, freeing threads of vanished clients
+EVENTS_HEARTBEAT = 15
+EVENTS_MAX_STREAM_SECONDS = 300
+# Streams each process serves at once, each holds one of uWSGI's
+# --threads, the rest are kept for API requests
+EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', 4))
+
+# Share identical concurrent recipe API reads between workers through the
+# cache too, not just between threads of a worker (needs REDIS_URL)
+COALESCE_ACROSS_WORKERS = bool(int(
+    os.environ.get('COALESCE_ACROSS_WORKERS', 0)
+))
+
+# Throttle buckets are kept in Redis if set, else in the uWSGI cache
+THROTTLE_REDIS_URL = os.environ.get('REDIS_URL')
+THROTTLE_UWSGI_CACHE = 'throttle'
+# Seconds a throttle check waits for Redis before using process memory
+THROTTLE_REDIS_TIMEOUT = float(os.environ.get('THROTTLE_REDIS_TIMEOUT', 0.1))
+# Buckets kept in process memory, the least recently used are dropped
+THROTTLE_LOCAL_MAX_BUCKETS = 10000
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# Prebuilt with 'python manage.py spectacular --file schema.yml'
+API_SCHEMA_FILE = BASE_DIR / 'schema.yml'
@@ -13,29 +13,31 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
-from django.conf import settings
+
+from core import views as core_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('health/live/', core_views.liveness_view, name='health-live'),
+    path('health/ready/', core_views.readiness_view, name='health-ready'),
     path(
-        'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='api-schema'),
-        name='api=docs'
+        'health/metrics/', core_views.MetricsView.as_view(),
+        name='health-metrics',
     ),
+    path('api/schema/', core_views.schema_view, name='api-schema'),
+    path('api/docs/', core_views.swagger_ui_view, name='api=docs'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path(
+        'api/media/recipe/<int:pk>/<int:width>x<int:height>.<str:fmt>',
+        core_views.ResizedRecipeImageView.as_view(),
+        name='resized-recipe-image',
+    ),
+    path(
+        'api/media/<path:name>',
+        core_views.MediaView.as_view(),
+        name='media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
@@ -10,7 +10,17 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Import the URLconf and load the prebuilt schema now instead of on the
+# first request. Unless uWSGI runs with lazy-apps, this happens once in the
+# master process and forked workers share the result.
+get_resolver().url_patterns
+
+from core.views import load_schema  # noqa: E402
+
+load_schema()
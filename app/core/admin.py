@@ -3,9 +3,55 @@ Django admin customization.
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from core import models
+from core.deletion import request_user_deletion
+
+
+def estimated_count(model, using=DEFAULT_DB_ALIAS):
+    """Return the planner's row estimate for a model's table."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+
+    return row[0] if row else -1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting unfiltered large tables from 'pg_class'
+    statistics instead of a full COUNT(*).
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        """Return the estimated or, for small/filtered lists, exact count."""
+        query = self.object_list.query
+        if not query.where:
+            estimate = estimated_count(
+                self.object_list.model, using=self.object_list.db
+            )
+            if estimate > self.estimate_threshold:
+                return estimate
+
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Base admin for tables growing to millions of rows."""
+    paginator = EstimatedCountPaginator
+    # Skip the extra unfiltered COUNT(*) shown next to search results
+    show_full_result_count = False
 
 
 class UserAdmin(BaseUserAdmin):
@@ -43,10 +89,108 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """
+        List only the users on the delete confirmation page, instead of
+        collecting all their data which is deleted in the background.
+        """
+        users = list(objs)
+        model_count = {self.model._meta.verbose_name_plural: len(users)}
+
+        return [str(user) for user in users], model_count, set(), []
+
+    def delete_model(self, request, obj):
+        request_user_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            request_user_deletion(user)
+
+
+class UserDeletionAdmin(admin.ModelAdmin):
+    """Define the admin pages showing progress of user deletions."""
+    list_display = [
+        'email', 'requested_at', 'finished_at', 'recipes_deleted',
+        'tags_deleted', 'ingredients_deleted', 'images_deleted',
+    ]
+    list_filter = ['finished_at']
+    search_fields = ['email']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class RecipeAdmin(LargeTableAdmin):
+    """Define the admin pages for recipes."""
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['tags', 'ingredients']
+    # '^' prefix searches use the 'Upper(title)' pattern index
+    search_fields = ['^title']
+
+
+class RecipeAttrAdmin(LargeTableAdmin):
+    """Define the admin pages for tags and ingredients."""
+    list_display = ['name', 'user']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    search_fields = ['^name']
+
+
+class JobAdmin(LargeTableAdmin):
+    """Define the admin dashboard of background jobs."""
+    list_display = [
+        'name', 'status', 'priority', 'attempts', 'run_at', 'started_at',
+        'finished_at', 'worker',
+    ]
+    list_filter = ['status', 'name']
+    search_fields = ['^name']
+    ordering = ['-id']
+    readonly_fields = [
+        'name', 'kwargs', 'status', 'priority', 'run_at', 'attempts',
+        'max_attempts', 'created_at', 'started_at', 'heartbeat_at',
+        'finished_at', 'worker', 'last_error',
+    ]
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """Show job counts per status and the queue's backlog."""
+        jobs = models.Job.objects
+        extra_context = {
+            'status_counts': jobs.values('status').annotate(
+                count=Count('id'),
+            ).order_by('status'),
+            'oldest_ready': jobs.filter(
+                status=models.Job.QUEUED, run_at__lte=timezone.now(),
+            ).aggregate(oldest=Min('run_at'))['oldest'],
+            **(extra_context or {}),
+        }
+
+        return super().changelist_view(request, extra_context)
+
+    @admin.action(description='Retry selected jobs now')
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=models.Job.RUNNING).update(
+            status=models.Job.QUEUED,
+            run_at=timezone.now(),
+            attempts=0,
+            finished_at=None,
+        )
+        self.message_user(request, f'Queued {count} jobs again.')
+
 
 # Register those models here that are manageable via Django Admin
 # Set custom class i.e. 'UserAdmin'
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.UserDeletion, UserDeletionAdmin)
+admin.site.register(models.Job, JobAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect signal handlers and register jobs for workers
+        from core import (  # noqa: F401
+            direct_uploads, events, images, similar, stats, sync, uploads,
+        )
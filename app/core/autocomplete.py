@@ -0,0 +1,50 @@
+"""
+Typeahead matching of tag and ingredient names.
+"""
+from functools import lru_cache
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+
+# Matches ranked by usage, bounding the recipes counted per request
+CANDIDATES = 100
+
+# Shortest query matched by similarity, shorter ones share no trigrams
+MIN_FUZZY_LENGTH = 3
+
+
+@lru_cache(maxsize=None)
+def trigram_available(using='default'):
+    """Check whether the database has pg_trgm installed."""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def complete(queryset, q, limit):
+    """
+    Return up to limit objects of the queryset with names starting with
+    q, or similar to it given pg_trgm. Prefix matches rank first, then
+    the most similar, then the most used by recipes.
+    """
+    queryset = queryset.annotate(is_prefix=Case(
+        When(name__istartswith=q, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    ))
+    match = Q(name__istartswith=q)
+    ranking = ['-is_prefix']
+    if len(q) >= MIN_FUZZY_LENGTH and trigram_available(queryset.db):
+        queryset = queryset.annotate(
+            similarity=TrigramSimilarity('name', q),
+        )
+        match |= Q(name__trigram_similar=q)
+        ranking.append('-similarity')
+
+    candidates = queryset.filter(match).order_by(*ranking, 'name')
+    return queryset.filter(
+        pk__in=candidates.values('pk')[:CANDIDATES],
+    ).annotate(usage=Count('recipe')).order_by(
+        *ranking, '-usage', 'name',
+    )[:limit]
@@ -0,0 +1,128 @@
+"""
+Single-flight coalescing of identical concurrent computations.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class _Call:
+    """A computation in flight, awaited by concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run one computation per key at a time. Callers arriving while it is
+    in flight wait and share its result instead of computing it again.
+    Optionally coordinates through the shared cache across workers.
+    """
+    # Seconds followers in other workers wait for the leader
+    shared_timeout = 5
+    # Seconds a shared result stays available to late followers
+    shared_result_ttl = 1
+    poll_interval = 0.01
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'computed': 0, 'coalesced': 0}
+
+    def do(self, key, compute):
+        """
+        Return (result, coalesced) where coalesced tells whether the
+        result was shared from another caller's computation.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            self._count('coalesced')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, coalesced = self._compute(key, compute)
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, coalesced
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _compute(self, key, compute):
+        """Compute once in this worker, or across workers if shared."""
+        if not settings.COALESCE_ACROSS_WORKERS:
+            self._count('computed')
+            return compute(), False
+
+        result_key = f'coalesce-result:{key}'
+        lock_key = f'coalesce-lock:{key}'
+        deadline = time.monotonic() + self.shared_timeout
+        while not cache.add(lock_key, True, self.shared_timeout):
+            result = cache.get(result_key)
+            if result is not None:
+                self._count('coalesced')
+                return result, True
+            if time.monotonic() > deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        try:
+            self._count('computed')
+            result = compute()
+            cache.set(result_key, result, self.shared_result_ttl)
+        finally:
+            cache.delete(lock_key)
+        return result, False
+
+
+single_flight = SingleFlight()
+
+# Bumped by every write in this worker. Calls are only coalesced while
+# in flight, so one counter for all users keeps reads started after a
+# write from joining one started before it, at little cost to sharing.
+# It only sees this worker's writes, which is enough while calls are
+# coalesced within the worker; across workers the generation is kept
+# in the shared cache instead, so every worker sees every write.
+_local_generation = 0
+_local_generation_lock = threading.Lock()
+
+
+def generation(user):
+    """Return a user's data generation, bumped whenever they write."""
+    if not settings.COALESCE_ACROSS_WORKERS:
+        return _local_generation
+    return cache.get_or_set(f'coalesce-generation:{user.pk}', 0, None)
+
+
+def invalidate(user):
+    """Stop sharing results computed before a user's write."""
+    global _local_generation
+    with _local_generation_lock:
+        _local_generation += 1
+    if not settings.COALESCE_ACROSS_WORKERS:
+        return
+    key = f'coalesce-generation:{user.pk}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
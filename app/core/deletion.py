@@ -0,0 +1,102 @@
+"""
+Deletion of users and their data in bounded chunks.
+"""
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.jobs import task
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+    UserDeletion,
+)
+
+# Whether objects are being deleted by a purge, so aren't synced
+_purging = ContextVar('purging', default=False)
+
+# Deleted in this order, with the progress field counting each
+PURGED_MODELS = [
+    (Recipe, 'recipes_deleted'),
+    (Tag, 'tags_deleted'),
+    (Ingredient, 'ingredients_deleted'),
+    (Tombstone, None),
+]
+
+
+def purging():
+    """Check whether a user's data is being purged."""
+    return _purging.get()
+
+
+def request_user_deletion(user):
+    """Deactivate a user at once and queue the purge of their data."""
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    deletion, created = UserDeletion.objects.get_or_create(
+        user=user, defaults={'email': user.email},
+    )
+    if created:
+        purge_deleted_user.enqueue(priority=-1, deletion_id=deletion.pk)
+
+    return deletion
+
+
+def delete_chunk(deletion, model, progress_field, chunk_size):
+    """
+    Delete up to chunk_size of the user's objects in one short
+    transaction, with their M2M links and images. Returns the number
+    deleted.
+    """
+    ids = list(
+        model.objects.filter(user_id=deletion.user_id)
+        .order_by().values_list('pk', flat=True)[:chunk_size]
+    )
+    if not ids:
+        return 0
+
+    chunk = model.objects.filter(pk__in=ids)
+    images = []
+    if model is Recipe:
+        images = list(
+            chunk.exclude(image='').exclude(image=None)
+            .values_list('image', flat=True)
+        )
+    progress = {'images_deleted': F('images_deleted') + len(images)}
+    if progress_field:
+        progress[progress_field] = F(progress_field) + len(ids)
+
+    with transaction.atomic():
+        # Deleting releases the images, removing files no longer shared
+        chunk.delete()
+        UserDeletion.objects.filter(pk=deletion.pk).update(**progress)
+
+    return len(ids)
+
+
+def purge_user(deletion, chunk_size=500):
+    """Delete a user's data chunk by chunk, then the user."""
+    token = _purging.set(True)
+    try:
+        for model, progress_field in PURGED_MODELS:
+            while delete_chunk(deletion, model, progress_field, chunk_size):
+                pass
+
+        with transaction.atomic():
+            if deletion.user is not None:
+                deletion.user.delete()
+            UserDeletion.objects.filter(pk=deletion.pk).update(
+                finished_at=timezone.now(),
+            )
+    finally:
+        _purging.reset(token)
+
+
+@task
+def purge_deleted_user(deletion_id):
+    """Purge a user marked for deletion."""
+    purge_user(UserDeletion.objects.get(pk=deletion_id))
@@ -0,0 +1,202 @@
+"""
+Images uploaded by clients straight to object storage.
+"""
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from core import images, imaging
+from core.jobs import task
+
+SALT = 'core.direct_uploads'
+
+# Accepted content types, with the extension and format of their images
+CONTENT_TYPES = {
+    'image/jpeg': ('.jpg', 'JPEG'),
+    'image/png': ('.png', 'PNG'),
+    'image/gif': ('.gif', 'GIF'),
+    'image/webp': ('.webp', 'WEBP'),
+}
+
+# Bytes read from an uploaded object to identify it, covering headers
+HEADER_SIZE = 64 * 1024
+
+
+class InvalidUpload(Exception):
+    """An upload can't be confirmed."""
+
+
+def enabled():
+    """Check whether uploads are stored in a bucket."""
+    return bool(settings.AWS_STORAGE_BUCKET_NAME)
+
+
+@lru_cache(maxsize=None)
+def client():
+    """Return the S3 client signing URLs for clients to upload to."""
+    return boto3.client(
+        's3',
+        endpoint_url=(
+            settings.DIRECT_UPLOADS['ENDPOINT_URL']
+            or settings.AWS_S3_ENDPOINT_URL
+        ),
+        region_name=settings.AWS_S3_REGION_NAME,
+        aws_access_key_id=settings.AWS_S3_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_S3_SECRET_ACCESS_KEY,
+        config=Config(signature_version='s3v4'),
+    )
+
+
+def bucket():
+    """Return the bucket uploads are stored in."""
+    return default_storage.bucket
+
+
+def _target(obj, field):
+    return f'{obj._meta.label_lower}:{obj.pk}:{field}'
+
+
+def presign(obj, field, content_type):
+    """
+    Return a URL to PUT an image to, and a token confirming it as the
+    image of obj's field. Images never confirmed are collected like any
+    other unreferenced image.
+    """
+    ext, _ = CONTENT_TYPES[content_type]
+    key = uuid.uuid4().hex
+    name = f'{images.DIRECT_PREFIX}{key[:2]}/{key}{ext}'
+    images.touch(name)
+    images.collect_image.enqueue(
+        run_at=timezone.now() + timedelta(
+            seconds=settings.IMAGE_COLLECT_AFTER
+        ),
+        name=name,
+    )
+
+    expires_in = settings.DIRECT_UPLOADS['EXPIRE_AFTER']
+    url = client().generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+            'Key': name,
+            'ContentType': content_type,
+        },
+        ExpiresIn=expires_in,
+    )
+
+    return {
+        'url': url,
+        'headers': {'Content-Type': content_type},
+        'token': signing.dumps(
+            {'name': name, 'target': _target(obj, field)}, salt=SALT,
+        ),
+        'expires_at': timezone.now() + timedelta(seconds=expires_in),
+    }
+
+
+def validate(name):
+    """
+    Check an uploaded object is an image of the expected format within
+    the size limit, reading no more than its header.
+    """
+    obj = bucket().Object(name)
+    try:
+        size = obj.content_length
+    except ClientError:
+        raise InvalidUpload('Nothing was uploaded.')
+    if size > settings.DIRECT_UPLOADS['MAX_SIZE']:
+        raise InvalidUpload('The image is too large.')
+
+    header = obj.get(Range=f'bytes=0-{HEADER_SIZE - 1}')['Body'].read()
+    try:
+        with imaging.open_image(BytesIO(header)) as image:
+            image_format = image.format
+    except imaging.InvalidImage as exc:
+        raise InvalidUpload(str(exc))
+    expected_format = next(
+        ext_format for ext, ext_format in CONTENT_TYPES.values()
+        if name.endswith(ext)
+    )
+    if image_format != expected_format:
+        raise InvalidUpload('The image does not match its content type.')
+
+
+def confirm(obj, field, token):
+    """
+    Validate an uploaded image, then save it as obj's field until
+    normalize_upload replaces it by a re-encoded copy.
+    """
+    try:
+        data = signing.loads(
+            token, salt=SALT, max_age=settings.IMAGE_COLLECT_AFTER,
+        )
+    except signing.BadSignature:
+        raise InvalidUpload('Invalid or expired upload token.')
+    if data['target'] != _target(obj, field):
+        raise InvalidUpload('The upload is for another image.')
+
+    name = data['name']
+    # Waits for a collection of the upload to finish first
+    images.touch(name)
+    try:
+        validate(name)
+    except InvalidUpload:
+        default_storage.delete(name)
+        raise
+
+    getattr(obj, field).name = name
+    obj.save(update_fields=[field])
+    normalize_upload.enqueue(
+        model=obj._meta.label_lower, pk=obj.pk, field=field, name=name,
+    )
+
+    return obj
+
+
+@task
+def normalize_upload(model, pk, field, name):
+    """
+    Re-encode a confirmed upload like images uploaded through the API,
+    upright, within the size limits and without metadata such as EXIF
+    locations, then use the copy if the upload is still in place.
+    """
+    Model = apps.get_model(model)
+    obj = Model.objects.filter(pk=pk).first()
+    if obj is None or getattr(obj, field).name != name:
+        return
+
+    cleaned_name = None
+    with default_storage.open(name) as upload:
+        try:
+            cleaned = imaging.clean_upload(File(upload, name=name))
+        except imaging.InvalidImage:
+            # Only its header was checked on confirmation, drop it
+            cleaned = None
+    if cleaned is not None:
+        cleaned_name = default_storage.save(
+            getattr(obj, field).field.generate_filename(obj, cleaned.name),
+            cleaned,
+        )
+
+    with transaction.atomic():
+        obj = Model.objects.select_for_update().filter(pk=pk).first()
+        if obj is None or getattr(obj, field).name != name:
+            # Replaced meanwhile, the copy is of no use
+            if cleaned_name:
+                default_storage.delete(cleaned_name)
+            return
+        setattr(obj, field, cleaned_name)
+        obj.save(update_fields=[field])
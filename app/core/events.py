@@ -0,0 +1,237 @@
+"""
+Change events of recipes, tags and ingredients for streaming clients.
+"""
+import json
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from core.sync import deleted_with_user
+
+CHANNEL = 'recipe_events'
+
+
+class TooManyStreams(Exception):
+    """The process already serves as many streams as it may."""
+
+
+class Subscription:
+    """Events of one user for one stream."""
+    # Events held for a slow client before it must resync instead
+    max_pending = 100
+
+    def __init__(self, bus, user_id):
+        self.bus = bus
+        self.user_id = user_id
+        self.queue = queue.Queue(self.max_pending)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Return the next event, None once events were dropped."""
+        if self.overflowed:
+            return None
+        return self.queue.get(timeout=timeout)
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LocalBus:
+    """Fans events out to the subscriptions of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+        self._count = 0
+
+    def subscribe(self, user_id, limit=None):
+        """Subscribe to a user's events, at most limit at a time."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            if limit is not None and self._count >= limit:
+                raise TooManyStreams
+            self._subscriptions[user_id].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if not subscriptions or subscription not in subscriptions:
+                return
+            subscriptions.remove(subscription)
+            self._count -= 1
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event['user'], ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class PostgresListener(threading.Thread):
+    """
+    Receives events of all app servers over one LISTEN connection per
+    process and delivers them to the local subscriptions.
+    """
+    daemon = True
+    poll_timeout = 5
+    retry_delay = 1
+
+    def __init__(self, bus):
+        super().__init__(name='recipe-events-listener')
+        self.bus = bus
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.listen()
+            except (psycopg2.Error, OSError):
+                self.stopping.wait(self.retry_delay)
+
+    def stop(self):
+        """Stop listening within poll_timeout."""
+        self.stopping.set()
+
+    def listen(self):
+        conn = psycopg2.connect(**connection.get_connection_params())
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while not self.stopping.is_set():
+                select.select([conn], [], [], self.poll_timeout)
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.bus.deliver(json.loads(notify.payload))
+        finally:
+            conn.close()
+
+
+local_bus = LocalBus()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _ensure_listener():
+    """Start this process's listener on first use, i.e. after forking."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = PostgresListener(local_bus)
+            _listener.start()
+
+
+def subscribe(user_id):
+    """
+    Return a subscription to the events of a user, or raise
+    TooManyStreams once the process holds EVENTS_MAX_STREAMS of them.
+    """
+    if settings.EVENTS_BACKEND == 'postgres':
+        _ensure_listener()
+    return local_bus.subscribe(user_id, limit=settings.EVENTS_MAX_STREAMS)
+
+
+def publish(event):
+    """Send an event to the user's subscriptions on all app servers."""
+    if settings.EVENTS_BACKEND == 'postgres':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps(event)]
+            )
+    else:
+        local_bus.deliver(event)
+
+
+def stream(subscription, heartbeat, max_seconds):
+    """
+    Yield a subscription's events in server-sent events format, with
+    keepalive comments while idle, for at most max_seconds.
+    """
+    deadline = time.monotonic() + max_seconds
+    # Clients wait this many milliseconds before reconnecting
+    yield 'retry: 3000\n\n'
+    try:
+        while time.monotonic() < deadline:
+            try:
+                event = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Events were dropped, the client syncs to catch up
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            yield f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+    finally:
+        subscription.close()
+
+
+class EventStream:
+    """
+    A subscription's stream for a StreamingHttpResponse, which closes it
+    once the response is closed, even if it was never iterated, i.e. for
+    HEAD requests or clients gone before the first event.
+    """
+
+    def __init__(self, subscription, heartbeat, max_seconds):
+        self.subscription = subscription
+        self.events = stream(subscription, heartbeat, max_seconds)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        self.subscription.close()
+
+
+def _publish_on_commit(event_type, sender, instance):
+    event = {
+        'user': instance.user_id,
+        'type': event_type,
+        'model': sender._meta.model_name,
+        'id': instance.pk,
+    }
+    transaction.on_commit(lambda: publish(event))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def object_saved(sender, instance, created, **kwargs):
+    """Publish creates and updates once committed."""
+    _publish_on_commit('created' if created else 'updated', sender, instance)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def object_deleted(sender, instance, origin=None, **kwargs):
+    """Publish deletes once committed."""
+    # The user's streams end along with their account
+    if deleted_with_user(origin):
+        return
+    _publish_on_commit('deleted', sender, instance)
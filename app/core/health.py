@@ -0,0 +1,42 @@
+"""
+Health checks shared by wait_for_db and the probe endpoints.
+"""
+from psycopg2 import OperationalError as Psycopg2OpError
+
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import OperationalError
+
+# Applied migrations stay applied for the lifetime of a process
+_migrated_aliases = set()
+
+
+def database_available(alias='default'):
+    """Check the database accepts connections and queries."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except (Psycopg2OpError, OperationalError):
+        # Drop a broken connection, so the next check reconnects
+        if not connection.in_atomic_block:
+            connection.close()
+        return False
+
+    return True
+
+
+def migrations_applied(alias='default'):
+    """Check every migration known to the code is applied."""
+    if alias in _migrated_aliases:
+        return True
+
+    try:
+        executor = MigrationExecutor(connections[alias])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    except (Psycopg2OpError, OperationalError):
+        return False
+
+    if not plan:
+        _migrated_aliases.add(alias)
+    return not plan
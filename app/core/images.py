@@ -0,0 +1,196 @@
+"""
+Content-addressed image storage with reference counting.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.jobs import task
+from core.models import Recipe, StoredImage, User
+
+PREFIX = 'images/'
+# Images uploaded by clients straight to object storage, named randomly
+# as their content is unknown until uploaded, and counted all the same
+DIRECT_PREFIX = 'direct/'
+
+# Models and their fields referencing stored images
+IMAGE_FIELDS = [(Recipe, 'image'), (User, 'image')]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores files under the SHA-256 of their content, hashed while
+    writing, so identical uploads share one file and a file's URL
+    always serves the same bytes.
+    """
+    chunk_size = 64 * 1024
+
+    def _save(self, name, content):
+        directory = self.path(PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            ext = os.path.splitext(name)[1].lower()
+            name = f'{PREFIX}{hexdigest[:2]}/{hexdigest}{ext}'
+            # Waits for a collection of the same image to finish first
+            touch(name)
+            if self.exists(name):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, self.path(name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name
+
+
+def is_content_addressed(name):
+    return name.startswith(PREFIX)
+
+
+def is_counted(name):
+    """Check an image is reference counted, unlike legacy uploads."""
+    return name.startswith((PREFIX, DIRECT_PREFIX))
+
+
+def touch(name):
+    """Track an uploaded image, postponing its collection."""
+    StoredImage.objects.update_or_create(
+        name=name, defaults={'updated_at': timezone.now()},
+    )
+
+
+def acquire(name):
+    """Count a new reference to an image."""
+    StoredImage.objects.filter(name=name).update(
+        refs=F('refs') + 1, updated_at=timezone.now(),
+    )
+
+
+def release(name):
+    """Drop a reference to an image, deleting it once unused."""
+    if not is_counted(name):
+        # Files from before content addressing have one reference
+        transaction.on_commit(lambda: default_storage.delete(name))
+        return
+
+    StoredImage.objects.filter(name=name).update(
+        refs=F('refs') - 1, updated_at=timezone.now(),
+    )
+    if not StoredImage.objects.filter(name=name, refs__lte=0).exists():
+        return
+    collect_image.enqueue(
+        run_at=timezone.now() + timedelta(
+            seconds=settings.IMAGE_COLLECT_AFTER
+        ),
+        name=name,
+    )
+
+
+def is_owner(user, name):
+    """Check an image is the user's or one of their recipes', if any."""
+    return user.image.name == name or Recipe.objects.filter(
+        user=user, image=name,
+    ).exists()
+
+
+def is_referenced(name):
+    """Check the image fields for references, ignoring the counts."""
+    return any(
+        model.objects.filter(**{field: name}).exists()
+        for model, field in IMAGE_FIELDS
+    )
+
+
+@task
+def collect_image(name):
+    """Delete an image unused since IMAGE_COLLECT_AFTER seconds."""
+    unused_since = timezone.now() - timedelta(
+        seconds=settings.IMAGE_COLLECT_AFTER
+    )
+    with transaction.atomic():
+        stored = StoredImage.objects.select_for_update().filter(
+            name=name, refs__lte=0, updated_at__lte=unused_since,
+        ).first()
+        if stored is None:
+            return
+        if is_referenced(name):
+            # Counts drifted, i.e. from queryset updates, so recount
+            stored.refs = sum(
+                model.objects.filter(**{field: name}).count()
+                for model, field in IMAGE_FIELDS
+            )
+            stored.save(update_fields=['refs'])
+            return
+
+        default_storage.delete(name)
+        stored.delete()
+
+
+def _saved_fields(sender, update_fields):
+    return [
+        field for model, field in IMAGE_FIELDS if model is sender
+        and (update_fields is None or field in update_fields)
+    ]
+
+
+def _image_name(instance, field):
+    return getattr(instance, field).name or ''
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_images(sender, instance, update_fields=None, **kwargs):
+    """Load the image names being replaced, if any might be."""
+    fields = _saved_fields(sender, update_fields)
+    instance._replaced_images = {}
+    if fields and instance.pk is not None and not instance._state.adding:
+        instance._replaced_images = (
+            sender.objects.filter(pk=instance.pk).values(*fields).first()
+            or {}
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_images(sender, instance, update_fields=None, **kwargs):
+    """Move references from replaced images to new ones."""
+    replaced = getattr(instance, '_replaced_images', {})
+    for field in _saved_fields(sender, update_fields):
+        old, new = replaced.get(field) or '', _image_name(instance, field)
+        if old == new:
+            continue
+        if new:
+            acquire(new)
+        if old:
+            release(old)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_images(sender, instance, **kwargs):
+    """Drop the references of a deleted object."""
+    for field in _saved_fields(sender, None):
+        name = _image_name(instance, field)
+        if name:
+            release(name)
@@ -0,0 +1,127 @@
+"""
+Image decoding and encoding within bounded memory.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+# Accepted formats, with their content type and extension
+FORMATS = {
+    'JPEG': ('image/jpeg', '.jpg'),
+    'PNG': ('image/png', '.png'),
+    'GIF': ('image/gif', '.gif'),
+    'WEBP': ('image/webp', '.webp'),
+}
+
+# Modes each format stores, others are converted to RGB, or RGBA where
+# the format keeps transparency. GIF converts on its own.
+SAVE_MODES = {
+    'JPEG': ('1', 'L', 'RGB', 'CMYK'),
+    'PNG': ('1', 'L', 'LA', 'I', 'P', 'RGB', 'RGBA'),
+    'WEBP': ('RGB', 'RGBA'),
+}
+
+# Image info kept when re-encoding, everything else i.e. EXIF is dropped
+KEPT_INFO = ('icc_profile', 'transparency')
+
+
+class InvalidImage(Exception):
+    """An image is unreadable or beyond the upload limits."""
+
+
+def open_image(file):
+    """
+    Open an image, reading no more than its header, and check its
+    format and pixel count against IMAGE_UPLOADS before any decoding.
+    """
+    try:
+        image = Image.open(file)
+    except Image.DecompressionBombError:
+        raise InvalidImage('The image has too many pixels.')
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage('Upload a valid image.')
+    check(image)
+
+    return image
+
+
+def check(image):
+    """Check an opened image's format and pixel count."""
+    if image.format not in FORMATS:
+        raise InvalidImage(f'{image.format} images are not supported.')
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOADS['MAX_PIXELS']:
+        raise InvalidImage('The image has too many pixels.')
+
+
+def reencode(image, size, image_format=None):
+    """
+    Decode an opened image to fit within size and encode it again in
+    image_format, its own by default, upright and without metadata.
+    JPEGs are scaled down while decoding, so their full size is never
+    held in memory. Only the first frame of animations is kept.
+    """
+    source_format = image.format
+    image_format = image_format or source_format
+    scale = min(size[0] / image.width, size[1] / image.height)
+    if scale < 1:
+        # JPEGs decode at the smallest scale still covering the final size
+        image.draft(None, (
+            max(1, int(image.width * scale)),
+            max(1, int(image.height * scale)),
+        ))
+    try:
+        image.thumbnail(size)
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError):
+        # i.e. truncated files or corrupt data
+        raise InvalidImage('Upload a valid image.')
+
+    kept_info = {
+        key: value for key, value in image.info.items() if key in KEPT_INFO
+        and (key != 'transparency' or image_format == source_format)
+    }
+    if image.mode not in SAVE_MODES.get(image_format, (image.mode,)):
+        # i.e. CMYK JPEGs resized to PNG, converted while their palette
+        # transparency is still known
+        transparent = 'A' in image.mode or 'transparency' in image.info
+        image = image.convert(
+            'RGBA' if transparent and image_format != 'JPEG' else 'RGB'
+        )
+        kept_info.pop('transparency', None)
+    image.info = {}
+    output = BytesIO()
+    options = {'quality': 90} if image_format in ('JPEG', 'WEBP') else {}
+    try:
+        image.save(output, format=image_format, **kept_info, **options)
+    except (OSError, ValueError):
+        raise InvalidImage('The image can\'t be converted.')
+
+    return output
+
+
+def clean_upload(file):
+    """
+    Return an uploaded image re-encoded within the IMAGE_UPLOADS limits,
+    rejecting files too large, of other formats or with too many pixels
+    before decoding them.
+    """
+    limits = settings.IMAGE_UPLOADS
+    if file.size > limits['MAX_SIZE']:
+        raise InvalidImage(
+            f'Images can be at most {limits["MAX_SIZE"]} bytes.'
+        )
+    image = open_image(file)
+    content_type, ext = FORMATS[image.format]
+    output = reencode(
+        image, (limits['MAX_DIMENSION'], limits['MAX_DIMENSION']),
+    )
+
+    name = os.path.splitext(os.path.basename(file.name or 'image'))[0]
+    return SimpleUploadedFile(
+        f'{name}{ext}', output.getvalue(), content_type=content_type,
+    )
@@ -0,0 +1,182 @@
+"""
+Background jobs queued in the database.
+"""
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Job
+
+# Job name -> function run with the job's kwargs
+TASKS = {}
+
+
+def task(func):
+    """Register a function as a job, queued with func.enqueue(**kwargs)."""
+    name = f'{func.__module__}.{func.__qualname__}'
+    TASKS[name] = func
+    func.enqueue = lambda priority=0, run_at=None, **kwargs: enqueue(
+        name, priority=priority, run_at=run_at, **kwargs
+    )
+
+    return func
+
+
+def enqueue(name, /, priority=0, run_at=None, **kwargs):
+    """
+    Queue a job, to run once ready at run_at if given. Inside a
+    transaction, workers see it only once that commits, so a job never
+    runs before the data it needs exists.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown job {name}.')
+
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def worker_name():
+    """Return a name telling which process runs a job."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit=1):
+    """
+    Mark the next ready jobs running and return them. Rows locked by
+    other workers claiming at the same time are skipped, not waited on.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at')[:limit]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            worker=worker,
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status, job.started_at, job.worker = Job.RUNNING, now, worker
+        job.attempts += 1
+
+    return jobs
+
+
+def retry_delay(attempts):
+    """Return seconds before retrying, doubling with each attempt."""
+    delay = min(
+        settings.JOBS['RETRY_MAX_DELAY'],
+        settings.JOBS['RETRY_DELAY'] * 2 ** (attempts - 1),
+    )
+    # Jitter spreads retries of jobs failing together
+    return random.uniform(delay / 2, delay)
+
+
+class Heartbeat(threading.Thread):
+    """Records that a job is still running, until stopped."""
+    daemon = True
+
+    def __init__(self, job):
+        super().__init__(name=f'heartbeat-{job.pk}')
+        self.job = job
+        self.stopping = threading.Event()
+
+    def run(self):
+        interval = settings.JOBS['HEARTBEAT_INTERVAL']
+        try:
+            while not self.stopping.wait(interval):
+                try:
+                    Job.objects.filter(
+                        pk=self.job.pk,
+                        status=Job.RUNNING,
+                        worker=self.job.worker,
+                    ).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # Missing a beat is fine, retry with a new connection
+                    connection.close()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+def run(job):
+    """Run a claimed job, then record its success or failure."""
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        TASKS[job.name](**job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    finally:
+        heartbeat.stop()
+
+    job.save(update_fields=['status', 'run_at', 'finished_at', 'last_error'])
+
+
+def requeue_stale():
+    """
+    Queue again jobs left running by workers that died, i.e. whose
+    heartbeat stopped, however long live ones have been running. Their
+    claim counted as an attempt, so jobs killing their worker every
+    time, i.e. by running out of memory, fail after max_attempts.
+    Returns the number of stale jobs found.
+    """
+    stale_before = timezone.now() - timedelta(
+        seconds=settings.JOBS['STALE_AFTER']
+    )
+    # Jobs claimed before heartbeats were recorded beat once, at start
+    stale = Job.objects.alias(
+        last_beat=Coalesce('heartbeat_at', 'started_at'),
+    ).filter(status=Job.RUNNING, last_beat__lt=stale_before)
+    now = timezone.now()
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        finished_at=now,
+        last_error='The worker running the job stopped.',
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_at=now,
+    )
+
+    return failed + requeued
+
+
+def prune_done():
+    """Delete jobs finished successfully a while ago."""
+    done_before = timezone.now() - timedelta(days=settings.JOBS['KEEP_DAYS'])
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, started_at__lt=done_before,
+    ).delete()
+
+    return deleted
@@ -0,0 +1,47 @@
+"""
+Django command to measure per-request middleware overhead
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+
+class Command(BaseCommand):
+    """Django command to compare the session and session-free stacks"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/health/live/',
+            help='Path to request, one needing no database by default.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=5000,
+            help='Number of requests per stack.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            with override_settings(SESSION_FREE_PATHS=[]):
+                full = self.time_requests(options['path'], options['requests'])
+            lean = self.time_requests(options['path'], options['requests'])
+
+        self.stdout.write(f'Session stack:      {full:8.1f} us/request')
+        self.stdout.write(f'Session-free stack: {lean:8.1f} us/request')
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {full - lean:.1f} us/request '
+            f'({(full - lean) / full:.0%})'
+        ))
+
+    def time_requests(self, path, count):
+        """Return the mean time of a request in microseconds."""
+        # A fresh client loads the middleware for the current settings
+        client = Client()
+        client.get(path)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            client.get(path)
+
+        return (time.perf_counter() - start) / count * 1e6
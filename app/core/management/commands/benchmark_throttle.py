@@ -0,0 +1,47 @@
+"""
+Django command to measure the time of taking a throttle token
+"""
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core import throttling
+
+
+class Command(BaseCommand):
+    """Django command to time throttle checks against a bucket store"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checks', type=int, default=10000,
+            help='Number of checks to time.',
+        )
+        parser.add_argument(
+            '--local', action='store_true',
+            help='Use process memory instead of the configured store.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        store = (
+            throttling.LocalBucketStore() if options['local']
+            else throttling.bucket_store()
+        )
+        request = Request(APIRequestFactory().get('/api/recipe/recipes/'))
+        request.user = AnonymousUser()
+        throttle = throttling.TokenBucketThrottle()
+        capacity, refill_rate = throttling.parse_rate('1000000/s')
+        key = f'throttle:benchmark:{throttle.get_ident(request)}'
+        checks = options['checks']
+
+        start = time.perf_counter()
+        for _ in range(checks):
+            store.take(key, capacity, refill_rate)
+        elapsed = (time.perf_counter() - start) / checks * 1e6
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(store).__name__}: {elapsed:.1f} us/check'
+        ))
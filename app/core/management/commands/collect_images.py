@@ -0,0 +1,62 @@
+"""
+Django command to delete images no longer referenced
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.images import DIRECT_PREFIX, PREFIX, collect_image
+from core.models import StoredImage
+
+
+class Command(BaseCommand):
+    """
+    Django command to collect unreferenced images missed by their jobs,
+    and files left by uploads that failed before being tracked
+    """
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        unused_since = timezone.now() - timedelta(
+            seconds=settings.IMAGE_COLLECT_AFTER
+        )
+        unused = StoredImage.objects.filter(
+            refs__lte=0, updated_at__lte=unused_since,
+        ).values_list('name', flat=True)
+        for name in unused.iterator():
+            collect_image(name)
+
+        untracked = 0
+        for name in chain(
+            self.stored_files(PREFIX.rstrip('/')),
+            self.stored_files(DIRECT_PREFIX.rstrip('/')),
+        ):
+            modified = default_storage.get_modified_time(name)
+            if (
+                modified < unused_since
+                and not StoredImage.objects.filter(name=name).exists()
+            ):
+                default_storage.delete(name)
+                untracked += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Collected unused images, deleted {untracked} untracked files'
+        ))
+
+    def stored_files(self, directory):
+        """
+        Yield the names of all files under a directory, listed
+        through the storage as object stores have no paths to walk.
+        """
+        try:
+            directories, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        for file_name in files:
+            yield f'{directory}/{file_name}'
+        for subdirectory in directories:
+            yield from self.stored_files(f'{directory}/{subdirectory}')
@@ -0,0 +1,64 @@
+"""
+Django command to profile worker startup time
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+# Loads the app and warms it up, as a uWSGI master or worker does
+STARTUP_CODE = 'import app.wsgi'
+
+
+class Command(BaseCommand):
+    """Django command to report slow imports and cold start time"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Number of slowest imports to report.',
+        )
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='Number of cold starts to time.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        self.stdout.write(f'Slowest imports (top {options["top"]}):')
+        self.stdout.write(f'{"self ms":>9} {"total ms":>9}  module')
+        for self_us, total_us, module in self.slowest_imports(options['top']):
+            self.stdout.write(
+                f'{self_us / 1000:9.1f} {total_us / 1000:9.1f}  {module}'
+            )
+
+        timings = [self.cold_start() for _ in range(options['runs'])]
+        self.stdout.write(self.style.SUCCESS(
+            f'Cold start over {len(timings)} runs: '
+            f'median {statistics.median(timings) * 1000:.0f} ms, '
+            f'min {min(timings) * 1000:.0f} ms'
+        ))
+
+    def slowest_imports(self, top):
+        """Return (self, cumulative, module) import times in microseconds."""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+            capture_output=True, text=True, check=True,
+        )
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, total_us, module = line[len('import time:'):].split('|')
+            imports.append((int(self_us), int(total_us), module.strip()))
+
+        return sorted(imports, key=lambda i: i[1], reverse=True)[:top]
+
+    def cold_start(self):
+        """Time a fresh interpreter loading the app, in seconds."""
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', STARTUP_CODE], check=True)
+
+        return time.perf_counter() - start
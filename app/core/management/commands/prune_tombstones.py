@@ -0,0 +1,20 @@
+"""
+Django command to delete tombstones past the sync retention
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Tombstone
+from core.sync import tombstone_horizon
+
+
+class Command(BaseCommand):
+    """Django command to prune old tombstones"""
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        deleted, _ = Tombstone.objects.filter(
+            deleted_at__lt=tombstone_horizon()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} tombstones'
+        ))
@@ -0,0 +1,31 @@
+"""
+Django command to delete the data of users marked for deletion
+"""
+from django.core.management.base import BaseCommand
+
+from core.deletion import purge_user
+from core.models import UserDeletion
+
+
+class Command(BaseCommand):
+    """Django command to purge deleted users chunk by chunk"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Objects deleted per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        pending = UserDeletion.objects.filter(finished_at__isnull=True)
+        for deletion in pending.order_by('requested_at'):
+            self.stdout.write(f'Purging {deletion}....')
+            purge_user(deletion, chunk_size=options['chunk_size'])
+            deletion.refresh_from_db()
+            self.stdout.write(self.style.SUCCESS(
+                f'Purged {deletion}: {deletion.recipes_deleted} recipes, '
+                f'{deletion.tags_deleted} tags, '
+                f'{deletion.ingredients_deleted} ingredients, '
+                f'{deletion.images_deleted} images'
+            ))
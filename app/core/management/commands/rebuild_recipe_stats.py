@@ -0,0 +1,37 @@
+"""
+Django command to compute all users' recipe stats from scratch
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild
+
+
+class Command(BaseCommand):
+    """Django command to rebuild recipe stats user batch by user batch"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Users rebuilt per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        user_ids = get_user_model().objects.order_by('pk').values_list(
+            'pk', flat=True,
+        )
+        batch_size = options['batch_size']
+        rebuilt = 0
+        last_id = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            rebuild(batch)
+            rebuilt += len(batch)
+            last_id = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the recipe stats of {rebuilt} users'
+        ))
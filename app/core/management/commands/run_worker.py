@@ -0,0 +1,95 @@
+"""
+Django command to run background jobs
+"""
+import signal
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    """Django command to run queued jobs until stopped"""
+    # Seconds between requeueing stale jobs and pruning old ones
+    maintenance_interval = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=settings.JOBS['CONCURRENCY'],
+            help='Jobs to run at once, in threads.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no jobs are ready instead of waiting.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entry point for command """
+        self.stopping = threading.Event()
+        previous_handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        self.stdout.write(
+            f'Running jobs as {jobs.worker_name()} '
+            f'with concurrency {options["concurrency"]}....'
+        )
+        try:
+            if options['concurrency'] == 1:
+                self.work(options['burst'])
+            else:
+                threads = [
+                    threading.Thread(target=self.work, args=[options['burst']])
+                    for _ in range(options['concurrency'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self, signum, frame):
+        """Finish the running jobs, then exit."""
+        self.stdout.write('Stopping after running jobs....')
+        self.stopping.set()
+
+    def work(self, burst):
+        """Claim and run jobs one at a time until stopped."""
+        worker = jobs.worker_name()
+        next_maintenance = 0
+        try:
+            while not self.stopping.is_set():
+                try:
+                    close_old_connections()
+                    if time.monotonic() >= next_maintenance:
+                        jobs.requeue_stale()
+                        jobs.prune_done()
+                        next_maintenance = (
+                            time.monotonic() + self.maintenance_interval
+                        )
+
+                    claimed = jobs.claim(worker)
+                    if not claimed:
+                        if burst:
+                            break
+                        self.stopping.wait(settings.JOBS['POLL_INTERVAL'])
+                    for job in claimed:
+                        jobs.run(job)
+                        self.stdout.write(f'{job} {job.status}')
+                except Exception:
+                    # i.e. the database went away, keep the thread alive
+                    # and retry; jobs left running are requeued once their
+                    # heartbeat stops
+                    self.stderr.write(traceback.format_exc())
+                    close_old_connections()
+                    self.stopping.wait(settings.JOBS['POLL_INTERVAL'])
+        finally:
+            connection.close()
@@ -2,27 +2,59 @@
 Django command to wait for the database to be available
 """
 
+import random
 import time
 
-from psycopg2 import OperationalError as Psycopg2OpError
+from django.core.management.base import BaseCommand, CommandError
 
-from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from core.health import database_available, migrations_applied
 
 
 class Command(BaseCommand):
     """Django command to wait for database"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait before giving up, 0 to wait forever.',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound in seconds for the delay between attempts.',
+        )
+        parser.add_argument(
+            '--migrations', action='store_true',
+            help='Also wait until all migrations are applied.',
+        )
+
     def handle(self, *args, **options):
         """ Entry point for command """
         self.stdout.write('Waiting for database....')
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2OpError, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+        self.wait_until(database_available, 'Database unavailable', options)
+
+        if options['migrations']:
+            self.stdout.write('Waiting for migrations....')
+            self.wait_until(
+                migrations_applied, 'Migrations not applied', options
+            )
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
+
+    def wait_until(self, check, message, options):
+        """Retry a check with exponential backoff and jitter."""
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while not check():
+            remaining = deadline - time.monotonic()
+            if options['timeout'] and remaining <= 0:
+                raise CommandError(
+                    f'{message} after {options["timeout"]:g} seconds.'
+                )
+
+            # Jitter spreads out retries of containers started together
+            sleep = random.uniform(delay / 2, delay)
+            if options['timeout']:
+                sleep = min(sleep, remaining)
+            self.stdout.write(f'{message}, waiting {sleep:.1f} seconds...')
+            time.sleep(sleep)
+            delay = min(delay * 2, options['max_delay'])
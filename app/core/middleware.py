@@ -0,0 +1,170 @@
+"""
+Custom middleware.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+
+
+class PathDispatchMiddleware:
+    """
+    Run the session middleware stack only for paths that need it,
+    i.e. the admin, and skip it for the token-authenticated API.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.session_free_paths = tuple(settings.SESSION_FREE_PATHS)
+        self.session_stack, middleware = self._build_stack(
+            settings.SESSION_MIDDLEWARE, get_response,
+        )
+        self.view_hooks = [
+            m.process_view for m in middleware if hasattr(m, 'process_view')
+        ]
+        self.exception_hooks = [
+            m.process_exception for m in reversed(middleware)
+            if hasattr(m, 'process_exception')
+        ]
+
+    def _build_stack(self, middleware_paths, get_response):
+        """Chain middleware like Django's handler, innermost first."""
+        handler = get_response
+        middleware = []
+        for middleware_path in reversed(middleware_paths):
+            instance = import_string(middleware_path)(handler)
+            middleware.insert(0, instance)
+            handler = convert_exception_to_response(instance)
+
+        return handler, middleware
+
+    def _uses_session_stack(self, request):
+        return not request.path_info.startswith(self.session_free_paths)
+
+    def __call__(self, request):
+        if self._uses_session_stack(request):
+            return self.session_stack(request)
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Call process_view of the session stack, i.e. CSRF checks."""
+        if not self._uses_session_stack(request):
+            return None
+        for process_view in self.view_hooks:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        """Call process_exception of the session stack."""
+        if not self._uses_session_stack(request):
+            return None
+        for process_exception in self.exception_hooks:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject requests early with 503 once they queued too long before
+    reaching Django (per the proxy's X-Request-Start header), or would
+    finish after the proxy timed out given their view's recent latency.
+    Cheap, important requests tolerate more queueing than bulk writes
+    and uploads, so those are shed first.
+
+    Each uWSGI worker serves up to --threads requests at once, which
+    LOAD_SHEDDING['MAX_IN_FLIGHT'] should match. Writes and bulk requests
+    may only hold part of those threads, keeping the rest free for reads
+    while slow uploads pile up.
+    """
+    # Part of LOAD_SHEDDING['MAX_IN_FLIGHT'] each priority may use
+    in_flight_share = {'critical': 1, 'read': 1, 'write': 0.75, 'bulk': 0.5}
+    # Weight of the latest request in a view's latency average
+    latency_weight = 0.2
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_queue_delay = settings.LOAD_SHEDDING['MAX_QUEUE_DELAY']
+        self.timeout = settings.LOAD_SHEDDING['TIMEOUT']
+        self.max_in_flight = settings.LOAD_SHEDDING['MAX_IN_FLIGHT']
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        # view name -> moving average of its latency in seconds
+        self.latency = {}
+
+    def __call__(self, request):
+        start = time.time()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            response = self.get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        match = request.resolver_match
+        if match and not getattr(response, 'load_shed', False):
+            self._record_latency(match.view_name, time.time() - start)
+        return response
+
+    def _record_latency(self, view_name, seconds):
+        average = self.latency.get(view_name, seconds)
+        self.latency[view_name] = (
+            average + (seconds - average) * self.latency_weight
+        )
+
+    def queue_delay(self, request):
+        """Return seconds the request waited before reaching Django."""
+        header = request.META.get('HTTP_X_REQUEST_START', '')
+        try:
+            started = float(header.removeprefix('t='))
+        except ValueError:
+            return 0
+        return max(0, time.time() - started)
+
+    def get_priority(self, request, view_func):
+        """Return the priority of the view handling a request."""
+        # DRF views carry attributes on their class, plain views on itself
+        view = getattr(view_func, 'cls', view_func)
+        priority = getattr(view, 'load_shedding_priority', None)
+        if isinstance(priority, dict):
+            # Viewsets give priorities per action, i.e. 'upload_image'
+            actions = getattr(view_func, 'actions', None) or {}
+            priority = priority.get(actions.get(request.method.lower()))
+        if priority:
+            return priority
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        priority = self.get_priority(request, view_func)
+        queued = self.queue_delay(request)
+        expected = self.latency.get(request.resolver_match.view_name, 0)
+
+        if (
+            queued > self.max_queue_delay[priority]
+            or queued + expected > self.timeout
+        ):
+            return self.shed(retry_after=queued)
+        if self.max_in_flight and self.in_flight > (
+            self.max_in_flight * self.in_flight_share[priority]
+        ):
+            return self.shed(retry_after=1)
+        return None
+
+    def shed(self, retry_after):
+        """Return a 503 asking the client to retry later."""
+        response = JsonResponse(
+            {'detail': 'Service overloaded, please retry later.'},
+            status=503,
+        )
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        response.load_shed = True
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.13 on 2026-10-19 00:53
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_upload'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'image'], name='core_recipe_user_image_idx'),
+        ),
+    ]
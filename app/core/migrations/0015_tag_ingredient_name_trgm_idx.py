@@ -0,0 +1,56 @@
+# Generated by Django 4.1.13 on 2026-10-19 01:04
+
+import django.contrib.postgres.indexes
+from django.db import DatabaseError, migrations
+
+TRIGRAM_INDEXES = [
+    ('core_ingredient', 'core_ingr_name_trgm_idx'),
+    ('core_tag', 'core_tag_name_trgm_idx'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Create the indexes if pg_trgm can be installed, else skip them."""
+    try:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Autocomplete falls back to prefix matches
+        return
+    for table, name in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON {table} USING gin (name gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for _, name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_recipe_user_price_time_idx'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(
+                    create_trigram_indexes, drop_trigram_indexes,
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='ingredient',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='core_ingr_name_trgm_idx', opclasses=['gin_trgm_ops']),
+                ),
+                migrations.AddIndex(
+                    model_name='tag',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='core_tag_name_trgm_idx', opclasses=['gin_trgm_ops']),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1.13 on 2026-10-19 01:15
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Recipes filled per statement, keeping transactions short
+BATCH_SIZE = 1000
+
+
+def fill_features(apps, schema_editor):
+    """Record the features of existing recipes, a batch at a time."""
+    Recipe = apps.get_model('core', 'Recipe')
+    last_id = 0
+    while True:
+        ids = list(
+            Recipe.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            return
+        schema_editor.execute(
+            'INSERT INTO core_recipefeatures (recipe_id, features) '
+            'SELECT id, array_cat('
+            'ARRAY(SELECT tag_id FROM core_recipe_tags '
+            'WHERE recipe_id = core_recipe.id), '
+            'ARRAY(SELECT -ingredient_id FROM core_recipe_ingredients '
+            'WHERE recipe_id = core_recipe.id)) '
+            'FROM core_recipe WHERE id BETWEEN %s AND %s '
+            'ON CONFLICT (recipe_id) DO NOTHING',
+            (ids[0], ids[-1]),
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_tag_ingredient_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeFeatures',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.recipe')),
+                ('features', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+            ],
+        ),
+        migrations.RunPython(fill_features, migrations.RunPython.noop),
+        # Built once filled, faster than updating it row by row
+        migrations.AddIndex(
+            model_name='recipefeatures',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['features'], name='core_recipe_features_idx'),
+        ),
+    ]
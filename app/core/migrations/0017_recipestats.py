@@ -0,0 +1,90 @@
+# Generated by Django 4.1.13 on 2026-10-19 01:22
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Users filled per statement, keeping transactions short
+BATCH_SIZE = 100
+
+
+def fill_stats(apps, schema_editor):
+    """Compute the stats of existing users, a batch at a time."""
+    User = apps.get_model('core', 'User')
+    last_id = 0
+    while True:
+        ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            return
+        bounds = (ids[0], ids[-1])
+        schema_editor.execute(
+            'INSERT INTO core_recipestats (user_id, recipe_count, '
+            'total_time_minutes, total_price, price_histogram) '
+            'SELECT u.id, count(r.id), coalesce(sum(r.time_minutes), 0), '
+            'coalesce(sum(r.price), 0), ARRAY['
+            'count(r.id) FILTER (WHERE r.price < 5), '
+            'count(r.id) FILTER (WHERE r.price >= 5 AND r.price < 10), '
+            'count(r.id) FILTER (WHERE r.price >= 10 AND r.price < 20), '
+            'count(r.id) FILTER (WHERE r.price >= 20 AND r.price < 50), '
+            'count(r.id) FILTER (WHERE r.price >= 50)] '
+            'FROM core_user u LEFT JOIN core_recipe r ON r.user_id = u.id '
+            'WHERE u.id BETWEEN %s AND %s GROUP BY u.id '
+            'ON CONFLICT (user_id) DO NOTHING',
+            bounds,
+        )
+        for table, through, fk in [
+            ('core_tag', 'core_recipe_tags', 'tag_id'),
+            ('core_ingredient', 'core_recipe_ingredients', 'ingredient_id'),
+        ]:
+            schema_editor.execute(
+                f'UPDATE {table} SET recipe_count = (SELECT count(*) '
+                f'FROM {through} WHERE {fk} = {table}.id) '
+                f'WHERE user_id BETWEEN %s AND %s',
+                bounds,
+            )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_recipefeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('total_time_minutes', models.BigIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('price_histogram', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'name'], name='core_ingr_user_count_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'name'], name='core_tag_user_count_idx'),
+        ),
+    ]
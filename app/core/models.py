@@ -5,7 +5,11 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -80,6 +84,36 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Serves case-insensitive prefix searches i.e. admin '^title'
+            models.Index(
+                OpClass(Upper('title'), name='text_pattern_ops'),
+                name='core_recipe_title_prefix_idx',
+            ),
+            # Serves delta syncs of a user's changes
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx',
+            ),
+            # Serves checks of who may download an image
+            models.Index(
+                fields=['user', 'image'],
+                name='core_recipe_user_image_idx',
+            ),
+            # Serve a user's recipes filtered and ordered by price or time,
+            # the ID breaking ties for a stable order
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='core_recipe_user_time_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -92,6 +126,32 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Kept up to date by core.stats
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='core_tag_name_prefix_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_tag_user_updated_idx',
+            ),
+            # Serves fuzzy autocomplete, only created given pg_trgm
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='core_tag_name_trgm_idx',
+            ),
+            # Serves a user's most used tags
+            models.Index(
+                fields=['user', '-recipe_count', 'name'],
+                name='core_tag_user_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -104,6 +164,193 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Kept up to date by core.stats
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='core_ingr_name_prefix_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_ingr_user_updated_idx',
+            ),
+            # Serves fuzzy autocomplete, only created given pg_trgm
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='core_ingr_name_trgm_idx',
+            ),
+            models.Index(
+                fields=['user', '-recipe_count', 'name'],
+                name='core_ingr_user_count_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient for delta syncs."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at'],
+                name='core_tombstone_user_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class UserDeletion(models.Model):
+    """Progress of deleting a user's data in the background."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    email = models.EmailField(max_length=255)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    recipes_deleted = models.IntegerField(default=0)
+    tags_deleted = models.IntegerField(default=0)
+    ingredients_deleted = models.IntegerField(default=0)
+    images_deleted = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.email
+
+
+class Job(models.Model):
+    """Background work waiting for or run by a worker."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED,
+    )
+    # Higher priorities run first
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.SmallIntegerField(default=0)
+    max_attempts = models.SmallIntegerField(default=5)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Updated while running, stops once its worker dies
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves workers claiming the next job, kept small by
+            # covering queued jobs only
+            models.Index(
+                fields=['-priority', 'run_at'],
+                name='core_job_queued_idx',
+                condition=models.Q(status='queued'),
+            ),
+            # Serves finding stale running and old finished jobs
+            models.Index(
+                fields=['status', 'started_at'],
+                name='core_job_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class StoredImage(models.Model):
+    """Reference count of a content-addressed image file."""
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.IntegerField(default=0)
+    # Last upload or release, orphans are collected a while after
+    updated_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return self.name
+
+
+class Upload(models.Model):
+    """Resumable upload of a recipe image, assembled on disk in parts."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    length = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.length} bytes)'
+
+
+class RecipeFeatures(models.Model):
+    """
+    Tags and ingredients of a recipe for finding similar ones, kept up
+    to date by core.similar apart from the recipe's row.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    # Tag IDs and negated ingredient IDs
+    features = ArrayField(models.BigIntegerField(), default=list)
+
+    class Meta:
+        indexes = [
+            # Inverted index from tags and ingredients to recipes
+            GinIndex(fields=['features'], name='core_recipe_features_idx'),
+        ]
+
+    def __str__(self):
+        return f'Features of recipe {self.recipe_id}'
+
+
+class RecipeStats(models.Model):
+    """Totals of a user's recipes, kept up to date by core.stats."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    recipe_count = models.IntegerField(default=0)
+    total_time_minutes = models.BigIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+    )
+    # Recipes per range of core.stats.PRICE_BUCKETS
+    price_histogram = ArrayField(models.IntegerField(), default=list)
+
+    def __str__(self):
+        return f'Stats of user {self.user_id}'
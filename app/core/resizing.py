@@ -0,0 +1,154 @@
+"""
+Images resized on request, kept in a disk cache of bounded size.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from core import imaging
+
+# Directory of the cache under MEDIA_ROOT
+PREFIX = 'resized/'
+
+# Extensions served, with their image format
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+
+# Files in the cache's root holding its size in bytes, shared by all
+# processes, and locked by the one evicting
+SIZE_FILE = '.size'
+EVICT_LOCK_FILE = '.evict'
+
+
+def cache_name(name, size, fmt):
+    """Return the cache's name of an image resized, under MEDIA_ROOT."""
+    key = hashlib.sha256(name.encode()).hexdigest()
+    return f'{PREFIX}{key[:2]}/{key}-{size[0]}x{size[1]}.{fmt}'
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, PREFIX)
+
+
+def _open_size_file():
+    fd = os.open(
+        os.path.join(cache_root(), SIZE_FILE), os.O_RDWR | os.O_CREAT, 0o644,
+    )
+    size_file = os.fdopen(fd, 'r+')
+    fcntl.flock(size_file, fcntl.LOCK_EX)
+    return size_file
+
+
+def _write_size(size_file, size):
+    size_file.seek(0)
+    size_file.truncate()
+    size_file.write(str(size))
+
+
+def add_size(added):
+    """
+    Add to the cache's recorded size and return it, or None while it is
+    unknown, i.e. until the first eviction walked the cache.
+    """
+    with _open_size_file() as size_file:
+        recorded = size_file.read()
+        if not recorded:
+            return None
+        size = int(recorded) + added
+        _write_size(size_file, size)
+    return size
+
+
+def resized(name, size, fmt):
+    """
+    Return the cache's name of an image resized to fit within size,
+    resizing it on a miss. Hits are marked recently used.
+    """
+    cached = cache_name(name, size, fmt)
+    path = os.path.join(settings.MEDIA_ROOT, cached)
+    try:
+        os.utime(path)
+        return cached
+    except FileNotFoundError:
+        pass
+
+    with default_storage.open(name) as source:
+        image = imaging.open_image(source)
+        output = imaging.reencode(image, size, FORMATS[fmt])
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(output.getvalue())
+        os.chmod(temp_path, 0o644)
+        # Concurrent misses of the same image each write it whole
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    # Walking the cache is left to the miss taking it past its limit
+    max_bytes = settings.RESIZED_IMAGES['MAX_BYTES']
+    size = add_size(len(output.getvalue()))
+    if size is None or size > max_bytes:
+        evict(max_bytes, int(max_bytes * settings.RESIZED_IMAGES['LOW_WATER']))
+
+    return cached
+
+
+def evict(max_bytes, low_water=None):
+    """
+    Delete the least recently used images until the cache fits in
+    low_water, max_bytes by default, if it is beyond max_bytes, then
+    record its size. Returns the number deleted, skipping the walk if
+    another process is already evicting.
+    """
+    low_water = max_bytes if low_water is None else low_water
+    os.makedirs(cache_root(), exist_ok=True)
+    with open(os.path.join(cache_root(), EVICT_LOCK_FILE), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        deleted, size = _evict(max_bytes, low_water)
+        # Images added during the walk are only counted by the next one
+        with _open_size_file() as size_file:
+            _write_size(size_file, size)
+
+    return deleted
+
+
+def _evict(max_bytes, low_water):
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_root()):
+        for filename in filenames:
+            if filename.endswith('.part') or filename.startswith('.'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0, total
+
+    deleted = 0
+    for _, size, path in sorted(entries):
+        if total <= low_water:
+            break
+        try:
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    return deleted, total
@@ -0,0 +1,102 @@
+"""
+Database routing to read replicas.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from psycopg2 import OperationalError as Psycopg2OpError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.utils import OperationalError
+
+# Alias reads of the current request go to, None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+# alias -> (checked at, lag in seconds or None if unreachable)
+_replica_lag = {}
+
+LAG_CHECK_INTERVAL = 1
+
+LAG_QUERY = """
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END,
+        0
+    )
+"""
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def current_read_alias():
+    """Return the alias reads are routed to, None for the primary."""
+    return _read_alias.get()
+
+
+def use_read_alias(alias):
+    """Route reads of the current request to a database alias."""
+    _read_alias.set(alias)
+
+
+def replica_lag(alias):
+    """Return a replica's lag in seconds, None if it is unreachable."""
+    checked_at, lag = _replica_lag.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < LAG_CHECK_INTERVAL:
+        return lag
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = float(cursor.fetchone()[0])
+    except (Psycopg2OpError, OperationalError):
+        connections[alias].close()
+        lag = None
+
+    _replica_lag[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """Return a random replica within the lag limit, None if there is none."""
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG:
+            healthy.append(alias)
+
+    return random.choice(healthy) if healthy else None
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    """Send a user's reads to the primary for a while after they write."""
+    cache.set(_pin_key(user), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    """Check whether a user wrote recently."""
+    return cache.get(_pin_key(user), False)
@@ -0,0 +1,43 @@
+"""
+Serializers shared by the APIs.
+"""
+from rest_framework import serializers
+
+from core import direct_uploads, imaging
+
+
+class ImageUploadField(serializers.FileField):
+    """
+    Image field checking uploads from their headers before decoding
+    them, instead of fully opening them like ImageField, and storing
+    them re-encoded without metadata.
+    """
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            return imaging.clean_upload(file)
+        except imaging.InvalidImage as exc:
+            raise serializers.ValidationError(str(exc), code='invalid_image')
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    """Serializer for images uploaded straight to object storage."""
+    content_type = serializers.ChoiceField(
+        choices=list(direct_uploads.CONTENT_TYPES), write_only=True,
+    )
+    url = serializers.URLField(
+        read_only=True, help_text='PUT the image here, with the headers.',
+    )
+    headers = serializers.DictField(
+        child=serializers.CharField(), read_only=True,
+    )
+    token = serializers.CharField(
+        read_only=True, help_text='Confirms the image once uploaded.',
+    )
+    expires_at = serializers.DateTimeField(read_only=True)
+
+
+class DirectUploadConfirmSerializer(serializers.Serializer):
+    """Serializer confirming an image uploaded to object storage."""
+    token = serializers.CharField()
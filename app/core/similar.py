@@ -0,0 +1,117 @@
+"""
+Recipes similar by their tags and ingredients.
+
+The tag IDs and negated ingredient IDs of each recipe are kept in a GIN
+indexed array, an inverted index from tags and ingredients to recipes.
+Similar recipes are those sharing any of them, ranked by the Jaccard
+index of the two sets.
+"""
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, router
+from django.db.models import BigIntegerField, FloatField, Func, Value
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient, RecipeFeatures
+from core.sync import deleted_with_user
+
+FEATURES_FIELD = ArrayField(BigIntegerField())
+
+REFRESH_SQL = """
+    INSERT INTO core_recipefeatures (recipe_id, features)
+    SELECT id, array_cat(
+        ARRAY(SELECT tag_id FROM core_recipe_tags
+              WHERE recipe_id = core_recipe.id),
+        ARRAY(SELECT -ingredient_id FROM core_recipe_ingredients
+              WHERE recipe_id = core_recipe.id)
+    )
+    FROM core_recipe WHERE id = ANY(%s)
+    ON CONFLICT (recipe_id) DO UPDATE SET features = EXCLUDED.features
+"""
+
+
+class Jaccard(Func):
+    """Jaccard index of two arrays without duplicates, from 0 to 1."""
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        lhs, lhs_params = compiler.compile(self.source_expressions[0])
+        rhs, rhs_params = compiler.compile(self.source_expressions[1])
+        # OFFSET 0 keeps the count from being inlined into both sides of
+        # the ratio, so it runs once per row
+        sql = (
+            f'(SELECT shared::float / (cardinality({lhs}) '
+            f'+ cardinality({rhs}) - shared) '
+            f'FROM (SELECT count(*) AS shared FROM unnest({lhs}) AS element '
+            f'WHERE element = ANY({rhs}) OFFSET 0) AS overlap)'
+        )
+        return sql, (*lhs_params, *rhs_params) * 2
+
+
+def feature(obj):
+    """Return the feature of a tag or an ingredient."""
+    return obj.pk if isinstance(obj, Tag) else -obj.pk
+
+
+def refresh_features(recipe_ids):
+    """Record the current features of recipes in one query."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    using = router.db_for_write(RecipeFeatures)
+    with connections[using].cursor() as cursor:
+        cursor.execute(REFRESH_SQL, [recipe_ids])
+
+
+def recipes_with(obj):
+    """Return the IDs of recipes recorded with a tag or an ingredient."""
+    return RecipeFeatures.objects.filter(
+        features__contains=[feature(obj)],
+    ).values_list('recipe_id', flat=True)
+
+
+def similar_recipes(recipe, limit):
+    """
+    Return up to limit of the owner's other recipes sharing tags or
+    ingredients with recipe, most similar first, annotated with their
+    similarity.
+    """
+    features = RecipeFeatures.objects.filter(
+        recipe=recipe,
+    ).values_list('features', flat=True).first()
+    if not features:
+        return Recipe.objects.none()
+
+    return Recipe.objects.filter(
+        user_id=recipe.user_id,
+        recipefeatures__features__overlap=features,
+    ).exclude(pk=recipe.pk).annotate(
+        similarity=Jaccard(
+            'recipefeatures__features', Value(features, FEATURES_FIELD),
+        ),
+    ).order_by('-similarity', '-id')[:limit]
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_features(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh the features of recipes whose tags or ingredients changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_features([instance.pk])
+    elif pk_set is None:
+        # Cleared from all its recipes, which are still recorded with it
+        refresh_features(recipes_with(instance))
+    else:
+        refresh_features(pk_set)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def remove_feature(sender, instance, origin=None, **kwargs):
+    """Refresh the features of recipes a deleted tag or ingredient was on."""
+    # The user's recipes go along with it
+    if deleted_with_user(origin):
+        return
+    refresh_features(recipes_with(instance))
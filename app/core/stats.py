@@ -0,0 +1,281 @@
+"""
+Statistics of a user's recipes, maintained as they change.
+
+A RecipeStats row per user holds totals updated by the change of each
+recipe saved or deleted, and tags and ingredients count the recipes
+they are on, so reading stats never scans the recipes.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient, RecipeStats
+from core.sync import deleted_with_user
+
+# Upper bounds of the price ranges counted, the last range has none
+PRICE_BUCKETS = [Decimal(5), Decimal(10), Decimal(20), Decimal(50)]
+
+# Fields of a recipe counted in its user's totals
+COUNTED_FIELDS = ('time_minutes', 'price')
+
+# Most used tags and ingredients listed
+TOP_COUNT = 5
+
+# Through model of the recipes of each counted model
+LINKS = {
+    Tag: Recipe.tags.through,
+    Ingredient: Recipe.ingredients.through,
+}
+
+CHANGE_SQL = """
+    INSERT INTO core_recipestats
+        (user_id, recipe_count, total_time_minutes, total_price,
+         price_histogram)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE SET
+        recipe_count = core_recipestats.recipe_count
+            + EXCLUDED.recipe_count,
+        total_time_minutes = core_recipestats.total_time_minutes
+            + EXCLUDED.total_time_minutes,
+        total_price = core_recipestats.total_price + EXCLUDED.total_price,
+        price_histogram = ARRAY(
+            SELECT coalesce(old, 0) + coalesce(new, 0)
+            FROM unnest(
+                core_recipestats.price_histogram, EXCLUDED.price_histogram
+            ) WITH ORDINALITY AS counts(old, new, position)
+            ORDER BY position
+        )
+"""
+
+
+def price_bucket(price):
+    """Return the index of the price range a price falls in."""
+    return bisect_right(PRICE_BUCKETS, price)
+
+
+def price_ranges():
+    """Return the (min, max) of each price range, None if unbounded."""
+    bounds = [None, *PRICE_BUCKETS, None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def apply_change(user_id, removed=None, added=None):
+    """
+    Update a user's totals in one query for a recipe's counted values
+    removed and/or added, i.e. {'time_minutes': 10, 'price': 5}.
+    """
+    recipe_count, time_minutes, price = 0, 0, Decimal(0)
+    histogram = [0] * (len(PRICE_BUCKETS) + 1)
+    for values, sign in ((removed, -1), (added, 1)):
+        if values is None:
+            continue
+        recipe_count += sign
+        time_minutes += sign * values['time_minutes']
+        price += sign * Decimal(values['price'])
+        histogram[price_bucket(Decimal(values['price']))] += sign
+    if not (recipe_count or time_minutes or price or any(histogram)):
+        return
+
+    using = router.db_for_write(RecipeStats)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            CHANGE_SQL,
+            [user_id, recipe_count, time_minutes, price, histogram],
+        )
+
+
+def recipe_usage(model):
+    """Return an expression counting the recipes of a tag or ingredient."""
+    through = LINKS[model]
+    fk = model._meta.model_name
+    usage = through.objects.filter(
+        **{fk: OuterRef('pk')}
+    ).order_by().values(fk).annotate(count=Count('*')).values('count')
+
+    return Coalesce(Subquery(usage), 0)
+
+
+def recount(model, ids):
+    """Count the recipes of some tags or ingredients again."""
+    ids = list(ids)
+    if ids:
+        model.objects.filter(pk__in=ids).update(
+            recipe_count=recipe_usage(model),
+        )
+
+
+def rebuild(user_ids):
+    """
+    Compute the stats of users from all their recipes, replacing their
+    totals and the recipe counts of their tags and ingredients.
+    """
+    price_counts = {
+        f'bucket_{index}': Count('id', filter=Q(
+            *([Q(price__gte=low)] if low is not None else []),
+            *([Q(price__lt=high)] if high is not None else []),
+        ))
+        for index, (low, high) in enumerate(price_ranges())
+    }
+    with transaction.atomic():
+        RecipeStats.objects.bulk_create(
+            [RecipeStats(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        # Changes committing meanwhile wait, none are lost or doubled
+        list(RecipeStats.objects.select_for_update().filter(
+            user_id__in=user_ids,
+        ).values_list('pk'))
+        totals = {
+            row.pop('user_id'): row for row in Recipe.objects.filter(
+                user_id__in=user_ids,
+            ).order_by().values('user_id').annotate(
+                recipe_count=Count('id'),
+                total_time_minutes=Sum('time_minutes'),
+                total_price=Sum('price'),
+                **price_counts,
+            )
+        }
+        stats = []
+        for user_id in user_ids:
+            row = totals.get(user_id, {})
+            stats.append(RecipeStats(
+                user_id=user_id,
+                recipe_count=row.get('recipe_count', 0),
+                total_time_minutes=row.get('total_time_minutes', 0),
+                total_price=row.get('total_price', 0),
+                price_histogram=[
+                    row.get(name, 0) for name in price_counts
+                ],
+            ))
+        RecipeStats.objects.bulk_update(stats, [
+            'recipe_count', 'total_time_minutes', 'total_price',
+            'price_histogram',
+        ])
+
+        for model in LINKS:
+            model.objects.filter(user_id__in=user_ids).update(
+                recipe_count=recipe_usage(model),
+            )
+
+
+def user_stats(user):
+    """
+    Return a user's recipe count, average time and price, recipes per
+    price range and most used tags and ingredients.
+    """
+    stats = RecipeStats.objects.filter(user=user).first() or RecipeStats()
+    count = stats.recipe_count
+    histogram = stats.price_histogram or []
+    price_counts = [
+        {
+            'min': low,
+            'max': high,
+            'count': histogram[index] if index < len(histogram) else 0,
+        }
+        for index, (low, high) in enumerate(price_ranges())
+    ]
+    top = {
+        model: model.objects.filter(
+            user=user, recipe_count__gt=0,
+        ).order_by('-recipe_count', 'name')[:TOP_COUNT]
+        for model in LINKS
+    }
+
+    return {
+        'recipe_count': count,
+        'average_time_minutes': (
+            stats.total_time_minutes / count if count else None
+        ),
+        'average_price': (
+            (stats.total_price / count).quantize(Decimal('0.01'))
+            if count else None
+        ),
+        'price_ranges': price_counts,
+        'top_tags': top[Tag],
+        'top_ingredients': top[Ingredient],
+    }
+
+
+def _counted_values(recipe):
+    return {field: getattr(recipe, field) for field in COUNTED_FIELDS}
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_counted(sender, instance, update_fields=None, **kwargs):
+    """Load the counted values being replaced, if any might be."""
+    instance._counted = None
+    saved = COUNTED_FIELDS if update_fields is None else update_fields
+    if (
+        set(COUNTED_FIELDS) & set(saved)
+        and instance.pk is not None
+        and not instance._state.adding
+    ):
+        instance._counted = sender.objects.filter(
+            pk=instance.pk,
+        ).values(*COUNTED_FIELDS).first()
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, **kwargs):
+    """Add a new recipe to its user's totals, or the change of one."""
+    if created:
+        apply_change(instance.user_id, added=_counted_values(instance))
+    elif getattr(instance, '_counted', None):
+        apply_change(
+            instance.user_id,
+            removed=instance._counted,
+            added=_counted_values(instance),
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_links(sender, instance, origin=None, **kwargs):
+    """Load the tags and ingredients a deleted recipe was on."""
+    instance._linked = {}
+    # The user's stats go along with them
+    if deleted_with_user(origin):
+        return
+    for model, through in LINKS.items():
+        fk = f'{model._meta.model_name}_id'
+        instance._linked[model] = list(through.objects.filter(
+            recipe_id=instance.pk,
+        ).values_list(fk, flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, origin=None, **kwargs):
+    """Take a deleted recipe out of its user's stats."""
+    if deleted_with_user(origin):
+        return
+    apply_change(instance.user_id, removed=_counted_values(instance))
+    for model, ids in getattr(instance, '_linked', {}).items():
+        recount(model, ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_links(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Count the recipes of tags and ingredients added or removed."""
+    if reverse:
+        # A tag or ingredient's recipes changed, whichever they were
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recount(type(instance), [instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared = list(model.objects.filter(
+            recipe=instance,
+        ).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recount(model, getattr(instance, '_cleared', []))
+    elif action in ('post_add', 'post_remove'):
+        recount(model, pk_set)
@@ -0,0 +1,86 @@
+"""
+Custom storage backends.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static storage writing content-hashed files, a manifest and
+    precompressed '.gz'/'.br' siblings during collectstatic.
+    """
+    # Already compressed formats gain nothing from another pass
+    skip_compress_extensions = (
+        '.gz', '.br', '.zip', '.png', '.jpg', '.jpeg', '.gif', '.webp',
+        '.ico', '.woff', '.woff2', '.mp4', '.webm',
+    )
+    min_compress_size = 256
+
+    def stored_name(self, name):
+        """Return unhashed names until collectstatic wrote a manifest."""
+        # i.e. local development and test runs never collect static files
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def url_converter(self, name, hashed_files, template=None):
+        """Leave references to files missing from the build untouched."""
+        converter = super().url_converter(name, hashed_files, template)
+
+        def converter_ignoring_missing(matchobj):
+            # i.e. source maps referenced by, but not shipped with, packages
+            try:
+                return converter(matchobj)
+            except ValueError:
+                return matchobj.group(0)
+
+        return converter_ignoring_missing
+
+    def post_process(self, *args, **kwargs):
+        """Hash files, save the manifest and compress hashed files."""
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+
+        for hashed_name in set(self.hashed_files.values()):
+            self._compress(hashed_name)
+
+    def _compress(self, name):
+        """Write compressed siblings of a file if they save space."""
+        if os.path.splitext(name)[1].lower() in self.skip_compress_extensions:
+            return
+
+        compressors = [('.gz', self._gzip)]
+        if brotli is not None:
+            compressors.append(('.br', brotli.compress))
+        # Hashed names are unique per content, so keep earlier output
+        compressors = [
+            (suffix, compress) for suffix, compress in compressors
+            if not self.exists(name + suffix)
+        ]
+        if not compressors:
+            return
+
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < self.min_compress_size:
+            return
+
+        for suffix, compress in compressors:
+            compressed = compress(content)
+            if len(compressed) >= len(content):
+                continue
+            self._save(name + suffix, ContentFile(compressed))
+
+    def _gzip(self, content):
+        """Gzip content with a fixed mtime, so output is reproducible."""
+        return gzip.compress(content, compresslevel=9, mtime=0)
@@ -0,0 +1,70 @@
+"""
+Delta sync tokens and tombstones for deleted objects.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone as django_timezone
+
+from core.deletion import purging
+from core.models import Recipe, Tag, Ingredient, Tombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def make_token(when):
+    """Return the sync token for a point in time."""
+    return str((when - EPOCH) // MICROSECOND)
+
+
+def parse_token(token):
+    """Return the point in time of a sync token, ValueError if invalid."""
+    return EPOCH + int(token) * MICROSECOND
+
+
+def current_token():
+    """
+    Return the token for the changes seen now. It trails the clock so
+    changes still committing, or saved by servers with a slightly late
+    clock, are sent on the next sync too; clients apply them again.
+    """
+    return make_token(
+        django_timezone.now()
+        - timedelta(seconds=settings.SYNC_TOKEN_MARGIN)
+    )
+
+
+def tombstone_horizon():
+    """Return the time before which tombstones may have been pruned."""
+    return django_timezone.now() - timedelta(
+        days=settings.SYNC_TOMBSTONE_DAYS
+    )
+
+
+def deleted_with_user(origin):
+    """Check whether a deletion is part of deleting the user."""
+    user_model = get_user_model()
+    return (
+        purging()
+        or isinstance(origin, user_model)
+        or getattr(origin, 'model', None) is user_model
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_deletion(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone for syncing clients to remove the object."""
+    # The user's clients go along with all their data
+    if deleted_with_user(origin):
+        return
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
@@ -1,11 +1,19 @@
 """
 Test for the Django admin modifications.
 """
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test import Client
 
+from core import models
+from core.admin import EstimatedCountPaginator
+
 
 class AdminSiteTests(TestCase):
     """Tests for Django admin."""
@@ -45,3 +53,184 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+class RecipeAdminTests(TestCase):
+    """Tests for the recipe, tag and ingredient admin pages."""
+
+    def setUp(self):
+        """Create an admin client and some users with recipes."""
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client = Client()
+        self.client.force_login(self.admin_user)
+
+    def _create_recipes(self, count, start=0):
+        """Create recipes each owned by a different user."""
+        for i in range(start, start + count):
+            user = get_user_model().objects.create_user(
+                email=f'user{i}@example.com',
+                password='testpass123',
+            )
+            models.Recipe.objects.create(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('5.00'),
+            )
+
+    def _count_queries(self, url, **params):
+        """Return the number of queries run to render a page."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+
+        return len(ctx.captured_queries)
+
+    def test_recipe_changelist_queries_constant(self):
+        """Test listing recipes doesn't query each recipe's user."""
+        url = reverse('admin:core_recipe_changelist')
+        self._create_recipes(1)
+        queries = self._count_queries(url)
+
+        self._create_recipes(5, start=1)
+
+        self.assertEqual(self._count_queries(url), queries)
+
+    def test_search_by_prefix(self):
+        """Test searching recipes and tags matches name prefixes."""
+        self._create_recipes(1)
+        models.Tag.objects.create(user=self.admin_user, name='Vegan')
+
+        res = self.client.get(
+            reverse('admin:core_recipe_changelist'), {'q': 'recipe'}
+        )
+        self.assertContains(res, 'Recipe 0')
+
+        res = self.client.get(
+            reverse('admin:core_tag_changelist'), {'q': 'veg'}
+        )
+        self.assertContains(res, 'Vegan')
+
+    def test_change_pages(self):
+        """Test recipe and ingredient edit pages render."""
+        self._create_recipes(1)
+        recipe = models.Recipe.objects.get()
+        ingredient = models.Ingredient.objects.create(
+            user=self.admin_user, name='Salt'
+        )
+
+        for url in [
+            reverse('admin:core_recipe_change', args=[recipe.id]),
+            reverse('admin:core_ingredient_change', args=[ingredient.id]),
+        ]:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+
+    @patch('core.admin.estimated_count', return_value=5000000)
+    def test_paginator_estimates_large_tables(self, patched_estimate):
+        """Test unfiltered large tables use the planner estimate."""
+        paginator = EstimatedCountPaginator(models.Recipe.objects.all(), 100)
+
+        self.assertEqual(paginator.count, 5000000)
+
+    @patch('core.admin.estimated_count', return_value=5000000)
+    def test_paginator_counts_filtered_lists(self, patched_estimate):
+        """Test filtered lists are counted exactly."""
+        self._create_recipes(2)
+        queryset = models.Recipe.objects.filter(title__startswith='Recipe')
+        paginator = EstimatedCountPaginator(queryset, 100)
+
+        self.assertEqual(paginator.count, 2)
+        patched_estimate.assert_not_called()
+
+    @patch('core.admin.estimated_count', return_value=10)
+    def test_paginator_counts_small_tables(self, patched_estimate):
+        """Test small tables are counted exactly."""
+        self._create_recipes(2)
+        paginator = EstimatedCountPaginator(models.Recipe.objects.all(), 100)
+
+        self.assertEqual(paginator.count, 2)
+
+
+class UserDeletionAdminTests(TestCase):
+    """Tests for deleting users from the admin."""
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        ))
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        models.Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def test_delete_confirmation_skips_related_objects(self):
+        """Test the confirmation page doesn't collect the user's data."""
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, 'Soup')
+
+    def test_delete_defers_to_background(self):
+        """Test deleting a user deactivates them and queues the purge."""
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+        self.client.post(url, {'post': 'yes'})
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(models.Recipe.objects.exists())
+        self.assertTrue(
+            models.UserDeletion.objects.filter(user=self.user).exists()
+        )
+
+
+class JobAdminTests(TestCase):
+    """Tests for the background jobs dashboard."""
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        ))
+
+    def test_dashboard_shows_counts(self):
+        """Test the job list shows counts per status."""
+        models.Job.objects.create(name='core.deletion.purge_deleted_user')
+        models.Job.objects.create(
+            name='core.deletion.purge_deleted_user', status=models.Job.FAILED,
+        )
+
+        res = self.client.get(reverse('admin:core_job_changelist'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, '<strong>failed</strong> 1')
+        self.assertContains(res, '<strong>queued</strong> 1')
+        self.assertContains(res, 'oldest ready job waiting since')
+
+    def test_retry_action(self):
+        """Test failed jobs can be queued again."""
+        job = models.Job.objects.create(
+            name='core.deletion.purge_deleted_user',
+            status=models.Job.FAILED,
+            attempts=5,
+        )
+
+        self.client.post(reverse('admin:core_job_changelist'), {
+            'action': 'retry',
+            '_selected_action': [job.pk],
+        })
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.Job.QUEUED)
+        self.assertEqual(job.attempts, 0)
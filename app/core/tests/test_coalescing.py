@@ -0,0 +1,175 @@
+"""
+Tests for single-flight request coalescing.
+"""
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import coalescing
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def run_concurrently(single_flight, key, compute, count):
+    """Call single_flight.do from threads, return their outcomes."""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(single_flight.do(key, compute))
+        except Exception as exc:
+            outcomes.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Test coalescing within a worker."""
+
+    def setUp(self):
+        self.single_flight = coalescing.SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return ['result']
+
+    def fail(self):
+        self.started.set()
+        self.release.wait(5)
+        raise ValueError('failed')
+
+    def run_in_flight(self, leader_compute, followers):
+        """Start a leader, then followers while it computes."""
+        leader, outcomes = run_concurrently(
+            self.single_flight, 'key', leader_compute, 1
+        )
+        self.started.wait(5)
+        threads, follower_outcomes = run_concurrently(
+            self.single_flight, 'key', self.compute, followers
+        )
+        # Give the followers time to queue behind the leader
+        time.sleep(0.1)
+        self.release.set()
+        for thread in leader + threads:
+            thread.join()
+        return outcomes, follower_outcomes
+
+    def test_concurrent_calls_compute_once(self):
+        """Test callers in flight together share one computation."""
+        outcomes, follower_outcomes = self.run_in_flight(self.compute, 4)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [(['result'], False)])
+        self.assertEqual(follower_outcomes, [(['result'], True)] * 4)
+        self.assertEqual(
+            self.single_flight.stats, {'computed': 1, 'coalesced': 4}
+        )
+
+    def test_sequential_calls_compute_again(self):
+        """Test a finished computation is not reused."""
+        self.release.set()
+        self.single_flight.do('key', self.compute)
+        result, coalesced = self.single_flight.do('key', self.compute)
+
+        self.assertEqual(result, ['result'])
+        self.assertFalse(coalesced)
+        self.assertEqual(self.calls, 2)
+
+    def test_followers_get_leader_error(self):
+        """Test an error of the computation is raised to all callers."""
+        outcomes, follower_outcomes = self.run_in_flight(self.fail, 2)
+
+        for outcome in outcomes + follower_outcomes:
+            self.assertIsInstance(outcome, ValueError)
+        self.assertEqual(self.calls, 0)
+        self.assertNotIn('key', self.single_flight._calls)
+
+    @override_settings(COALESCE_ACROSS_WORKERS=True)
+    def test_shared_result_used_by_other_worker(self):
+        """Test a result computed by another worker is shared."""
+        self.release.set()
+        other_worker = coalescing.SingleFlight()
+        other_worker.do('shared-key', self.compute)
+        cache.add('coalesce-lock:shared-key', True)
+
+        try:
+            result, coalesced = self.single_flight.do(
+                'shared-key', self.compute
+            )
+        finally:
+            cache.delete('coalesce-lock:shared-key')
+
+        self.assertEqual(result, ['result'])
+        self.assertTrue(coalesced)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.single_flight.stats['coalesced'], 1)
+
+
+class LocalGenerationTests(SimpleTestCase):
+    """Test invalidating in-flight reads within a worker."""
+
+    def test_invalidate_bumps_generation(self):
+        """Test writes change the key of reads computed in this worker."""
+        user = get_user_model()(pk=1)
+        before = coalescing.generation(user)
+        coalescing.invalidate(user)
+
+        self.assertNotEqual(coalescing.generation(user), before)
+
+
+@override_settings(COALESCE_ACROSS_WORKERS=True)
+class GenerationTests(TestCase):
+    """Test invalidating shared results on writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+
+    def test_invalidate_bumps_generation(self):
+        """Test writes change the key of shared results."""
+        before = coalescing.generation(self.user)
+        coalescing.invalidate(self.user)
+
+        self.assertNotEqual(coalescing.generation(self.user), before)
+
+    def test_write_invalidates_reads(self):
+        """Test a write through the API stops sharing older reads."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        before = coalescing.generation(self.user)
+
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        res = client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotEqual(coalescing.generation(self.user), before)
+
+    def test_lone_read_not_coalesced(self):
+        """Test a read without concurrent twins is computed normally."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['name'], 'Vegan')
+        self.assertNotIn('X-Coalesced', res)
@@ -2,34 +2,152 @@
 Test custom Django management commands.
 """
 
-from unittest.mock import patch
-
-from psycopg2 import OperationalError as Psycopg2Error
+import itertools
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch, MagicMock
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Recipe, RecipeStats, Tag, Tombstone
 
 
-@patch('core.management.commands.wait_for_db.Command.check')
+@patch('core.management.commands.wait_for_db.database_available')
 class CommandTests(SimpleTestCase):
     """Test Commands"""
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_available):
         """ Test waiting for database if database is ready. """
-        patched_check.return_value = True
+        patched_available.return_value = True
 
-        call_command('wait_for_db')
+        call_command('wait_for_db', stdout=StringIO())
 
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_available.assert_called_once_with()
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
-        """ Test waiting for database when getting Operational Error. """
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-            [OperationalError] * 3 + [True]
+    def test_wait_for_db_delay(self, patched_sleep, patched_available):
+        """ Test retrying with growing, bounded delays while unavailable. """
+        patched_available.side_effect = [False] * 6 + [True]
+
+        call_command('wait_for_db', max_delay=1, stdout=StringIO())
+
+        self.assertEqual(patched_available.call_count, 7)
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), 6)
+        self.assertLessEqual(delays[0], 0.1)
+        self.assertGreater(delays[3], delays[0])
+        self.assertTrue(all(delay <= 1 for delay in delays))
+
+    @patch('time.monotonic', side_effect=itertools.count(step=4))
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(
+        self, patched_sleep, patched_monotonic, patched_available
+    ):
+        """ Test giving up once the timeout is exceeded. """
+        patched_available.return_value = False
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=10, stdout=StringIO())
+
+        self.assertEqual(patched_available.call_count, 3)
+
+    @patch('core.management.commands.wait_for_db.migrations_applied')
+    @patch('time.sleep')
+    def test_wait_for_migrations(
+        self, patched_sleep, patched_migrations, patched_available
+    ):
+        """ Test optionally waiting for migrations to be applied. """
+        patched_available.return_value = True
+        patched_migrations.side_effect = [False, False, True]
+
+        call_command('wait_for_db', migrations=True, stdout=StringIO())
+
+        self.assertEqual(patched_migrations.call_count, 3)
+        self.assertEqual(patched_sleep.call_count, 2)
+
+
+@patch('core.management.commands.profile_startup.subprocess.run')
+class ProfileStartupTests(SimpleTestCase):
+    """Test profiling startup time."""
+
+    def test_reports_slowest_imports(self, patched_run):
+        """Test imports are reported slowest first, limited to top N."""
+        patched_run.return_value = MagicMock(stderr=(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |   yaml\n'
+            'import time:       500 |      90000 |   rest_framework\n'
+            'import time:      1000 |     120000 | app.wsgi\n'
+        ))
+        out = StringIO()
+
+        call_command('profile_startup', top=2, runs=3, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn('app.wsgi', lines[2])
+        self.assertIn('rest_framework', lines[3])
+        self.assertNotIn('yaml', out.getvalue())
+        self.assertIn('Cold start over 3 runs', lines[4])
+        # One importtime profile plus one run per cold start
+        self.assertEqual(patched_run.call_count, 4)
+
+
+class PruneTombstonesTests(TestCase):
+    """Test pruning tombstones of deleted objects."""
+
+    @override_settings(SYNC_TOMBSTONE_DAYS=30)
+    def test_prunes_old_tombstones(self):
+        """Test tombstones past the retention are deleted."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        old = Tombstone.objects.create(user=user, model='tag', object_id=1)
+        Tombstone.objects.filter(id=old.id).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+        recent = Tombstone.objects.create(user=user, model='tag', object_id=2)
+
+        call_command('prune_tombstones', stdout=StringIO())
+
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+
+class RebuildRecipeStatsTests(TestCase):
+    """Test rebuilding recipe stats from scratch."""
+
+    def test_rebuilds_drifted_stats(self):
+        """Test stats and tag counts are computed again for every user."""
+        users = [
+            get_user_model().objects.create_user(
+                f'user{index}@example.com', 'testpass123',
+            )
+            for index in range(3)
+        ]
+        recipe = Recipe.objects.create(
+            user=users[0], title='Soup', time_minutes=30,
+            price=Decimal('12.00'),
+        )
+        tag = Tag.objects.create(user=users[0], name='Dinner')
+        recipe.tags.add(tag)
+        RecipeStats.objects.all().delete()
+        Tag.objects.update(recipe_count=7)
 
-        call_command('wait_for_db')
+        out = StringIO()
+        call_command('rebuild_recipe_stats', batch_size=2, stdout=out)
 
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+        stats = RecipeStats.objects.get(user=users[0])
+        self.assertEqual(stats.recipe_count, 1)
+        self.assertEqual(stats.total_time_minutes, 30)
+        self.assertEqual(stats.total_price, Decimal('12.00'))
+        self.assertEqual(stats.price_histogram, [0, 0, 1, 0, 0])
+        self.assertEqual(
+            RecipeStats.objects.get(user=users[2]).price_histogram,
+            [0, 0, 0, 0, 0],
+        )
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertIn('3 users', out.getvalue())
@@ -0,0 +1,137 @@
+"""
+Tests for deleting users and their data in chunks.
+"""
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import deletion, jobs
+from core.models import (
+    Job,
+    Recipe,
+    StoredImage,
+    Tag,
+    Ingredient,
+    Tombstone,
+    UserDeletion,
+)
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email, password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(
+        user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+        **params,
+    )
+
+
+class UserDeletionTests(TestCase):
+    """Test user deletion requests and purges."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_request_deactivates_user(self):
+        """Test requesting deletion deactivates the user at once."""
+        create_recipe(self.user)
+
+        user_deletion = deletion.request_user_deletion(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(user_deletion.email, 'user@example.com')
+        self.assertIsNone(user_deletion.finished_at)
+        self.assertEqual(Recipe.objects.count(), 1)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'core.deletion.purge_deleted_user')
+        self.assertEqual(job.kwargs, {'deletion_id': user_deletion.pk})
+
+    def test_purge_job(self):
+        """Test the queued job purges the user."""
+        deletion.request_user_deletion(self.user)
+        job, = jobs.claim('worker-1')
+
+        jobs.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_purge_deletes_data_in_chunks(self):
+        """Test a purge deletes all data and tracks progress."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for _ in range(5):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        other = create_recipe(create_user(email='other@example.com'))
+        other.tags.add(Tag.objects.create(user=other.user, name='Keep'))
+        user_deletion = deletion.request_user_deletion(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            deletion.purge_user(user_deletion, chunk_size=2)
+
+        recipe_deletes = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('DELETE FROM "core_recipe" ')
+        ]
+        self.assertEqual(len(recipe_deletes), 3)
+        user_deletion.refresh_from_db()
+        self.assertIsNotNone(user_deletion.finished_at)
+        self.assertIsNone(user_deletion.user)
+        self.assertEqual(user_deletion.recipes_deleted, 5)
+        self.assertEqual(user_deletion.tags_deleted, 1)
+        self.assertEqual(user_deletion.ingredients_deleted, 1)
+        self.assertFalse(
+            get_user_model().objects.filter(email='user@example.com').exists()
+        )
+        self.assertEqual(list(Recipe.objects.all()), [other])
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_purge_releases_images(self):
+        """Test recipe images are released for collection."""
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                recipe = create_recipe(self.user)
+                recipe.image.save(
+                    'food.jpg', SimpleUploadedFile('food.jpg', b'jpeg'),
+                )
+                user_deletion = deletion.request_user_deletion(self.user)
+
+                deletion.purge_user(user_deletion)
+
+        user_deletion.refresh_from_db()
+        self.assertEqual(user_deletion.images_deleted, 1)
+        self.assertEqual(StoredImage.objects.get().refs, 0)
+        self.assertTrue(
+            Job.objects.filter(name='core.images.collect_image').exists()
+        )
+
+    def test_purge_command(self):
+        """Test the command purges pending deletions only."""
+        deletion.request_user_deletion(self.user)
+        create_user(email='other@example.com')
+
+        call_command('purge_deleted_users', stdout=StringIO())
+
+        self.assertEqual(
+            list(get_user_model().objects.values_list('email', flat=True)),
+            ['other@example.com'],
+        )
+        self.assertTrue(
+            UserDeletion.objects.filter(finished_at__isnull=False).exists()
+        )
@@ -0,0 +1,143 @@
+"""
+Tests for recipe change events.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from core import events
+from core.models import Recipe, Tag
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email, password)
+
+
+class LocalBusTests(SimpleTestCase):
+    """Test delivering events within a process."""
+
+    def setUp(self):
+        self.bus = events.LocalBus()
+
+    def test_delivers_to_user_subscriptions(self):
+        """Test events reach only the subscriptions of their user."""
+        mine = self.bus.subscribe(1)
+        theirs = self.bus.subscribe(2)
+
+        self.bus.deliver({'user': 1, 'type': 'created'})
+
+        self.assertEqual(mine.get(timeout=0), {'user': 1, 'type': 'created'})
+        self.assertTrue(theirs.queue.empty())
+
+    def test_closed_subscription_gets_nothing(self):
+        """Test closing a subscription stops delivery."""
+        subscription = self.bus.subscribe(1)
+        subscription.close()
+
+        self.bus.deliver({'user': 1, 'type': 'created'})
+
+        self.assertTrue(subscription.queue.empty())
+        self.assertEqual(self.bus._subscriptions, {})
+
+    def test_stream_format(self):
+        """Test events are streamed as server-sent events."""
+        subscription = self.bus.subscribe(1)
+        self.bus.deliver({'user': 1, 'type': 'deleted', 'id': 5})
+        stream = events.stream(subscription, heartbeat=0, max_seconds=1)
+
+        self.assertEqual(next(stream), 'retry: 3000\n\n')
+        self.assertEqual(
+            next(stream),
+            'event: deleted\ndata: {"user": 1, "type": "deleted", "id": 5}'
+            '\n\n',
+        )
+        self.assertEqual(next(stream), ': keepalive\n\n')
+        stream.close()
+        self.assertEqual(self.bus._subscriptions, {})
+
+    def test_stream_ends_with_resync_on_overflow(self):
+        """Test a client too slow for its events is told to resync."""
+        subscription = self.bus.subscribe(1)
+        for _ in range(subscription.max_pending + 1):
+            self.bus.deliver({'user': 1, 'type': 'updated'})
+
+        chunks = list(events.stream(subscription, heartbeat=0, max_seconds=1))
+
+        self.assertEqual(chunks[-1], 'event: resync\ndata: {}\n\n')
+        self.assertEqual(self.bus._subscriptions, {})
+
+
+@override_settings(EVENTS_BACKEND='local')
+class SignalTests(TestCase):
+    """Test model changes publish events once committed."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.subscription = events.subscribe(self.user.pk)
+
+    def tearDown(self):
+        self.subscription.close()
+
+    def next_event(self):
+        return self.subscription.get(timeout=0)
+
+    def test_create_update_delete(self):
+        """Test events for the lifecycle of an object."""
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag_id = tag.id
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Vegetarian'
+            tag.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+
+        for event_type in ('created', 'updated', 'deleted'):
+            self.assertEqual(self.next_event(), {
+                'user': self.user.pk,
+                'type': event_type,
+                'model': 'tag',
+                'id': tag_id,
+            })
+
+    def test_not_published_before_commit(self):
+        """Test rolled back changes publish nothing."""
+        with self.captureOnCommitCallbacks(execute=False):
+            Recipe.objects.create(
+                user=self.user, title='Soup', time_minutes=5,
+                price=Decimal('1.00'),
+            )
+
+        self.assertTrue(self.subscription.queue.empty())
+
+
+@override_settings(EVENTS_BACKEND='postgres')
+class PostgresListenerTests(TransactionTestCase):
+    """Test events travel through LISTEN/NOTIFY."""
+
+    def test_notify_reaches_subscription(self):
+        """Test a published event is delivered by the listener."""
+        bus = events.LocalBus()
+        subscription = bus.subscribe(1)
+        listener = events.PostgresListener(bus)
+        listener.poll_timeout = 0.05
+        listener.start()
+        try:
+            event = {'user': 1, 'type': 'created', 'model': 'tag', 'id': 2}
+            # The listener may still be connecting, so publish until seen
+            for _ in range(100):
+                events.publish(event)
+                if not subscription.queue.empty():
+                    break
+                listener.join(0.05)
+            self.assertEqual(subscription.get(timeout=1), event)
+        finally:
+            listener.stop()
+            listener.join()
@@ -0,0 +1,95 @@
+"""
+Tests for health checks and probe endpoints.
+"""
+from unittest.mock import patch
+
+from psycopg2 import OperationalError as Psycopg2Error
+
+from django.contrib.auth import get_user_model
+from django.db.utils import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import health
+
+LIVE_URL = reverse('health-live')
+READY_URL = reverse('health-ready')
+METRICS_URL = reverse('health-metrics')
+
+
+class HealthCheckTests(TestCase):
+    """Test the health check helpers."""
+
+    def test_database_available(self):
+        """Test the database check succeeds against the test database."""
+        self.assertTrue(health.database_available())
+
+    @patch('django.db.backends.utils.CursorWrapper.execute')
+    def test_database_unavailable(self, patched_execute):
+        """Test connection errors report the database unavailable."""
+        for error in [Psycopg2Error, OperationalError]:
+            patched_execute.side_effect = error
+
+            self.assertFalse(health.database_available())
+
+    def test_migrations_applied(self):
+        """Test the fully migrated test database passes."""
+        self.assertTrue(health.migrations_applied())
+
+
+class ProbeEndpointTests(TestCase):
+    """Test the liveness and readiness endpoints."""
+
+    def test_liveness(self):
+        """Test liveness never touches the database."""
+        with self.assertNumQueries(0):
+            res = self.client.get(LIVE_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readiness(self):
+        """Test readiness passes with a reachable, migrated database."""
+        res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'database': True, 'migrations': True})
+
+    @patch('core.views.database_available', return_value=False)
+    def test_readiness_database_down(self, patched_available):
+        """Test readiness fails while the database is unreachable."""
+        res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'database': False, 'migrations': False})
+
+    def test_metrics(self):
+        """Test the worker's coalescing counters are reported to staff."""
+        user = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            set(res.json()['coalescing']), {'computed', 'coalesced'}
+        )
+
+    def test_metrics_staff_only(self):
+        """Test the counters are hidden from anonymous and regular users."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        client = APIClient()
+
+        anonymous_res = client.get(METRICS_URL)
+        client.force_authenticate(user)
+        user_res = client.get(METRICS_URL)
+
+        self.assertEqual(anonymous_res.status_code, 401)
+        self.assertEqual(user_res.status_code, 403)
@@ -0,0 +1,179 @@
+"""
+Tests for content-addressed image storage.
+"""
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import images
+from core.models import Job, Recipe, StoredImage
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(
+        user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+        **params,
+    )
+
+
+class ImageTestCase(TestCase):
+    """Base test case storing files in a temporary directory."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+
+    def refs(self, name):
+        return StoredImage.objects.get(name=name).refs
+
+    def age(self, name):
+        """Make an image unused for longer than the collection delay."""
+        StoredImage.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1),
+        )
+
+
+class StorageTests(ImageTestCase):
+    """Test naming files by content."""
+
+    def test_identical_uploads_share_file(self):
+        """Test the same content is stored once under its hash."""
+        first = default_storage.save('a.JPG', ContentFile(b'photo'))
+        second = default_storage.save('b.jpg', ContentFile(b'photo'))
+        other = default_storage.save('c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        with default_storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'photo')
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(default_storage.path(first)))), 1
+        )
+        self.assertEqual(self.refs(first), 0)
+
+
+class ReferenceCountTests(ImageTestCase):
+    """Test counting and collecting image references."""
+
+    def save_image(self, obj, content):
+        obj.image.save('photo.jpg', ContentFile(content))
+        return obj.image.name
+
+    def test_references_follow_objects(self):
+        """Test counts change as images are set, replaced and deleted."""
+        first, second = create_recipe(self.user), create_recipe(self.user)
+        shared = self.save_image(first, b'shared')
+        self.save_image(second, b'shared')
+        self.save_image(self.user, b'shared')
+        self.assertEqual(self.refs(shared), 3)
+
+        replacement = self.save_image(first, b'new')
+        second.delete()
+        self.user.name = 'Renamed'
+        self.user.save()
+
+        self.assertEqual(self.refs(shared), 1)
+        self.assertEqual(self.refs(replacement), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_collect_unused_image(self):
+        """Test an image unused for a while is deleted."""
+        recipe = create_recipe(self.user)
+        name = self.save_image(recipe, b'photo')
+        recipe.delete()
+        job = Job.objects.get(name='core.images.collect_image')
+        self.assertEqual(job.kwargs, {'name': name})
+        self.assertGreater(job.run_at, timezone.now())
+        self.age(name)
+
+        images.collect_image(name)
+
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_collect_keeps_recent_or_referenced_images(self):
+        """Test recently released or still used images are kept."""
+        recipe = create_recipe(self.user)
+        name = self.save_image(recipe, b'photo')
+        StoredImage.objects.filter(name=name).update(refs=0)
+
+        images.collect_image(name)
+        self.age(name)
+        images.collect_image(name)
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.refs(name), 1)
+
+    def test_release_legacy_image(self):
+        """Test images named before content addressing are deleted."""
+        name = 'uploads/recipe/legacy.jpg'
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as legacy:
+            legacy.write(b'photo')
+        recipe = create_recipe(self.user, image=name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_collect_images_command(self):
+        """Test the sweep deletes old files nothing tracks."""
+        tracked = default_storage.save('a.jpg', ContentFile(b'tracked'))
+        untracked = default_storage.save('b.jpg', ContentFile(b'untracked'))
+        StoredImage.objects.filter(name=untracked).delete()
+        self.age(tracked)
+        day_ago = time.time() - 86400
+        for name in (tracked, untracked):
+            os.utime(default_storage.path(name), (day_ago, day_ago))
+
+        call_command('collect_images', stdout=StringIO())
+
+        self.assertFalse(default_storage.exists(untracked))
+        self.assertFalse(default_storage.exists(tracked))
+
+    def test_collect_images_without_paths(self):
+        """Test the sweep lists files of storages without local paths."""
+        listing = {
+            'images': (['ab'], []),
+            'images/ab': ([], ['cdef.jpg']),
+            'direct': (['12'], []),
+            'direct/12': ([], ['3456.jpg']),
+        }
+        storage = MagicMock()
+        storage.path.side_effect = NotImplementedError
+        storage.listdir.side_effect = listing.__getitem__
+        storage.get_modified_time.return_value = (
+            timezone.now() - timedelta(days=1)
+        )
+
+        with patch(
+            'core.management.commands.collect_images.default_storage',
+            storage,
+        ):
+            call_command('collect_images', stdout=StringIO())
+
+        self.assertEqual(
+            [call.args[0] for call in storage.delete.call_args_list],
+            ['images/ab/cdef.jpg', 'direct/12/3456.jpg'],
+        )
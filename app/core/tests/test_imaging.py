@@ -0,0 +1,174 @@
+"""
+Tests for checking and re-encoding uploaded images.
+"""
+import json
+import os
+import resource
+import struct
+import zlib
+from io import BytesIO
+
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from core import imaging
+
+MB = 1024 * 1024
+
+
+def png_bomb(width, height):
+    """Return a PNG declaring the dimensions, but holding next to no data."""
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data)
+        return struct.pack('>I', len(data)) + kind + data + struct.pack(
+            '>I', crc,
+        )
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(b'\x00' * 1024)),
+        chunk(b'IEND', b''),
+    ])
+
+
+def image_bytes(size, image_format='JPEG', **params):
+    """Return an image of a size, encoded in a format."""
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, format=image_format, **params)
+    return output.getvalue()
+
+
+def upload(content, name='photo.jpg'):
+    return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+
+def peak_memory_growth(func, *args):
+    """
+    Run func in a forked process and return how far its peak resident
+    memory grew in bytes, with the name of the exception it raised.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        error = None
+        try:
+            func(*args)
+        except Exception as exc:
+            error = type(exc).__name__
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result = [(after - before) * 1024, error]
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as result:
+        growth, error = json.loads(result.read())
+    os.waitpid(pid, 0)
+
+    return growth, error
+
+
+class CleanUploadTests(SimpleTestCase):
+    """Test uploads are checked before decoding and re-encoded."""
+
+    def test_decompression_bomb_rejected_from_header(self):
+        """Test images beyond Pillow's own limit never get decoded."""
+        bomb = upload(png_bomb(20000, 20000), 'bomb.png')
+
+        growth, error = peak_memory_growth(imaging.clean_upload, bomb)
+
+        self.assertEqual(error, 'InvalidImage')
+        self.assertLess(growth, 10 * MB)
+
+    def test_pixel_limit_checked_before_decoding(self):
+        """Test images over MAX_PIXELS are rejected from their header."""
+        bomb = upload(png_bomb(8000, 8000), 'bomb.png')
+
+        growth, error = peak_memory_growth(imaging.clean_upload, bomb)
+
+        self.assertEqual(error, 'InvalidImage')
+        self.assertLess(growth, 10 * MB)
+
+    @override_settings(IMAGE_UPLOADS={
+        'MAX_SIZE': 20 * MB, 'MAX_PIXELS': 25_000_000, 'MAX_DIMENSION': 1024,
+    })
+    def test_large_jpeg_scaled_while_decoding(self):
+        """Test JPEGs are decoded scaled down, not at full size."""
+        # 96 MB once decoded at full size
+        photo = upload(image_bytes((6000, 4000)))
+
+        growth, error = peak_memory_growth(imaging.clean_upload, photo)
+        cleaned = imaging.clean_upload(photo)
+
+        self.assertIsNone(error)
+        self.assertLess(growth, 30 * MB)
+        with Image.open(cleaned) as image:
+            self.assertEqual(image.size, (1024, 683))
+
+    def test_metadata_stripped(self):
+        """Test EXIF is dropped, after turning the image upright."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x0112] = 6  # Rotated 90 degrees
+        photo = upload(image_bytes((20, 10), exif=exif.tobytes()))
+
+        cleaned = imaging.clean_upload(photo)
+
+        with Image.open(cleaned) as image:
+            self.assertEqual(image.size, (10, 20))
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertEqual(cleaned.name, 'photo.jpg')
+
+    @override_settings(IMAGE_UPLOADS={
+        'MAX_SIZE': 100, 'MAX_PIXELS': 25_000_000, 'MAX_DIMENSION': 1024,
+    })
+    def test_size_limited(self):
+        """Test files over MAX_SIZE are rejected."""
+        with self.assertRaisesMessage(imaging.InvalidImage, '100 bytes'):
+            imaging.clean_upload(upload(image_bytes((50, 50))))
+
+    def test_unsupported_format_rejected(self):
+        """Test only web image formats are accepted."""
+        bitmap = upload(image_bytes((10, 10), 'BMP'), 'image.bmp')
+
+        with self.assertRaisesMessage(imaging.InvalidImage, 'BMP'):
+            imaging.clean_upload(bitmap)
+
+    def test_truncated_image_rejected(self):
+        """Test images cut short fail while decoding."""
+        content = image_bytes((500, 500), quality=100)
+        truncated = upload(content[:len(content) // 2])
+
+        with self.assertRaises(imaging.InvalidImage):
+            imaging.clean_upload(truncated)
+
+    def test_format_kept(self):
+        """Test images are re-encoded in their own format."""
+        cleaned = imaging.clean_upload(
+            upload(image_bytes((10, 10), 'PNG'), 'drawing.PNG'),
+        )
+
+        self.assertEqual(cleaned.name, 'drawing.png')
+        with Image.open(cleaned) as image:
+            self.assertEqual(image.format, 'PNG')
+
+    def test_cmyk_converted_for_other_formats(self):
+        """Test CMYK JPEGs are kept, but re-encoded as RGB to PNG or WEBP."""
+        cmyk = BytesIO()
+        Image.new('CMYK', (10, 10), (0, 255, 255, 0)).save(cmyk, 'JPEG')
+
+        for image_format, mode in [
+            ('JPEG', 'CMYK'), ('PNG', 'RGB'), ('WEBP', 'RGB'),
+        ]:
+            with Image.open(BytesIO(cmyk.getvalue())) as image:
+                output = imaging.reencode(image, (5, 5), image_format)
+            with Image.open(output) as resized:
+                self.assertEqual(
+                    (resized.format, resized.mode), (image_format, mode),
+                )
@@ -0,0 +1,220 @@
+"""
+Tests for the database-backed job queue.
+"""
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task
+def record(value):
+    """Remember a value, failing for 'fail'."""
+    if value == 'fail':
+        raise ValueError('failed')
+    calls.append(value)
+
+
+@jobs.task
+def record_heartbeat(job_id):
+    """Remember the heartbeat of a job after running for a while."""
+    time.sleep(0.2)
+    calls.append(Job.objects.get(pk=job_id).heartbeat_at)
+
+
+class JobQueueTests(TestCase):
+    """Test queueing, claiming and running jobs."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_unknown_job(self):
+        """Test queueing a job without a task fails."""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('core.tests.test_jobs.missing')
+
+    def test_claim_by_priority_when_ready(self):
+        """Test higher priorities are claimed first, future jobs not."""
+        low = record.enqueue(value='low')
+        high = record.enqueue(priority=5, value='high')
+        Job.objects.create(
+            name=high.name, run_at=timezone.now() + timedelta(minutes=1),
+        )
+
+        claimed = jobs.claim('worker-1', limit=5)
+
+        self.assertEqual(claimed, [high, low])
+        high.refresh_from_db()
+        self.assertEqual(high.status, Job.RUNNING)
+        self.assertEqual(high.attempts, 1)
+        self.assertEqual(high.worker, 'worker-1')
+        self.assertEqual(jobs.claim('worker-1'), [])
+
+    def test_run_success(self):
+        """Test a successful job is marked done."""
+        record.enqueue(value='ok')
+        job, = jobs.claim('worker-1')
+
+        jobs.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(calls, ['ok'])
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished_at)
+
+    @patch('core.jobs.random.uniform', lambda low, high: high)
+    def test_run_failure_retries_with_backoff(self):
+        """Test a failed job is retried later, each time later."""
+        record.enqueue(value='fail')
+        job, = jobs.claim('worker-1')
+
+        jobs.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('ValueError: failed', job.last_error)
+        self.assertAlmostEqual(
+            (job.run_at - timezone.now()).total_seconds(), 10, delta=1,
+        )
+        self.assertEqual(jobs.retry_delay(3), 40)
+
+    def test_run_failure_gives_up(self):
+        """Test a job failing its last attempt is marked failed."""
+        Job.objects.create(
+            name='core.tests.test_jobs.record',
+            kwargs={'value': 'fail'},
+            max_attempts=1,
+        )
+        job, = jobs.claim('worker-1')
+
+        jobs.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_requeue_stale(self):
+        """Test jobs whose heartbeat stopped are queued again."""
+        record.enqueue(value='ok')
+        job, = jobs.claim('worker-1')
+        Job.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(days=1),
+        )
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim('worker-2'), [job])
+
+    def test_stale_job_fails_after_max_attempts(self):
+        """Test jobs killing their worker each time stop being retried."""
+        Job.objects.create(name='core.tests.test_jobs.record', max_attempts=2)
+        for _ in range(2):
+            job, = jobs.claim('worker-1')
+            Job.objects.filter(pk=job.pk).update(
+                heartbeat_at=timezone.now() - timedelta(days=1),
+            )
+            self.assertEqual(jobs.requeue_stale(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(jobs.claim('worker-2'), [])
+
+    def test_long_running_job_not_requeued(self):
+        """Test jobs running long but still beating are left alone."""
+        record.enqueue(value='ok')
+        job, = jobs.claim('worker-1')
+        Job.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - timedelta(days=1),
+        )
+
+        self.assertEqual(jobs.requeue_stale(), 0)
+
+
+class WorkerTests(TransactionTestCase):
+    """Test workers running jobs concurrently."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_skips_locked_jobs(self):
+        """Test jobs being claimed by another worker are skipped."""
+        first = record.enqueue(value='first')
+        second = record.enqueue(value='second')
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                list(Job.objects.select_for_update().filter(pk=first.pk))
+                locked.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait(5)
+        try:
+            claimed = jobs.claim('worker-1')
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(claimed, [second])
+
+    def test_run_worker_burst(self):
+        """Test the worker runs all ready jobs, then exits."""
+        for value in range(6):
+            record.enqueue(value=value)
+
+        call_command(
+            'run_worker', '--burst', '--concurrency=3', stdout=StringIO(),
+        )
+
+        self.assertEqual(sorted(calls), list(range(6)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 6)
+
+    @override_settings(JOBS={**settings.JOBS, 'HEARTBEAT_INTERVAL': 0.05})
+    def test_running_job_heartbeat(self):
+        """Test a running job's heartbeat is updated until it ends."""
+        job = Job.objects.create(name='core.tests.test_jobs.record_heartbeat')
+        job.kwargs = {'job_id': job.pk}
+        job.save()
+        job, = jobs.claim('worker-1')
+
+        jobs.run(job)
+
+        self.assertGreater(calls[0], job.started_at)
+
+    @override_settings(JOBS={**settings.JOBS, 'POLL_INTERVAL': 0})
+    def test_run_worker_survives_errors(self):
+        """Test a worker thread logs errors and goes on running jobs."""
+        record.enqueue(value='ok')
+        stderr = StringIO()
+        claim = jobs.claim
+        errors = [OperationalError('gone')]
+
+        def flaky_claim(worker):
+            if errors:
+                raise errors.pop()
+            return claim(worker)
+
+        with patch('core.jobs.claim', flaky_claim):
+            call_command(
+                'run_worker', '--burst', '--concurrency=1',
+                stdout=StringIO(), stderr=stderr,
+            )
+
+        self.assertIn('OperationalError: gone', stderr.getvalue())
+        self.assertEqual(calls, ['ok'])
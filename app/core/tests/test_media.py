@@ -0,0 +1,105 @@
+"""
+Tests for serving uploaded images to their owners.
+"""
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+def media_url(name):
+    """Create and return the URL of an uploaded file."""
+    return reverse('media', args=[name])
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+class MediaViewTests(TestCase):
+    """Test the protected media endpoint."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(b'photo'))
+
+    def test_owner_redirected_to_file(self):
+        """Test nginx is told to send the owner's image."""
+        name = self.recipe.image.name
+
+        with self.assertNumQueries(1):
+            res = self.client.get(media_url(name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertEqual(res.content, b'')
+
+    def test_user_image_served_without_query(self):
+        """Test the user's own image needs no lookup."""
+        self.user.image.save('me.jpg', ContentFile(b'me'))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(media_url(self.user.image.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_other_users_image_not_found(self):
+        """Test images of other users aren't served."""
+        self.client.force_authenticate(create_user(email='o@example.com'))
+
+        res = self.client.get(media_url(self.recipe.image.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('X-Accel-Redirect', res)
+
+    def test_auth_required(self):
+        """Test anonymous requests are refused."""
+        res = APIClient().get(media_url(self.recipe.image.name))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='')
+    def test_served_by_app_without_proxy(self):
+        """Test the app sends the file itself, i.e. in development."""
+        res = self.client.get(
+            media_url(self.recipe.image.name), HTTP_ACCEPT='image/*',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'photo')
+
+    def test_image_urls_point_to_endpoint(self):
+        """Test serialized image URLs are served by the endpoint."""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+
+        self.assertEqual(
+            res.data['image'],
+            f'http://testserver{media_url(self.recipe.image.name)}',
+        )
@@ -0,0 +1,184 @@
+"""
+Tests for custom middleware.
+"""
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import resolve, reverse
+
+from core.middleware import LoadSheddingMiddleware, PathDispatchMiddleware
+
+
+class PathDispatchMiddlewareTests(SimpleTestCase):
+    """Test choosing the middleware stack by path."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = PathDispatchMiddleware(lambda r: HttpResponse())
+
+    def test_api_skips_session_stack(self):
+        """Test API requests get no session, user or messages."""
+        request = self.factory.get('/api/recipe/recipes/')
+
+        self.middleware(request)
+
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertFalse(hasattr(request, 'user'))
+        self.assertFalse(hasattr(request, '_messages'))
+
+    def test_admin_runs_session_stack(self):
+        """Test admin requests get the session, user and messages."""
+        request = self.factory.get('/admin/')
+
+        self.middleware(request)
+
+        self.assertTrue(hasattr(request, 'session'))
+        self.assertTrue(hasattr(request, 'user'))
+        self.assertTrue(hasattr(request, '_messages'))
+
+    def test_benchmark_command(self):
+        """Test the benchmark reports both stacks."""
+        out = StringIO()
+
+        call_command('benchmark_middleware', requests=5, stdout=out)
+
+        self.assertIn('Session stack', out.getvalue())
+        self.assertIn('Saved', out.getvalue())
+
+
+class CsrfTests(TestCase):
+    """Test CSRF protection still applies outside of the API."""
+
+    def test_admin_login_requires_csrf_token(self):
+        """Test posting the admin login form without a token fails."""
+        client = Client(enforce_csrf_checks=True)
+
+        res = client.post(reverse('admin:login'), {
+            'username': 'admin@example.com',
+            'password': 'testpass123',
+        })
+
+        self.assertEqual(res.status_code, 403)
+
+
+def queued_for(seconds):
+    """Return headers of a request the proxy received seconds ago."""
+    return {'HTTP_X_REQUEST_START': f't={time.time() - seconds:.3f}'}
+
+
+class LoadSheddingTests(SimpleTestCase):
+    """Test shedding load by priority and queueing time."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def assertShed(self, res, retry_after):
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res['Retry-After'], str(retry_after))
+
+    def test_requests_without_queueing_pass(self):
+        """Test requests without X-Request-Start are never shed."""
+        res = self.client.post(reverse('recipe:recipe-list'))
+
+        self.assertEqual(res.status_code, 401)
+
+    def test_low_priority_shed_first(self):
+        """Test writes and uploads are shed before reads."""
+        res = self.client.get(
+            reverse('recipe:recipe-list'), **queued_for(2.5)
+        )
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.post(
+            reverse('recipe:recipe-list'), **queued_for(2.5)
+        )
+        self.assertShed(res, retry_after=3)
+
+        res = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[1]),
+            **queued_for(1.5),
+        )
+        self.assertShed(res, retry_after=2)
+
+    def test_critical_views_kept(self):
+        """Test the user's profile and probes tolerate long queues."""
+        res = self.client.get(reverse('user:me'), **queued_for(8))
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.get(reverse('health-live'), **queued_for(8))
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.get(reverse('health-live'), **queued_for(10.5))
+        self.assertShed(res, retry_after=11)
+
+    def _process_view(self, middleware, request):
+        request.resolver_match = resolve(request.path_info)
+        return middleware.process_view(
+            request, request.resolver_match.func, (), {}
+        )
+
+    def test_slow_views_shed_before_timeout(self):
+        """Test requests finishing after the proxy timeout are shed."""
+        middleware = LoadSheddingMiddleware(lambda r: HttpResponse())
+        url = reverse('user:me')
+        middleware.latency['user:me'] = 58
+
+        res = self._process_view(
+            middleware, self.factory.get(url, **queued_for(1))
+        )
+        self.assertIsNone(res)
+
+        res = self._process_view(
+            middleware, self.factory.get(url, **queued_for(2.5))
+        )
+        self.assertShed(res, retry_after=3)
+
+    def test_latency_tracked_per_view(self):
+        """Test responses update the view's latency average."""
+        middleware = LoadSheddingMiddleware(lambda r: HttpResponse())
+        request = self.factory.get(reverse('health-live'))
+        request.resolver_match = resolve(request.path_info)
+
+        middleware(request)
+
+        self.assertIn('health-live', middleware.latency)
+
+    @override_settings(LOAD_SHEDDING={
+        'MAX_QUEUE_DELAY': {'critical': 10, 'read': 3, 'write': 2, 'bulk': 1},
+        'TIMEOUT': 60,
+        'MAX_IN_FLIGHT': 4,
+    })
+    def test_in_flight_limit(self):
+        """Test bulk requests get a smaller share of the concurrency."""
+        middleware = LoadSheddingMiddleware(lambda r: HttpResponse())
+        middleware.in_flight = 3
+        upload = self.factory.post(
+            reverse('recipe:recipe-upload-image', args=[1])
+        )
+        read = self.factory.get(reverse('recipe:recipe-list'))
+
+        self.assertShed(self._process_view(middleware, upload), 1)
+        self.assertIsNone(self._process_view(middleware, read))
+
+        middleware.in_flight = 5
+        self.assertShed(self._process_view(middleware, read), 1)
+
+    def test_in_flight_default_keeps_threads_for_reads(self):
+        """Test writes are shed before they take all of a worker's threads."""
+        middleware = LoadSheddingMiddleware(lambda r: HttpResponse())
+        middleware.in_flight = settings.LOAD_SHEDDING['MAX_IN_FLIGHT']
+        write = self.factory.post(reverse('recipe:recipe-list'))
+        read = self.factory.get(reverse('recipe:recipe-list'))
+
+        self.assertShed(self._process_view(middleware, write), 1)
+        self.assertIsNone(self._process_view(middleware, read))
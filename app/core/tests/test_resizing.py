@@ -0,0 +1,211 @@
+"""
+Tests for resizing recipe images on request.
+"""
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import imaging, resizing
+from core.models import Recipe
+
+
+def resized_url(recipe_id, size='320x320', fmt='jpg'):
+    """Create and return the URL of a resized recipe image."""
+    width, height = size.split('x')
+    return reverse(
+        'resized-recipe-image', args=[recipe_id, width, height, fmt],
+    )
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+class ResizedImageTests(TestCase):
+    """Test the resized recipe images endpoint."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        photo = BytesIO()
+        Image.new('RGB', (1000, 800), 'red').save(photo, format='JPEG')
+        self.recipe.image.save('photo.jpg', ContentFile(photo.getvalue()))
+
+    def cached_path(self, res):
+        name = res['X-Accel-Redirect'][len('/protected-media/'):]
+        return os.path.join(self.media_root, name)
+
+    def test_resized_on_first_request(self):
+        """Test images are resized to fit the size, then cached."""
+        res = self.client.get(resized_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertTrue(
+            res['X-Accel-Redirect'].startswith('/protected-media/resized/')
+        )
+        with Image.open(self.cached_path(res)) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (320, 256)))
+
+    def test_cmyk_image_resized_to_png(self):
+        """Test CMYK JPEGs are converted for formats lacking CMYK."""
+        photo = BytesIO()
+        Image.new('CMYK', (100, 80), (0, 255, 255, 0)).save(photo, 'JPEG')
+        self.recipe.image.save('cmyk.jpg', ContentFile(photo.getvalue()))
+
+        res = self.client.get(resized_url(self.recipe.id, fmt='png'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with Image.open(self.cached_path(res)) as image:
+            self.assertEqual((image.format, image.mode), ('PNG', 'RGB'))
+
+    def test_cache_hit_not_resized(self):
+        """Test later requests only check the owner."""
+        first = self.client.get(resized_url(self.recipe.id, fmt='webp'))
+
+        with patch('core.imaging.reencode') as mock_reencode:
+            with self.assertNumQueries(1):
+                res = self.client.get(resized_url(self.recipe.id, fmt='webp'))
+
+        mock_reencode.assert_not_called()
+        self.assertEqual(res['X-Accel-Redirect'], first['X-Accel-Redirect'])
+
+    def test_not_modified(self):
+        """Test clients revalidate with the ETag."""
+        res = self.client.get(resized_url(self.recipe.id))
+
+        res = self.client.get(
+            resized_url(self.recipe.id), HTTP_IF_NONE_MATCH=res['ETag'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_sizes_and_formats_limited(self):
+        """Test only the configured sizes and known formats are served."""
+        for url in [
+            resized_url(self.recipe.id, size='321x320'),
+            resized_url(self.recipe.id, fmt='gif'),
+        ]:
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(os.path.exists(resizing.cache_root()))
+
+    def test_other_users_recipe_not_found(self):
+        """Test images of other users' recipes aren't served."""
+        self.client.force_authenticate(create_user(email='o@example.com'))
+
+        res = self.client.get(resized_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='')
+    def test_served_by_app_without_proxy(self):
+        """Test the app sends the resized image itself in development."""
+        res = self.client.get(
+            resized_url(self.recipe.id, size='160x160', fmt='png'),
+            HTTP_ACCEPT='image/*',
+        )
+
+        image = Image.open(BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual((image.format, image.size), ('PNG', (160, 128)))
+
+    def test_detail_lists_sizes(self):
+        """Test recipe details link the image's sizes."""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+
+        self.assertEqual(
+            res.data['image_sizes']['640x480'],
+            f'http://testserver{resized_url(self.recipe.id, "640x480")}',
+        )
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache drops images used longest ago past its budget."""
+        old, used, new = [
+            self.client.get(resized_url(self.recipe.id, size=size))
+            for size in ['160x160', '320x320', '640x480']
+        ]
+        for age, res in [(300, old), (200, used), (100, new)]:
+            path = self.cached_path(res)
+            os.utime(path, (0, os.path.getmtime(path) - age))
+        self.client.get(resized_url(self.recipe.id, size='320x320'))
+        budget = sum(
+            os.path.getsize(self.cached_path(res)) for res in (used, new)
+        )
+
+        deleted = resizing.evict(budget)
+
+        self.assertEqual(deleted, 1)
+        self.assertFalse(os.path.exists(self.cached_path(old)))
+        self.assertTrue(os.path.exists(self.cached_path(used)))
+        self.assertTrue(os.path.exists(self.cached_path(new)))
+
+    def test_evicts_down_to_low_water(self):
+        """Test eviction frees more than needed, recording what is left."""
+        responses = [
+            self.client.get(resized_url(self.recipe.id, size=size))
+            for size in ['160x160', '320x320', '640x480']
+        ]
+        paths = [self.cached_path(res) for res in responses]
+        for age, path in zip([300, 200, 100], paths):
+            os.utime(path, (0, os.path.getmtime(path) - age))
+        sizes = [os.path.getsize(path) for path in paths]
+
+        deleted = resizing.evict(sum(sizes) - 1, low_water=sizes[2])
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(
+            [os.path.exists(path) for path in paths], [False, False, True],
+        )
+        self.assertEqual(resizing.add_size(0), sizes[2])
+
+    def test_misses_within_limit_skip_walk(self):
+        """Test the cache is only walked until its size is recorded."""
+        first = self.client.get(resized_url(self.recipe.id, size='160x160'))
+
+        with patch('core.resizing.os.walk') as patched_walk:
+            second = self.client.get(
+                resized_url(self.recipe.id, size='320x320')
+            )
+
+        patched_walk.assert_not_called()
+        self.assertEqual(resizing.add_size(0), sum(
+            os.path.getsize(self.cached_path(res)) for res in (first, second)
+        ))
+
+    def test_invalid_source_not_found(self):
+        """Test images which can't be decoded aren't served."""
+        with patch(
+            'core.imaging.reencode', side_effect=imaging.InvalidImage,
+        ):
+            res = self.client.get(resized_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,63 @@
+"""
+Tests for database routing to read replicas.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core import routers
+from core.models import Recipe
+
+
+@override_settings(DATABASE_REPLICAS=['replica0', 'replica1'])
+class ReplicaRouterTests(TestCase):
+    """Test routing reads to replicas."""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers._replica_lag.clear()
+        cache.clear()
+        self.addCleanup(routers.use_read_alias, None)
+
+    def test_reads_follow_request_alias(self):
+        """Test reads go to the alias chosen for the request."""
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+        routers.use_read_alias('replica1')
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'replica1')
+        self.assertIsNone(self.router.db_for_write(Recipe))
+
+    def test_replicas_not_migrated(self):
+        """Test migrations only run against the primary."""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica0', 'core'))
+
+    @patch('core.routers.replica_lag')
+    def test_choose_replica_skips_lagging(self, patched_lag):
+        """Test lagging and unreachable replicas are skipped."""
+        patched_lag.side_effect = {'replica0': 30.0, 'replica1': 0.5}.get
+        self.assertEqual(routers.choose_replica(), 'replica1')
+
+        patched_lag.side_effect = {'replica0': 30.0, 'replica1': None}.get
+        self.assertIsNone(routers.choose_replica())
+
+    def test_replica_lag_cached(self):
+        """Test lag is measured at most once per check interval."""
+        self.assertEqual(routers.replica_lag('default'), 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(routers.replica_lag('default'), 0)
+
+    def test_pin_to_primary(self):
+        """Test users are pinned to the primary after writing."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.assertFalse(routers.is_pinned_to_primary(user))
+
+        routers.pin_to_primary(user)
+
+        self.assertTrue(routers.is_pinned_to_primary(user))
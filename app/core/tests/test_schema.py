@@ -0,0 +1,57 @@
+"""
+Tests for the prebuilt OpenAPI schema.
+"""
+import json
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(SimpleTestCase):
+    """Test serving the prebuilt schema."""
+
+    def test_committed_schema_up_to_date(self):
+        """Test the committed schema matches the code."""
+        out = StringIO()
+        call_command('spectacular', stdout=out, stderr=StringIO())
+
+        with open(settings.API_SCHEMA_FILE) as f:
+            self.assertEqual(
+                f.read(),
+                out.getvalue(),
+                'Schema is stale, run: '
+                'python manage.py spectacular --file schema.yml',
+            )
+
+    def test_schema_served_with_etag(self):
+        """Test the schema is served as YAML with an ETag."""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith(
+            'application/vnd.oai.openapi'
+        ))
+        self.assertIn(b'openapi: 3.0.3', res.content)
+        self.assertTrue(res.has_header('ETag'))
+
+    def test_schema_not_modified(self):
+        """Test a matching If-None-Match returns 304 without a body."""
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_schema_json_format(self):
+        """Test requesting the schema as JSON."""
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+        yaml_etag = self.client.get(SCHEMA_URL)['ETag']
+
+        self.assertEqual(json.loads(res.content)['openapi'], '3.0.3')
+        self.assertNotEqual(res['ETag'], yaml_etag)
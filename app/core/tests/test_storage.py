@@ -0,0 +1,93 @@
+"""
+Tests for custom storage backends.
+"""
+import gzip
+import json
+import os
+import tempfile
+
+import brotli
+
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+
+from core.storage import CompressedManifestStaticFilesStorage
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+    """Test hashed and precompressed static files."""
+
+    def setUp(self):
+        self.source_dir = tempfile.TemporaryDirectory()
+        self.static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.source_dir.cleanup)
+        self.addCleanup(self.static_root.cleanup)
+
+        self.css = 'body { color: #333; }\n' * 50
+        source = FileSystemStorage(location=self.source_dir.name)
+        os.makedirs(source.path('css'))
+        with open(source.path('css/base.css'), 'w') as f:
+            f.write(self.css)
+        with open(source.path('css/vendor.css'), 'w') as f:
+            f.write('a{}\n/*# sourceMappingURL=vendor.css.map */\n')
+        with open(source.path('tiny.js'), 'w') as f:
+            f.write('var a;')
+        with open(source.path('logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' + b'\x00' * 1024)
+
+        self.storage = CompressedManifestStaticFilesStorage(
+            location=self.static_root.name,
+            base_url='/static/',
+        )
+        paths = {}
+        for name in ['css/base.css', 'css/vendor.css', 'tiny.js', 'logo.png']:
+            with source.open(name) as f:
+                self.storage.save(name, f)
+            paths[name] = (source, name)
+        self.processed = list(self.storage.post_process(paths))
+
+    def test_manifest_maps_to_hashed_names(self):
+        """Test collecting writes a manifest of hashed file names."""
+        with self.storage.open('staticfiles.json') as f:
+            manifest = json.loads(f.read())['paths']
+
+        hashed_css = manifest['css/base.css']
+        self.assertRegex(hashed_css, r'^css/base\.[0-9a-f]{12}\.css$')
+        self.assertTrue(self.storage.exists(hashed_css))
+        self.assertEqual(
+            self.storage.url('css/base.css'),
+            f'/static/{hashed_css}',
+        )
+
+    def test_compressed_siblings_written(self):
+        """Test hashed text assets get '.gz' and '.br' siblings."""
+        hashed_css = self.storage.hashed_files['css/base.css']
+
+        with self.storage.open(f'{hashed_css}.gz') as f:
+            self.assertEqual(gzip.decompress(f.read()).decode(), self.css)
+        with self.storage.open(f'{hashed_css}.br') as f:
+            self.assertEqual(brotli.decompress(f.read()).decode(), self.css)
+
+    def test_small_and_binary_files_not_compressed(self):
+        """Test tiny files and already compressed formats are skipped."""
+        for name in ['tiny.js', 'logo.png']:
+            hashed = self.storage.hashed_files[name]
+            self.assertFalse(self.storage.exists(f'{hashed}.gz'))
+            self.assertFalse(self.storage.exists(f'{hashed}.br'))
+
+    def test_missing_references_left_untouched(self):
+        """Test references to files not shipped don't break collecting."""
+        hashed = self.storage.hashed_files['css/vendor.css']
+
+        with self.storage.open(hashed) as f:
+            self.assertIn(b'sourceMappingURL=vendor.css.map', f.read())
+
+    def test_unhashed_names_without_manifest(self):
+        """Test urls fall back to plain names before collectstatic ran."""
+        os.remove(self.storage.path('staticfiles.json'))
+        storage = CompressedManifestStaticFilesStorage(
+            location=self.static_root.name,
+            base_url='/static/',
+        )
+
+        self.assertEqual(storage.url('css/base.css'), '/static/css/base.css')
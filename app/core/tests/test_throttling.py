@@ -0,0 +1,192 @@
+"""
+Tests for token bucket throttling.
+"""
+from unittest.mock import patch, MagicMock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from core import throttling
+
+TOKEN_URL = reverse('user:token')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def rest_framework_settings(**rates):
+    """Return REST_FRAMEWORK settings with some throttle rates changed."""
+    return {
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {
+            **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+            **rates,
+        },
+    }
+
+
+class FakeUwsgi:
+    """Minimal stand-in for the uWSGI cache and lock API."""
+
+    def __init__(self):
+        self.cache = {}
+        self.lock = MagicMock()
+        self.unlock = MagicMock()
+
+    def cache_get(self, key, cache_name):
+        return self.cache.get((cache_name, key))
+
+    def cache_update(self, key, value, expires, cache_name):
+        self.cache[(cache_name, key)] = value
+
+
+class BucketStoreTests(SimpleTestCase):
+    """Test the token bucket stores."""
+
+    def test_parse_rate(self):
+        """Test rates convert to capacity and refill per second."""
+        self.assertEqual(throttling.parse_rate('10/min'), (10, 10 / 60))
+        self.assertEqual(throttling.parse_rate('2/s'), (2, 2))
+
+    @patch('time.monotonic')
+    def test_local_store_refills(self, patched_monotonic):
+        """Test a bucket empties, then refills with time."""
+        store = throttling.LocalBucketStore()
+        patched_monotonic.return_value = 100
+
+        results = [store.take('key', 2, 1)[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertAlmostEqual(store.take('key', 2, 1)[1], 1)
+
+        patched_monotonic.return_value = 101
+        self.assertTrue(store.take('key', 2, 1)[0])
+
+    def test_local_store_bounded(self):
+        """Test the least recently used buckets are dropped past the cap."""
+        store = throttling.LocalBucketStore(max_buckets=2)
+        store.take('a', 1, 0.01)
+        store.take('b', 1, 0.01)
+        self.assertFalse(store.take('a', 1, 0.01)[0])
+
+        store.take('c', 1, 0.01)
+
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+
+    def test_uwsgi_store_shares_cache(self):
+        """Test buckets live in the uWSGI cache, updated under its lock."""
+        uwsgi = FakeUwsgi()
+        workers = [
+            throttling.UwsgiBucketStore(uwsgi, 'throttle') for _ in range(2)
+        ]
+
+        results = [worker.take('key', 3, 0.01)[0] for worker in workers * 2]
+
+        self.assertEqual(results, [True, True, True, False])
+        self.assertEqual(uwsgi.lock.call_count, 4)
+        self.assertEqual(uwsgi.unlock.call_count, 4)
+
+    def test_redis_store_falls_back(self):
+        """Test process memory is used while Redis is unreachable."""
+        client = MagicMock()
+        client.register_script.return_value.side_effect = \
+            RedisConnectionError
+        store = throttling.RedisBucketStore(client)
+
+        results = [store.take('key', 1, 0.01)[0] for _ in range(2)]
+
+        self.assertEqual(results, [True, False])
+        # Redis isn't retried for a while after failing
+        self.assertEqual(client.register_script.return_value.call_count, 1)
+
+    def test_redis_store_denies(self):
+        """Test the script result is turned into a wait time."""
+        client = MagicMock()
+        client.register_script.return_value.return_value = [0, '0.5']
+        store = throttling.RedisBucketStore(client)
+
+        self.assertEqual(store.take('key', 1, 0.5), (False, 1.0))
+
+
+@patch('core.throttling.bucket_store')
+class ThrottleApiTests(TestCase):
+    """Test throttling API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(login='2/min'))
+    def test_login_throttled(self, patched_store):
+        """Test logins are limited per IP address."""
+        patched_store.return_value = throttling.LocalBucketStore()
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+
+        codes = [
+            self.client.post(TOKEN_URL, payload).status_code
+            for _ in range(3)
+        ]
+
+        self.assertEqual(codes[:2], [status.HTTP_400_BAD_REQUEST] * 2)
+        self.assertEqual(codes[2], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(login='2/min'))
+    def test_login_throttled_despite_forwarded_for(self, patched_store):
+        """Test clients can't pick their address with X-Forwarded-For."""
+        patched_store.return_value = throttling.LocalBucketStore()
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+
+        codes = [
+            self.client.post(
+                TOKEN_URL, payload, HTTP_X_FORWARDED_FOR=f'10.0.0.{index}',
+            ).status_code
+            for index in range(3)
+        ]
+
+        self.assertEqual(codes[2], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rest_framework_settings(read='1/min'))
+    def test_reads_throttled_per_user(self, patched_store):
+        """Test each user has their own bucket, with a Retry-After."""
+        patched_store.return_value = throttling.LocalBucketStore()
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '60')
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK
+        )
+
+    def test_check_is_one_store_round_trip(self, patched_store):
+        """Test a throttle check runs no queries and takes one token."""
+        store = MagicMock(wraps=throttling.LocalBucketStore())
+        patched_store.return_value = store
+        request = Request(APIRequestFactory().get(RECIPES_URL))
+        request.user = self.user
+        throttle = throttling.TokenBucketThrottle()
+
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                throttle.allow_request(request, view=None)
+
+        self.assertEqual(store.take.call_count, 3)
+        store.take.assert_called_with(
+            f'throttle:read:user:{self.user.pk}',
+            *throttling.parse_rate(settings.REST_FRAMEWORK[
+                'DEFAULT_THROTTLE_RATES'
+            ]['read']),
+        )
@@ -0,0 +1,198 @@
+"""
+Token bucket request throttling.
+"""
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Return (capacity, tokens per second) for a rate like '10/min'."""
+    num, period = rate.split('/')
+    capacity = int(num)
+
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def take_token(tokens, updated, capacity, refill_rate, now):
+    """
+    Refill a bucket for the time passed and take a token from it.
+    Returns (tokens left, allowed, seconds until a token is available).
+    """
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0
+    return tokens, False, (1 - tokens) / refill_rate
+
+
+class LocalBucketStore:
+    """
+    Buckets in process memory, not shared between workers. At most
+    max_buckets are kept, dropping the least recently used, which are
+    the idlest and most likely full again anyway.
+    """
+
+    def __init__(self, max_buckets=None):
+        self.max_buckets = max_buckets or settings.THROTTLE_LOCAL_MAX_BUCKETS
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, allowed, wait = take_token(
+                tokens, updated, capacity, refill_rate, now
+            )
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+        return allowed, wait
+
+
+class UwsgiBucketStore:
+    """Buckets in a uWSGI cache, shared between workers of one server."""
+    packing = struct.Struct('dd')
+
+    def __init__(self, uwsgi, cache_name):
+        self.uwsgi = uwsgi
+        self.cache_name = cache_name
+
+    def take(self, key, capacity, refill_rate):
+        now = time.time()
+        self.uwsgi.lock()
+        try:
+            raw = self.uwsgi.cache_get(key, self.cache_name)
+            tokens, updated = (
+                self.packing.unpack(raw) if raw else (capacity, now)
+            )
+            tokens, allowed, wait = take_token(
+                tokens, updated, capacity, refill_rate, now
+            )
+            # Full buckets are dropped, so expire once refilled
+            expires = int(capacity / refill_rate) + 1
+            self.uwsgi.cache_update(
+                key, self.packing.pack(tokens, now), expires, self.cache_name
+            )
+        finally:
+            self.uwsgi.unlock()
+
+        return allowed, wait
+
+
+class RedisBucketStore:
+    """
+    Buckets in Redis, shared between all servers. Falls back to process
+    memory while Redis is unreachable.
+    """
+    # Uses the Redis clock, so app servers' clocks don't matter
+    script = """
+        local capacity = tonumber(ARGV[1])
+        local refill_rate = tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * refill_rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate))
+        return {allowed, tostring(tokens)}
+    """
+
+    # Seconds process memory is used after Redis failed, so a hung Redis
+    # delays one check in a while rather than every one
+    retry_after = 5
+
+    def __init__(self, client):
+        self.take_script = client.register_script(self.script)
+        self.fallback = LocalBucketStore()
+        self.retry_at = 0
+
+    def take(self, key, capacity, refill_rate):
+        from redis.exceptions import RedisError
+
+        if time.monotonic() < self.retry_at:
+            return self.fallback.take(key, capacity, refill_rate)
+        try:
+            allowed, tokens = self.take_script(
+                keys=[key], args=[capacity, refill_rate]
+            )
+        except RedisError:
+            self.retry_at = time.monotonic() + self.retry_after
+            return self.fallback.take(key, capacity, refill_rate)
+        if allowed:
+            return True, 0
+        return False, (1 - float(tokens)) / refill_rate
+
+
+@lru_cache(maxsize=None)
+def bucket_store():
+    """
+    Return the most widely shared store available: Redis, the uWSGI
+    cache when running under uWSGI, else process memory.
+    """
+    if settings.THROTTLE_REDIS_URL:
+        import redis
+
+        return RedisBucketStore(redis.Redis.from_url(
+            settings.THROTTLE_REDIS_URL,
+            socket_connect_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+            socket_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+        ))
+    try:
+        import uwsgi
+    except ImportError:
+        return LocalBucketStore()
+
+    return UwsgiBucketStore(uwsgi, settings.THROTTLE_UWSGI_CACHE)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle each user, or each IP address for anonymous requests, with
+    a token bucket per scope. Views pick a scope with 'throttle_scope',
+    otherwise requests fall in the 'read' or 'write' scope.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{super().get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        key = f'throttle:{scope}:{self.get_ident(request)}'
+        allowed, self.wait_seconds = bucket_store().take(
+            key, *parse_rate(rate)
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,128 @@
+"""
+Resumable uploads written to disk part by part.
+"""
+import fcntl
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from core.jobs import task
+from core.models import Upload
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """A part doesn't continue where the upload stopped."""
+
+
+class UploadBusy(Exception):
+    """Another request is appending to the upload."""
+
+
+class UploadGone(Exception):
+    """The upload's part was deleted, i.e. once it expired."""
+
+
+class PartFile(File):
+    """An assembled upload, validated and stored from its path on disk."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload_id):
+    return os.path.join(settings.RESUMABLE_UPLOADS['DIR'], f'{upload_id}.part')
+
+
+def create(user, recipe, filename, length):
+    """Start an upload, deleted once expired."""
+    os.makedirs(settings.RESUMABLE_UPLOADS['DIR'], exist_ok=True)
+    upload = Upload.objects.create(
+        user=user, recipe=recipe, filename=filename, length=length,
+    )
+    open(part_path(upload.id), 'xb').close()
+    expire_upload.enqueue(
+        run_at=upload.created_at + timedelta(
+            seconds=settings.RESUMABLE_UPLOADS['EXPIRE_AFTER']
+        ),
+        upload_id=str(upload.id),
+    )
+
+    return upload
+
+
+def offset(upload):
+    """Return the number of bytes received so far."""
+    if upload.completed_at:
+        return upload.length
+    try:
+        return os.path.getsize(part_path(upload.id))
+    except FileNotFoundError:
+        raise UploadGone()
+
+
+def append(upload, stream, at_offset, size):
+    """
+    Copy up to size bytes from a stream onto the upload's part at
+    at_offset, chunk by chunk. Bytes received before the client went
+    away are kept, so it resumes from there. Returns the new offset.
+    """
+    try:
+        # Never created again once deleted
+        fd = os.open(part_path(upload.id), os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        raise UploadGone()
+    with os.fdopen(fd, 'ab') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy()
+
+        # Sized under the lock, another request may have appended since
+        # the file was opened
+        received = os.fstat(part.fileno()).st_size
+        if received != at_offset:
+            raise OffsetMismatch()
+        remaining = min(size, upload.length - at_offset)
+        try:
+            while remaining > 0:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                part.write(chunk)
+                received += len(chunk)
+                remaining -= len(chunk)
+        except OSError:
+            pass
+
+        return received
+
+
+def open_part(upload):
+    """Return the assembled upload, named as the client's file."""
+    try:
+        part = open(part_path(upload.id), 'rb')
+    except FileNotFoundError:
+        raise UploadGone()
+    return PartFile(part, name=upload.filename)
+
+
+def finish(upload):
+    """Mark an upload attached and drop its part."""
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['completed_at'])
+    os.remove(part_path(upload.id))
+
+
+@task
+def expire_upload(upload_id):
+    """Delete an upload and whatever it received."""
+    Upload.objects.filter(id=upload_id).delete()
+    try:
+        os.remove(part_path(upload_id))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,206 @@
+"""
+Views for the core app.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition, require_safe
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import coalescing, images, imaging, resizing
+from core.health import database_available, migrations_applied
+from core.models import Recipe
+
+SCHEMA_CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+    'json': 'application/vnd.oai.openapi+json; charset=utf-8',
+}
+
+
+def _schema_format(request):
+    """Return the requested schema format, defaulting to YAML."""
+    fmt = request.GET.get('format', 'yaml')
+    return fmt if fmt in SCHEMA_CONTENT_TYPES else 'yaml'
+
+
+@lru_cache(maxsize=None)
+def load_schema(fmt='yaml'):
+    """
+    Load the prebuilt OpenAPI schema once per process.
+    Returns the rendered schema and its ETag.
+    """
+    with open(settings.API_SCHEMA_FILE, 'rb') as f:
+        content = f.read()
+    if fmt == 'json':
+        import yaml
+
+        content = json.dumps(yaml.safe_load(content), indent=2).encode()
+
+    return content, hashlib.sha256(content).hexdigest()[:32]
+
+
+@require_safe
+@condition(etag_func=lambda request: load_schema(_schema_format(request))[1])
+def schema_view(request):
+    """Serve the OpenAPI schema from memory."""
+    fmt = _schema_format(request)
+    content = load_schema(fmt)[0]
+
+    return HttpResponse(content, content_type=SCHEMA_CONTENT_TYPES[fmt])
+
+
+@lru_cache(maxsize=None)
+def _swagger_ui_view():
+    """Build the Swagger UI view, importing drf-spectacular's views once."""
+    from drf_spectacular.views import SpectacularSwaggerView
+
+    return SpectacularSwaggerView.as_view(url_name='api-schema')
+
+
+def swagger_ui_view(request, *args, **kwargs):
+    """Serve Swagger UI, keeping its imports off the startup path."""
+    return _swagger_ui_view()(request, *args, **kwargs)
+
+
+@never_cache
+@require_safe
+def liveness_view(request):
+    """Report the process is able to serve requests."""
+    return JsonResponse({'status': 'ok'})
+
+
+# Orchestrators restart or drain instances whose probes fail
+liveness_view.load_shedding_priority = 'critical'
+
+
+@never_cache
+@require_safe
+def readiness_view(request):
+    """Report whether the database is reachable and fully migrated."""
+    checks = {'database': database_available()}
+    checks['migrations'] = checks['database'] and migrations_applied()
+    status = 200 if all(checks.values()) else 503
+
+    return JsonResponse(checks, status=status)
+
+
+readiness_view.load_shedding_priority = 'critical'
+
+
+@method_decorator(never_cache, name='dispatch')
+class MetricsView(APIView):
+    """Report counters of the worker process serving the request to staff."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAdminUser]
+    # Operational, not part of the API schema
+    schema = None
+
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'coalescing': dict(coalescing.single_flight.stats),
+        })
+
+
+class MediaView(APIView):
+    """
+    Serve an uploaded image to its owner. Behind nginx the app only
+    authorizes the request, nginx sends the file with X-Accel-Redirect.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    # Files, not part of the API schema
+    schema = None
+
+    def perform_content_negotiation(self, request, force=False):
+        # Browsers accept images only, errors are sent as JSON anyway
+        return super().perform_content_negotiation(request, force=True)
+
+    def send(self, name, open_file):
+        """Return a response sending a file, by nginx when behind it."""
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            response = HttpResponse(
+                content_type=mimetypes.guess_type(name)[0]
+                or 'application/octet-stream',
+            )
+            response['X-Accel-Redirect'] = (
+                f'{settings.MEDIA_ACCEL_REDIRECT_PREFIX}{quote(name)}'
+            )
+            return response
+        try:
+            return FileResponse(open_file())
+        except FileNotFoundError:
+            raise Http404
+
+    def get(self, request, name):
+        if not images.is_owner(request.user, name):
+            raise Http404
+        if settings.AWS_STORAGE_BUCKET_NAME:
+            # Signed, expiring URL of the bucket's object
+            return HttpResponseRedirect(default_storage.url(name))
+
+        response = self.send(name, lambda: default_storage.open(name))
+        if images.is_content_addressed(name):
+            patch_cache_control(
+                response, private=True, max_age=365 * 24 * 3600,
+                immutable=True,
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+
+class ResizedRecipeImageView(MediaView):
+    """
+    Serve a recipe's image resized to one of RESIZED_IMAGES' sizes. It is
+    resized on the first request only, later ones are sent by nginx from
+    the cache after a single query checking the owner.
+    """
+
+    def get(self, request, pk, width, height, fmt):
+        if (
+            f'{width}x{height}' not in settings.RESIZED_IMAGES['SIZES']
+            or fmt not in resizing.FORMATS
+        ):
+            raise Http404
+        name = Recipe.objects.filter(
+            pk=pk, user=request.user,
+        ).values_list('image', flat=True).first()
+        if not name:
+            raise Http404
+
+        # The source's name changes with its content, so does the ETag
+        etag = f'"{resizing.cache_name(name, (width, height), fmt)}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                cached = resizing.resized(name, (width, height), fmt)
+            except imaging.InvalidImage:
+                raise Http404
+            response = self.send(cached, lambda: open(
+                os.path.join(settings.MEDIA_ROOT, cached), 'rb',
+            ))
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
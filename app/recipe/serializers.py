@@ -1,12 +1,19 @@
 """
 Serializers for the recipe API View.
 """
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
 
+from core import uploads
+from core.serializers import ImageUploadField
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    Upload,
 )
 
 
@@ -96,16 +103,198 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    image_sizes = serializers.SerializerMethodField(
+        help_text='URLs of the image resized to each size, as JPEG. '
+                  'Replace the extension with .webp or .png for those.',
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_sizes',
+        ]
+
+    def get_image_sizes(self, recipe) -> Optional[Dict[str, str]]:
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for size in settings.RESIZED_IMAGES['SIZES']:
+            width, height = size.split('x')
+            url = reverse(
+                'resized-recipe-image', args=[recipe.id, width, height, 'jpg'],
+            )
+            urls[size] = request.build_absolute_uri(url) if request else url
+
+        return urls
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Serializer for recipes similar to another."""
+    similarity = serializers.FloatField(
+        read_only=True,
+        help_text='Shared tags and ingredients over all of the two, '
+                  'from 0 to 1.',
+    )
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + ['similarity']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
+    image = ImageUploadField()
 
     class Meta(RecipeSerializer.Meta):
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable image uploads."""
+    offset = serializers.SerializerMethodField(
+        help_text='Bytes received so far, send the rest from here.',
+    )
+
+    class Meta:
+        model = Upload
+        fields = ['id', 'filename', 'length', 'offset', 'completed_at']
+        read_only_fields = ['id', 'completed_at']
+
+    def get_offset(self, upload) -> int:
+        return uploads.offset(upload)
+
+    def validate_length(self, value):
+        """Check the upload fits the size limit."""
+        max_size = settings.RESUMABLE_UPLOADS['MAX_SIZE']
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(
+                f'Length must be between 1 and {max_size} bytes.'
+            )
+        return value
+
+
+# Recipe list orderings, each ending with the ID for a total order
+RECIPE_ORDERINGS = {
+    '-id': ['-id'],
+    'id': ['id'],
+    'price': ['price', 'id'],
+    '-price': ['-price', '-id'],
+    'time_minutes': ['time_minutes', 'id'],
+    '-time_minutes': ['-time_minutes', '-id'],
+}
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters of the recipe list."""
+    min_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False,
+    )
+    max_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False,
+    )
+    max_time = serializers.IntegerField(min_value=0, required=False)
+    ordering = serializers.ChoiceField(
+        choices=list(RECIPE_ORDERINGS), default='-id',
+    )
+
+
+class RecipeAttrFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters of tag and ingredient lists."""
+    q = serializers.CharField(max_length=255, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class SimilarRecipeFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters of similar recipes."""
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class TagUsageSerializer(TagSerializer):
+    """Serializer for tags with the number of recipes they are on."""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+
+
+class IngredientUsageSerializer(IngredientSerializer):
+    """Serializer for ingredients with the number of recipes they are on."""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['recipe_count']
+
+
+class PriceRangeSerializer(serializers.Serializer):
+    """Serializer for the number of recipes in a price range."""
+    min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True,
+        help_text='Lowest price of the range, null if unbounded.',
+    )
+    max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True,
+        help_text='Price the range ends before, null if unbounded.',
+    )
+    count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """Serializer for the stats of a user's recipes."""
+    recipe_count = serializers.IntegerField()
+    average_time_minutes = serializers.FloatField(allow_null=True)
+    average_price = serializers.DecimalField(
+        max_digits=5, decimal_places=2, allow_null=True,
+    )
+    price_ranges = PriceRangeSerializer(many=True)
+    top_tags = TagUsageSerializer(many=True)
+    top_ingredients = IngredientUsageSerializer(many=True)
+
+
+class ShoppingListFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters of shopping lists."""
+    recipes = serializers.CharField()
+    max_recipes = 100
+
+    def validate_recipes(self, value):
+        """Return the recipe IDs, once each."""
+        try:
+            ids = {int(str_id) for str_id in value.split(',')}
+        except ValueError:
+            raise serializers.ValidationError(
+                'Must be a comma separated list of recipe IDs.'
+            )
+        if len(ids) > self.max_recipes:
+            raise serializers.ValidationError(
+                f'At most {self.max_recipes} recipes can be listed.'
+            )
+        return sorted(ids)
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """Serializer for an ingredient of a shopping list."""
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField(source='ingredient__name')
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        help_text='IDs of the listed recipes needing the ingredient.',
+    )
+
+
+class SyncDeletedSerializer(serializers.Serializer):
+    """Serializer for IDs of objects deleted since a sync."""
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+
+
+class SyncSerializer(serializers.Serializer):
+    """Serializer for changes since a sync."""
+    token = serializers.CharField(
+        help_text='Pass as since on the next sync.',
+    )
+    reset = serializers.BooleanField(
+        help_text='True if all objects are sent, replacing local data.',
+    )
+    recipes = RecipeDetailSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = SyncDeletedSerializer()
@@ -0,0 +1,264 @@
+"""
+Tests for images uploaded straight to object storage.
+"""
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import PropertyMock, patch
+
+from PIL import Image
+from botocore.exceptions import ClientError
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import direct_uploads, images
+from core.models import Job, Recipe, StoredImage
+
+
+def image_upload_url(recipe_id):
+    """Create and return the URL presigning a recipe image upload."""
+    return reverse('recipe:recipe-image-upload-url', args=[recipe_id])
+
+
+def confirm_url(recipe_id):
+    """Create and return the URL confirming a recipe image upload."""
+    return reverse('recipe:recipe-confirm-image-upload', args=[recipe_id])
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(
+        user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+    )
+
+
+def jpeg_bytes():
+    """Return a small JPEG image."""
+    image_file = BytesIO()
+    Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+    return image_file.getvalue()
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='media')
+@patch('core.direct_uploads.client')
+@patch('core.direct_uploads.bucket')
+class DirectUploadApiTests(TestCase):
+    """Test presigning and confirming direct image uploads."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def presign(self):
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'content_type': 'image/jpeg'},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data
+
+    def uploaded(self, mock_bucket, content):
+        obj = mock_bucket.return_value.Object.return_value
+        obj.content_length = len(content)
+        obj.get.return_value = {'Body': BytesIO(content)}
+        return obj
+
+    def test_presign_upload(self, mock_bucket, mock_client):
+        """Test getting a signed URL to PUT the image to."""
+        mock_client.return_value.generate_presigned_url.return_value = (
+            'https://s3.example.com/signed'
+        )
+
+        upload = self.presign()
+
+        self.assertEqual(upload['url'], 'https://s3.example.com/signed')
+        self.assertEqual(upload['headers'], {'Content-Type': 'image/jpeg'})
+        _, kwargs = mock_client.return_value.generate_presigned_url.call_args
+        name = kwargs['Params']['Key']
+        self.assertTrue(name.startswith('direct/'))
+        self.assertTrue(name.endswith('.jpg'))
+        self.assertEqual(kwargs['Params']['ContentType'], 'image/jpeg')
+        # Collected unless confirmed in time
+        self.assertTrue(StoredImage.objects.filter(name=name).exists())
+        self.assertEqual(
+            Job.objects.get(name='core.images.collect_image').kwargs,
+            {'name': name},
+        )
+
+    def test_confirm_upload(self, mock_bucket, mock_client):
+        """Test confirming a valid image attaches it."""
+        upload = self.presign()
+        obj = self.uploaded(mock_bucket, jpeg_bytes())
+
+        res = self.client.post(
+            confirm_url(self.recipe.id), {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        name = mock_bucket.return_value.Object.call_args.args[0]
+        self.assertEqual(self.recipe.image.name, name)
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 1)
+        # Only the image's header was read
+        self.assertEqual(obj.get.call_args.kwargs, {'Range': 'bytes=0-65535'})
+        # Then all of it is re-encoded by a job
+        job = Job.objects.get(name='core.direct_uploads.normalize_upload')
+        self.assertEqual(
+            job.kwargs,
+            {
+                'model': 'core.recipe', 'pk': self.recipe.pk,
+                'field': 'image', 'name': name,
+            },
+        )
+
+    def test_confirm_missing_upload(self, mock_bucket, mock_client):
+        """Test confirming before uploading fails."""
+        upload = self.presign()
+        obj = mock_bucket.return_value.Object.return_value
+        type(obj).content_length = PropertyMock(side_effect=ClientError(
+            {'Error': {'Code': '404'}}, 'HeadObject',
+        ))
+
+        res = self.client.post(
+            confirm_url(self.recipe.id), {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirm_rejects_non_image(self, mock_bucket, mock_client):
+        """Test uploads which aren't images are refused."""
+        upload = self.presign()
+        self.uploaded(mock_bucket, b'not an image')
+
+        res = self.client.post(
+            confirm_url(self.recipe.id), {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_confirm_rejects_large_image(self, mock_bucket, mock_client):
+        """Test uploads over the size limit are refused."""
+        upload = self.presign()
+        obj = self.uploaded(mock_bucket, jpeg_bytes())
+        obj.content_length = 20 * 1024 * 1024 + 1
+
+        res = self.client.post(
+            confirm_url(self.recipe.id), {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        obj.get.assert_not_called()
+
+    def test_confirm_other_recipe(self, mock_bucket, mock_client):
+        """Test a token only confirms the image it was issued for."""
+        upload = self.presign()
+        self.uploaded(mock_bucket, jpeg_bytes())
+        other = create_recipe(self.user)
+
+        res = self.client.post(
+            confirm_url(other.id), {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe(self, mock_bucket, mock_client):
+        """Test users can't upload images of others' recipes."""
+        other = create_user(email='other@example.com')
+        self.client.force_authenticate(other)
+
+        res = self.client.post(
+            image_upload_url(self.recipe.id), {'content_type': 'image/jpeg'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(AWS_STORAGE_BUCKET_NAME=None)
+    def test_disabled_without_bucket(self, mock_bucket, mock_client):
+        """Test direct uploads need object storage."""
+        res = self.client.post(
+            image_upload_url(self.recipe.id), {'content_type': 'image/jpeg'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NormalizeUploadTests(TestCase):
+    """Test re-encoding confirmed direct uploads."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.recipe = create_recipe(create_user())
+
+    def confirmed(self, content):
+        """Store content as a confirmed upload of the recipe's image."""
+        name = 'direct/ab/abcdef.jpg'
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as upload:
+            upload.write(content)
+        images.touch(name)
+        self.recipe.image.name = name
+        self.recipe.save()
+        return name
+
+    def test_normalize_strips_metadata(self):
+        """Test the upload is replaced by a copy without EXIF."""
+        exif = Image.Exif()
+        exif[0x010e] = 'Taken at home'
+        image_file = BytesIO()
+        Image.new('RGB', (10, 10)).save(image_file, 'JPEG', exif=exif)
+        name = self.confirmed(image_file.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            direct_uploads.normalize_upload(
+                'core.recipe', self.recipe.pk, 'image', name,
+            )
+
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, name)
+        with Image.open(self.recipe.image) as stored:
+            self.assertEqual(dict(stored.getexif()), {})
+        self.assertEqual(StoredImage.objects.get(name=name).refs, 0)
+
+    def test_normalize_drops_broken_image(self):
+        """Test an upload valid only in its header is removed."""
+        name = self.confirmed(jpeg_bytes()[:200])
+
+        direct_uploads.normalize_upload(
+            'core.recipe', self.recipe.pk, 'image', name,
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_normalize_skips_replaced_image(self):
+        """Test an upload no longer in place is left alone."""
+        name = self.confirmed(jpeg_bytes())
+        Recipe.objects.filter(pk=self.recipe.pk).update(image='other.jpg')
+
+        direct_uploads.normalize_upload(
+            'core.recipe', self.recipe.pk, 'image', name,
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, 'other.jpg')
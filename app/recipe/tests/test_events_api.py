@@ -0,0 +1,109 @@
+"""
+Tests for the recipe change event stream API.
+"""
+from unittest.mock import patch
+
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import events
+from core.models import Tag
+
+
+EVENTS_URL = reverse('recipe:events')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class PublicEventsApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required for the event stream."""
+        res = APIClient().get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(res.content.startswith(b'event: error\n'))
+
+
+@override_settings(EVENTS_BACKEND='local', EVENTS_HEARTBEAT=0.01)
+class PrivateEventsApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(EVENTS_MAX_STREAM_SECONDS=0.05)
+    def test_streams_changes(self):
+        """Test the user's changes are streamed to them."""
+        res = self.client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(
+                user=create_user(email='other@example.com'), name='Other',
+            )
+
+        chunks = iter(res.streaming_content)
+        next(chunks)
+        event = next(chunks).decode()
+        idle = next(chunks)
+        # Read to the end, closing the response as WSGI servers do
+        b''.join(chunks)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/event-stream')
+        self.assertEqual(res['X-Accel-Buffering'], 'no')
+        self.assertTrue(event.startswith('event: created\n'))
+        self.assertIn(f'"id": {tag.id}', event)
+        self.assertEqual(idle, b': keepalive\n\n')
+
+    @override_settings(EVENTS_MAX_STREAMS=1, EVENTS_MAX_STREAM_SECONDS=0.05)
+    def test_streams_capped_per_process(self):
+        """Test streams beyond the process's limit are turned away."""
+        first = self.client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+
+        res = self.client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(res['Retry-After'], '10')
+        self.assertTrue(res.content.startswith(b'event: error\n'))
+        # Ending a stream frees its place
+        b''.join(first.streaming_content)
+        res = self.client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        b''.join(res.streaming_content)
+
+    @override_settings(EVENTS_MAX_STREAM_SECONDS=0.05)
+    def test_stream_releases_database_connection(self):
+        """Test the connection is closed before streaming starts."""
+        default = connections['default']
+        with patch.object(default, 'in_atomic_block', False), \
+                patch.object(default, 'close') as patched_close:
+            res = self.client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+
+        patched_close.assert_called()
+        b''.join(res.streaming_content)
+
+    @override_settings(EVENTS_MAX_STREAMS=1)
+    def test_unread_streams_release_their_place(self):
+        """Test streams closed before being read, i.e. HEAD, free theirs."""
+        for _ in range(3):
+            res = self.client.head(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            # Closes the response, as WSGI servers do
+            b''.join(res.streaming_content)
+
+        self.assertEqual(events.local_bus._count, 0)
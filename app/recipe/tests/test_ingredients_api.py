@@ -120,6 +120,19 @@ class PrivateIngredientApiTests(TestCase):
         self.assertIn(s1.data, res.data)
         self.assertNotIn(s2.data, res.data)
 
+    def test_autocomplete_ingredients(self):
+        """Test matching ingredients by the start of their name."""
+        Ingredient.objects.create(user=self.user, name='Garlic')
+        Ingredient.objects.create(user=self.user, name='Ginger')
+        Ingredient.objects.create(user=self.user, name='Egg')
+
+        res = self.client.get(INGREDIENTS_URL, {'q': 'g'})
+
+        self.assertEqual(
+            [ingredient['name'] for ingredient in res.data],
+            ['Garlic', 'Ginger'],
+        )
+
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients return a unique list."""
         ing = Ingredient.objects.create(user=self.user, name='Eggs')
@@ -8,7 +8,9 @@ from decimal import Decimal
 
 from PIL import Image
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -19,6 +21,7 @@ from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    RecipeFeatures,
 )
 
 from recipe.serializers import (
@@ -35,6 +38,11 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """Create and return the URL of recipes similar to a recipe."""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
 def image_upload_url(recipe_id):
     """Create and return an image upload URL"""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
@@ -438,6 +446,210 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_price_and_time(self):
+        """Test filtering recipes by price range and cooking time."""
+        r1 = create_recipe(user=self.user, price=Decimal('4.00'))
+        r2 = create_recipe(
+            user=self.user, price=Decimal('6.00'), time_minutes=40,
+        )
+        create_recipe(
+            user=self.user, price=Decimal('9.50'), time_minutes=45,
+        )
+        create_recipe(user=self.user, price=Decimal('2.00'))
+
+        res = self.client.get(
+            RECIPES_URL, {'min_price': '3', 'max_price': '9.00'},
+        )
+        time_res = self.client.get(
+            RECIPES_URL, {'min_price': '3', 'max_time': '30'},
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data], [r2.id, r1.id],
+        )
+        self.assertEqual([recipe['id'] for recipe in time_res.data], [r1.id])
+
+    def test_order_by_price_and_time(self):
+        """Test ordering recipes, ties broken by ID."""
+        r1 = create_recipe(user=self.user, price=Decimal('6.00'))
+        r2 = create_recipe(user=self.user, price=Decimal('4.00'))
+        r3 = create_recipe(
+            user=self.user, price=Decimal('6.00'), time_minutes=5,
+        )
+
+        for ordering, expected in [
+            ('price', [r2, r1, r3]),
+            ('-price', [r3, r1, r2]),
+            ('time_minutes', [r3, r1, r2]),
+        ]:
+            res = self.client.get(RECIPES_URL, {'ordering': ordering})
+
+            self.assertEqual(
+                [recipe['id'] for recipe in res.data],
+                [recipe.id for recipe in expected],
+            )
+
+    def test_invalid_filters_rejected(self):
+        """Test bad filter values return an error instead of a list."""
+        for params in [
+            {'ordering': 'title'},
+            {'min_price': 'cheap'},
+            {'max_time': '-1'},
+        ]:
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_ignores_list_params(self):
+        """Test list filters and ordering don't apply to detail actions."""
+        recipe = create_recipe(user=self.user, price=Decimal('9.00'))
+        url = f'{detail_url(recipe.id)}?ordering=zzz&max_price=1'
+
+        res = self.client.patch(url, {'title': 'New title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+
+    def test_price_range_uses_index(self):
+        """Test price filtered and ordered lists scan the price index."""
+        create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                RECIPES_URL, {'min_price': '3', 'ordering': '-price'},
+            )
+        sql = next(
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "core_recipe"')
+        )
+        with connection.cursor() as cursor:
+            # Tiny tables are cheaper to scan, compare plans regardless
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('core_recipe_user_price_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class SimilarRecipeTests(TestCase):
+    """Tests for recipes similar by tags and ingredients."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['Dinner', 'Vegan', 'Quick']
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Tofu', 'Rice', 'Kale']
+        ]
+
+    def create_tagged(self, tags, ingredients, user=None):
+        """Create a recipe with some of the tags and ingredients."""
+        recipe = create_recipe(user=user or self.user)
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def similar_ids(self, recipe, **params):
+        res = self.client.get(similar_url(recipe.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_similar_ranked_by_jaccard(self):
+        """Test recipes sharing the most of their sets rank first."""
+        dinner, vegan, quick = self.tags
+        tofu, rice, kale = self.ingredients
+        recipe = self.create_tagged([dinner, vegan], [tofu, rice])
+        same = self.create_tagged([dinner, vegan], [tofu, rice])
+        close = self.create_tagged([dinner, vegan, quick], [tofu, rice])
+        far = self.create_tagged([dinner], [kale])
+        self.create_tagged([quick], [kale])
+        other_user = create_user(email='other@example.com', password='pw')
+        self.create_tagged([dinner, vegan], [tofu, rice], user=other_user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['similarity']) for item in res.data],
+            [(same.id, 1.0), (close.id, 0.8), (far.id, 0.2)],
+        )
+        self.assertCountEqual(
+            [tag['name'] for tag in res.data[0]['tags']], ['Dinner', 'Vegan'],
+        )
+
+    def test_similar_follows_changes(self):
+        """Test added, removed and deleted tags and ingredients count."""
+        dinner, vegan, quick = self.tags
+        tofu, rice, kale = self.ingredients
+        recipe = self.create_tagged([dinner], [tofu])
+        other = self.create_tagged([vegan], [rice])
+        self.assertEqual(self.similar_ids(recipe), [])
+
+        vegan.recipe_set.add(recipe)
+        self.assertEqual(self.similar_ids(recipe), [other.id])
+
+        other.tags.clear()
+        other.ingredients.remove(rice)
+        self.assertEqual(self.similar_ids(recipe), [])
+
+        payload = {'tags': [{'name': 'Dinner'}], 'ingredients': []}
+        res = self.client.patch(detail_url(other.id), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.similar_ids(recipe), [other.id])
+
+        dinner.delete()
+        self.assertEqual(self.similar_ids(recipe), [])
+        self.assertCountEqual(
+            RecipeFeatures.objects.get(recipe=recipe).features,
+            [vegan.id, -tofu.id],
+        )
+
+    def test_similar_without_tags_or_ingredients(self):
+        """Test a recipe with nothing to compare has no similar ones."""
+        recipe = create_recipe(user=self.user)
+        self.create_tagged(self.tags, self.ingredients)
+
+        self.assertEqual(self.similar_ids(recipe), [])
+
+    def test_similar_limit(self):
+        """Test the number of similar recipes can be limited."""
+        recipe = self.create_tagged(self.tags, [])
+        for _ in range(3):
+            self.create_tagged(self.tags, [])
+
+        self.assertEqual(len(self.similar_ids(recipe, limit=2)), 2)
+        res = self.client.get(similar_url(recipe.id), {'limit': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_of_other_users_recipe_not_found(self):
+        """Test recipes of other users can't be compared."""
+        other_user = create_user(email='other@example.com', password='pw')
+        recipe = create_recipe(user=other_user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_queries_bounded(self):
+        """Test the query count doesn't grow with the recipes compared."""
+        recipe = self.create_tagged(self.tags, self.ingredients)
+        for _ in range(5):
+            self.create_tagged(self.tags[:1], self.ingredients[:1])
+
+        # The recipe, its features, the similar ones and their relations
+        with self.assertNumQueries(5):
+            self.assertEqual(len(self.similar_ids(recipe)), 5)
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
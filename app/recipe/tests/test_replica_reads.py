@@ -0,0 +1,75 @@
+"""
+Tests for serving recipe API reads from replicas.
+"""
+from unittest.mock import patch, call
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import routers
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+@patch('core.routers.choose_replica', return_value='default')
+@patch('core.routers.use_read_alias', wraps=routers.use_read_alias)
+class ReplicaReadTests(TestCase):
+    """Test routing of recipe API requests."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_safe_requests_read_from_replica(
+        self, patched_use, patched_choose
+    ):
+        """Test list requests read from a replica, then reset routing."""
+        for url in [RECIPES_URL, TAGS_URL]:
+            patched_use.reset_mock()
+
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                patched_use.call_args_list, [call('default'), call(None)]
+            )
+        self.assertIsNone(routers.current_read_alias())
+
+    def test_reads_after_write_use_primary(
+        self, patched_use, patched_choose
+    ):
+        """Test users read their own writes from the primary."""
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': '2.50'}
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        patched_use.reset_mock()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['title'], 'Soup')
+        self.assertEqual(patched_use.call_args_list, [call(None)])
+
+    def test_failed_write_not_pinned(self, patched_use, patched_choose):
+        """Test rejected writes don't pin the user to the primary."""
+        res = self.client.post(RECIPES_URL, {'title': 'Soup'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(routers.is_pinned_to_primary(self.user))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self, patched_use, patched_choose):
+        """Test nothing is routed without replicas."""
+        self.client.get(RECIPES_URL)
+
+        patched_choose.assert_not_called()
@@ -0,0 +1,108 @@
+"""
+Tests for the shopping list API.
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Ingredient,
+)
+
+
+SHOPPING_LIST_URL = reverse('recipe:shopping-list')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, ingredients=()):
+    """Create and return a sample recipe with some ingredients."""
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe title',
+        time_minutes=22,
+        price=Decimal('5.25'),
+    )
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+def id_list(*recipes):
+    return ','.join(str(recipe.id) for recipe in recipes)
+
+
+class PublicShoppingListApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to get a shopping list."""
+        res = APIClient().get(SHOPPING_LIST_URL, {'recipes': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateShoppingListApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice, self.tofu, self.kale = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Rice', 'Tofu', 'Kale']
+        ]
+
+    def test_merges_ingredients_of_recipes(self):
+        """Test each ingredient is listed once with its recipes."""
+        bowl = create_recipe(self.user, [self.rice, self.tofu])
+        stew = create_recipe(self.user, [self.tofu, self.kale])
+        create_recipe(self.user, [self.rice])
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                SHOPPING_LIST_URL, {'recipes': id_list(stew, bowl)},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': self.kale.id, 'name': 'Kale', 'recipes': [stew.id]},
+            {'id': self.rice.id, 'name': 'Rice', 'recipes': [bowl.id]},
+            {
+                'id': self.tofu.id,
+                'name': 'Tofu',
+                'recipes': [bowl.id, stew.id],
+            },
+        ])
+
+    def test_other_users_recipes_ignored(self):
+        """Test recipes of other users add nothing to the list."""
+        other = create_user(email='other@example.com')
+        pasta = Ingredient.objects.create(user=other, name='Pasta')
+        recipe = create_recipe(self.user, [self.rice])
+        others = create_recipe(other, [pasta])
+
+        res = self.client.get(
+            SHOPPING_LIST_URL, {'recipes': id_list(recipe, others)},
+        )
+
+        self.assertEqual(
+            [item['name'] for item in res.data], ['Rice'],
+        )
+
+    def test_invalid_recipes_rejected(self):
+        """Test missing or malformed recipe IDs return an error."""
+        ids = ','.join(str(index) for index in range(101))
+        for params in [{}, {'recipes': '1,soup'}, {'recipes': ids}]:
+            res = self.client.get(SHOPPING_LIST_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
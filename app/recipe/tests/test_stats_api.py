@@ -0,0 +1,165 @@
+"""
+Tests for the recipe stats API.
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import stats
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    RecipeStats,
+)
+
+
+STATS_URL = reverse('recipe:stats')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class PublicStatsApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to get stats."""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatsApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, price, time_minutes, tags=(), ingredients=()):
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': time_minutes,
+            'price': price,
+            'tags': [{'name': name} for name in tags],
+            'ingredients': [{'name': name} for name in ingredients],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def get_stats(self):
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_stats_without_recipes(self):
+        """Test a user without recipes has empty stats."""
+        data = self.get_stats()
+
+        self.assertEqual(data['recipe_count'], 0)
+        self.assertIsNone(data['average_time_minutes'])
+        self.assertIsNone(data['average_price'])
+        self.assertEqual(
+            [price_range['count'] for price_range in data['price_ranges']],
+            [0, 0, 0, 0, 0],
+        )
+        self.assertEqual(data['top_tags'], [])
+
+    def test_stats_follow_recipe_changes(self):
+        """Test stats reflect recipes created, updated and deleted."""
+        self.create_recipe('4.50', 10, ['Vegan', 'Quick'], ['Tofu'])
+        second = self.create_recipe('12.00', 30, ['Vegan'], ['Tofu', 'Rice'])
+        third = self.create_recipe('60.00', 50, ['Dinner'])
+
+        data = self.get_stats()
+        self.assertEqual(data['recipe_count'], 3)
+        self.assertEqual(data['average_time_minutes'], 30)
+        self.assertEqual(data['average_price'], '25.50')
+        self.assertEqual(
+            [price_range['count'] for price_range in data['price_ranges']],
+            [1, 0, 1, 0, 1],
+        )
+        self.assertEqual(data['price_ranges'][0]['min'], None)
+        self.assertEqual(data['price_ranges'][0]['max'], '5.00')
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in data['top_tags']],
+            [('Vegan', 2), ('Dinner', 1), ('Quick', 1)],
+        )
+        self.assertEqual(data['top_ingredients'][0]['name'], 'Tofu')
+
+        res = self.client.patch(
+            detail_url(second),
+            {'price': '7.00', 'time_minutes': 20, 'tags': [{'name': 'Quick'}]},
+            format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.delete(detail_url(third))
+
+        data = self.get_stats()
+        self.assertEqual(data['recipe_count'], 2)
+        self.assertEqual(data['average_time_minutes'], 15)
+        self.assertEqual(data['average_price'], '5.75')
+        self.assertEqual(
+            [price_range['count'] for price_range in data['price_ranges']],
+            [1, 1, 0, 0, 0],
+        )
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in data['top_tags']],
+            [('Quick', 2), ('Vegan', 1)],
+        )
+
+    def test_stats_match_rebuild(self):
+        """Test maintained stats equal those computed from scratch."""
+        first = self.create_recipe('4.50', 10, ['Vegan'], ['Tofu'])
+        self.create_recipe('20.00', 25, ['Vegan', 'Dinner'], ['Rice'])
+        recipe = Recipe.objects.get(id=first)
+        recipe.time_minutes = 40
+        recipe.save()
+        vegan = Tag.objects.get(user=self.user, name='Vegan')
+        vegan.recipe_set.clear()
+        Ingredient.objects.get(user=self.user, name='Rice').delete()
+        maintained = self.get_stats()
+
+        stats.rebuild([self.user.id])
+
+        self.assertEqual(self.get_stats(), maintained)
+
+    def test_stats_of_user_only(self):
+        """Test stats count the authenticated user's recipes only."""
+        other = create_user(email='other@example.com')
+        Recipe.objects.create(
+            user=other, title='Other', time_minutes=5, price=Decimal('1.00'),
+        )
+        self.create_recipe('8.00', 10)
+
+        data = self.get_stats()
+
+        self.assertEqual(data['recipe_count'], 1)
+        self.assertEqual(data['average_price'], '8.00')
+
+    def test_stats_read_without_scanning_recipes(self):
+        """Test stats are one row and two short index scans."""
+        for _ in range(3):
+            self.create_recipe('8.00', 10, ['Vegan'], ['Tofu'])
+
+        with self.assertNumQueries(3):
+            self.get_stats()
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 3,
+        )
@@ -0,0 +1,160 @@
+"""
+Tests for the delta sync API.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import sync
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Tombstone,
+)
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def minutes_ago(minutes):
+    return timezone.now() - timedelta(minutes=minutes)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required for syncing."""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_TOKEN_MARGIN=0)
+class PrivateSyncApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync_since(self, when):
+        return self.client.get(SYNC_URL, {'since': sync.make_token(when)})
+
+    def test_full_sync(self):
+        """Test syncing without a token returns all the user's objects."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        Ingredient.objects.create(user=self.user, name='Salt')
+        create_recipe(user=create_user(email='other@example.com'))
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['reset'])
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(res.data['recipes'][0]['tags'][0]['name'], 'Vegan')
+        self.assertEqual(len(res.data['tags']), 1)
+        self.assertEqual(len(res.data['ingredients']), 1)
+        self.assertLessEqual(
+            sync.parse_token(res.data['token']), timezone.now()
+        )
+
+    def test_sync_returns_changes_since_token(self):
+        """Test only objects changed after the token are returned."""
+        old = create_recipe(user=self.user, title='Old')
+        Recipe.objects.filter(id=old.id).update(updated_at=minutes_ago(10))
+        new = create_recipe(user=self.user, title='New')
+
+        res = self.sync_since(minutes_ago(5))
+
+        self.assertFalse(res.data['reset'])
+        self.assertEqual([r['id'] for r in res.data['recipes']], [new.id])
+
+    def test_sync_returns_deletions(self):
+        """Test deleted objects are returned as IDs."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user)
+        since = minutes_ago(1)
+        tag_id, recipe_id = tag.id, recipe.id
+        tag.delete()
+        recipe.delete()
+
+        res = self.sync_since(since)
+
+        self.assertEqual(res.data['deleted'], {
+            'recipes': [recipe_id], 'tags': [tag_id], 'ingredients': [],
+        })
+
+    def test_sync_without_changes_is_one_query(self):
+        """Test a sync finding nothing probes the indexes only once."""
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(
+            updated_at=minutes_ago(10)
+        )
+
+        with self.assertNumQueries(1):
+            res = self.sync_since(minutes_ago(5))
+
+        self.assertEqual(res.data['recipes'], [])
+        self.assertEqual(res.data['deleted']['recipes'], [])
+
+    def test_token_from_response_syncs_later_changes(self):
+        """Test the returned token picks up changes made after it."""
+        token = self.client.get(SYNC_URL).data['token']
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+
+    @override_settings(SYNC_TOMBSTONE_DAYS=1)
+    def test_token_past_tombstones_resets(self):
+        """Test a token older than the kept tombstones gets everything."""
+        create_recipe(user=self.user)
+
+        res = self.sync_since(timezone.now() - timedelta(days=2))
+
+        self.assertTrue(res.data['reset'])
+        self.assertEqual(len(res.data['recipes']), 1)
+
+    def test_invalid_token(self):
+        """Test an invalid token is rejected."""
+        res = self.client.get(SYNC_URL, {'since': 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_user_leaves_no_tombstones(self):
+        """Test a user's objects deleted with them leave no tombstones."""
+        create_recipe(user=self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        self.user.delete()
+
+        self.assertFalse(Tombstone.objects.exists())
@@ -10,6 +10,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.autocomplete import trigram_available
 from core.models import (
     Tag,
     Recipe,
@@ -145,3 +146,83 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+
+class TagAutocompleteTests(TestCase):
+    """Test matching tags while typing."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, *tags):
+        recipe = Recipe.objects.create(
+            title='Salsa', time_minutes=5, price=Decimal('1.00'),
+            user=self.user,
+        )
+        recipe.tags.add(*tags)
+
+    def names(self, res):
+        return [tag['name'] for tag in res.data]
+
+    def test_prefix_matches_most_used_first(self):
+        """Test names starting with the query, most used first."""
+        tomato = Tag.objects.create(user=self.user, name='Tomato')
+        tomatillo = Tag.objects.create(user=self.user, name='tomatillo')
+        Tag.objects.create(user=self.user, name='Tofu')
+        Tag.objects.create(user=self.user, name='Potato')
+        self.create_recipe(tomatillo)
+        self.create_recipe(tomatillo, tomato)
+        self.create_recipe(tomatillo)
+
+        res = self.client.get(TAGS_URL, {'q': 'to'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.names(res), ['tomatillo', 'Tomato', 'Tofu'])
+
+    def test_limit(self):
+        """Test only the best matches are returned."""
+        for name in ['Soup', 'Sour', 'Soy']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'q': 'so', 'limit': 2})
+
+        self.assertEqual(self.names(res), ['Soup', 'Sour'])
+
+    def test_matches_limited_to_user(self):
+        """Test other users' tags never match."""
+        other = create_user(email='other@example.com')
+        Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'q': 'veg'})
+
+        self.assertEqual(res.data, [])
+
+    def test_combined_with_assigned_only(self):
+        """Test matching among tags assigned to recipes."""
+        used = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Brunch')
+        self.create_recipe(used)
+        self.create_recipe(used)
+
+        res = self.client.get(TAGS_URL, {'q': 'br', 'assigned_only': 1})
+
+        self.assertEqual(self.names(res), ['Breakfast'])
+
+    def test_invalid_limit(self):
+        """Test the number of matches is bounded."""
+        res = self.client.get(TAGS_URL, {'q': 'so', 'limit': 500})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fuzzy_matches(self):
+        """Test misspelled queries match similar names after prefixes."""
+        if not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        Tag.objects.create(user=self.user, name='Tomato')
+        Tag.objects.create(user=self.user, name='Tomatoes stewed')
+
+        res = self.client.get(TAGS_URL, {'q': 'tomatoe'})
+
+        self.assertEqual(self.names(res), ['Tomatoes stewed', 'Tomato'])
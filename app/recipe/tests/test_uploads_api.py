@@ -0,0 +1,258 @@
+"""
+Tests for resumable recipe image uploads.
+"""
+import fcntl
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import uploads
+from core.models import Job, Recipe, Upload
+from recipe.views import UploadView
+
+
+def create_uploads_url(recipe_id):
+    """Create and return the URL starting a recipe's uploads."""
+    return reverse('recipe:recipe-create-upload', args=[recipe_id])
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user):
+    """Create and return a sample recipe."""
+    return Recipe.objects.create(
+        user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+    )
+
+
+def jpeg_bytes():
+    """Return a small JPEG image."""
+    image_file = BytesIO()
+    Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+    return image_file.getvalue()
+
+
+class ResumableUploadTests(TestCase):
+    """Test uploading recipe images in parts."""
+
+    def setUp(self):
+        for setting in ('MEDIA_ROOT', 'RESUMABLE_UPLOADS_DIR'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            setattr(self, setting.lower(), directory.name)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RESUMABLE_UPLOADS={
+                'DIR': self.resumable_uploads_dir,
+                'MAX_SIZE': 1024 * 1024,
+                'EXPIRE_AFTER': 3600,
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def start(self, length, filename='photo.jpg'):
+        res = self.client.post(
+            create_uploads_url(self.recipe.id),
+            {'filename': filename, 'length': length},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res['Location']
+
+    def send(self, url, part, offset):
+        return self.client.patch(
+            url, part,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload_in_parts(self):
+        """Test parts are appended, then the image attached."""
+        image = jpeg_bytes()
+        url = self.start(len(image))
+
+        res = self.send(url, image[:100], 0)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Upload-Offset'], '100')
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '100')
+
+        res = self.send(url, image[100:], 100)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], len(image))
+        self.assertIsNotNone(res.data['completed_at'])
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image) as stored:
+            self.assertEqual((stored.format, stored.size), ('JPEG', (10, 10)))
+        upload = Upload.objects.get()
+        self.assertFalse(os.path.exists(uploads.part_path(upload.id)))
+
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    @patch('recipe.views.coalescing.invalidate')
+    @patch('recipe.views.routers.pin_to_primary')
+    def test_attach_seen_by_owner(self, patched_pin, patched_invalidate):
+        """Test the owner's next reads see the attached image."""
+        image = jpeg_bytes()
+        url = self.start(len(image))
+        patched_pin.reset_mock()
+        patched_invalidate.reset_mock()
+
+        self.send(url, image, 0)
+
+        patched_pin.assert_called_once_with(self.user)
+        patched_invalidate.assert_called_once_with(self.user)
+
+    def test_offset_checked_under_lock(self):
+        """Test a part appended while waiting for the lock is noticed."""
+        url = self.start(10)
+        upload = Upload.objects.get()
+        flock = fcntl.flock
+
+        def append_first(part, operation):
+            with open(uploads.part_path(upload.id), 'ab') as other:
+                other.write(b'12345')
+            flock(part, operation)
+
+        with patch('core.uploads.fcntl.flock', append_first):
+            res = self.send(url, b'12345', 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '5')
+
+    def test_upload_expiry_scheduled(self):
+        """Test uploads are deleted once expired."""
+        self.start(10)
+
+        job = Job.objects.get(name='core.uploads.expire_upload')
+        upload = Upload.objects.get()
+        self.assertEqual(job.kwargs, {'upload_id': str(upload.id)})
+
+        uploads.expire_upload(str(upload.id))
+
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(self.resumable_uploads_dir), [])
+
+    def test_wrong_offset_conflicts(self):
+        """Test a part not continuing the upload is rejected."""
+        url = self.start(10)
+        self.send(url, b'12345', 0)
+
+        res = self.send(url, b'12345', 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Upload-Offset'], '5')
+
+    def test_part_beyond_length_is_cut(self):
+        """Test bytes past the announced length are ignored."""
+        url = self.start(10)
+
+        res = self.send(url, b'123456789', 0)
+        self.send(url, b'0abc', 9)
+
+        self.assertEqual(res['Upload-Offset'], '9')
+        self.assertFalse(Upload.objects.exists())
+
+    def test_invalid_image_rejected(self):
+        """Test a completed upload which isn't an image is dropped."""
+        url = self.start(5)
+
+        res = self.send(url, b'12345', 0)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Upload.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_part_requires_octet_stream(self):
+        """Test parts must be sent as raw bytes."""
+        url = self.start(5)
+
+        res = self.client.patch(url, {'data': '12345'})
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    def test_length_limited(self):
+        """Test uploads larger than the limit are refused."""
+        res = self.client.post(
+            create_uploads_url(self.recipe.id),
+            {'filename': 'photo.jpg', 'length': 1024 * 1024 + 1},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_uploads_hidden(self):
+        """Test users can't start or continue others' uploads."""
+        url = self.start(5)
+        other = create_user(email='other@example.com')
+        self.client.force_authenticate(other)
+
+        res = self.send(url, b'12345', 0)
+        create_res = self.client.post(
+            create_uploads_url(self.recipe.id),
+            {'filename': 'photo.jpg', 'length': 5},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(create_res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cancel_upload(self):
+        """Test deleting an upload removes it and its part."""
+        url = self.start(5)
+
+        res = self.client.delete(url)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(self.resumable_uploads_dir), [])
+
+    def test_missing_part_gone(self):
+        """Test uploads whose part was deleted answer 410, not 500."""
+        url = self.start(5)
+        part = uploads.part_path(Upload.objects.get().id)
+        os.remove(part)
+
+        head_res = self.client.head(url)
+        res = self.send(url, b'12345', 0)
+
+        self.assertEqual(head_res.status_code, status.HTTP_410_GONE)
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertFalse(os.path.exists(part))
+
+    def test_attached_once(self):
+        """Test a final part racing another finds the image attached."""
+        image = jpeg_bytes()
+        url = self.start(len(image))
+        self.send(url, image, 0)
+        self.recipe.refresh_from_db()
+        # As loaded by a request before the other attached the image
+        stale = Upload.objects.get()
+        stale.completed_at = None
+
+        res = UploadView().attach(stale)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(res.data['completed_at'])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).image, self.recipe.image,
+        )
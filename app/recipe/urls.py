@@ -20,5 +20,14 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('stats/', views.RecipeStatsView.as_view(), name='stats'),
+    path(
+        'shopping-list/',
+        views.ShoppingListView.as_view(),
+        name='shopping-list',
+    ),
+    path('events/', views.EventStreamView.as_view(), name='events'),
+    path('uploads/<uuid:pk>/', views.UploadView.as_view(), name='upload'),
     path('', include(router.urls)),
 ]
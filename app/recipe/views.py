@@ -1,6 +1,8 @@
 """
 Views for the recipe API.
 """
+import json
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -12,19 +14,117 @@ from rest_framework import (
     mixins,
     status,
 )
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
+from core import (
+    autocomplete,
+    coalescing,
+    direct_uploads,
+    events,
+    routers,
+    similar,
+    stats,
+    sync,
+    uploads,
+)
+from core.serializers import (
+    DirectUploadSerializer,
+    DirectUploadConfirmSerializer,
+)
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    Tombstone,
+    Upload,
 )
 from recipe import serializers
 
 
+class ReplicaReadMixin:
+    """
+    Serve safe requests from a read replica, except for users who
+    wrote recently so they always see their own changes.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        """Pick the database for reads once the user is known."""
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and not routers.is_pinned_to_primary(request.user)
+        ):
+            routers.use_read_alias(routers.choose_replica())
+
+    def dispatch(self, request, *args, **kwargs):
+        """Handle the request, then pin writers to the primary."""
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            routers.use_read_alias(None)
+
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            routers.pin_to_primary(self.request.user)
+        return response
+
+
+class CoalescedReadMixin:
+    """
+    Compute identical concurrent reads of a user once and share the
+    result, i.e. app start storms of the same list request.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.coalesced(super().list, request, *args, **kwargs)
+
+    def coalesced(self, handler, request, *args, **kwargs):
+        """Call a read handler once per identical in-flight request."""
+        key = ':'.join([
+            str(request.user.pk),
+            str(coalescing.generation(request.user)),
+            request.get_full_path(),
+        ])
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            return response.status_code, response.data
+
+        (status_code, data), coalesced = coalescing.single_flight.do(
+            key, compute
+        )
+        response = Response(data, status=status_code)
+        if coalesced:
+            response['X-Coalesced'] = '1'
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        """Handle the request, then stop sharing reads older than writes."""
+        response = super().dispatch(request, *args, **kwargs)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            coalescing.invalidate(self.request.user)
+        return response
+
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
@@ -37,16 +137,40 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredients IDs to filter'
-            )
+            ),
+            OpenApiParameter(
+                'min_price',
+                OpenApiTypes.DECIMAL,
+                description='Filter by price, at least this'
+            ),
+            OpenApiParameter(
+                'max_price',
+                OpenApiTypes.DECIMAL,
+                description='Filter by price, at most this'
+            ),
+            OpenApiParameter(
+                'max_time',
+                OpenApiTypes.INT,
+                description='Filter by cooking time, at most these minutes'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(serializers.RECIPE_ORDERINGS),
+                description='Sort order, newest first by default'
+            ),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin,
+                    CoalescedReadMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    load_shedding_priority = {'upload_image': 'bulk'}
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
@@ -54,19 +178,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != 'list':
+            # Filters and ordering are the list's, detail actions ignore them
+            return queryset
+
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
+        params = serializers.RecipeFilterSerializer(
+            data=self.request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
         if tags:
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        if tags or ingredients:
+            # Only joins repeat recipes, DISTINCT would stop the indexes
+            # from serving the order
+            queryset = queryset.distinct()
+        if 'min_price' in filters:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+        if 'max_time' in filters:
+            queryset = queryset.filter(time_minutes__lte=filters['max_time'])
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        return queryset.order_by(
+            *serializers.RECIPE_ORDERINGS[filters['ordering']]
+        )
 
     def get_serializer_class(self):
         """Return the serializer_class for request."""
@@ -74,9 +217,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'create_upload':
+            return serializers.UploadSerializer
+        elif self.action == 'image_upload_url':
+            return DirectUploadSerializer
+        elif self.action == 'confirm_image_upload':
+            return DirectUploadConfirmSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
 
         return self.serializer_class  # i.e RecipeDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        return self.coalesced(super().retrieve, request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe w.r.t current authenticated user."""
         serializer.save(user=self.request.user)
@@ -93,6 +247,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of recipes, 10 by default'
+            ),
+        ],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """
+        List the user's recipes sharing the most tags and ingredients
+        with the recipe, most similar first.
+        """
+        recipe = self.get_object()
+        params = serializers.SimilarRecipeFilterSerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        recipes = similar.similar_recipes(
+            recipe, params.validated_data['limit'],
+        ).prefetch_related('tags', 'ingredients')
+
+        return Response(self.get_serializer(recipes, many=True).data)
+
+    @extend_schema(responses={201: serializers.UploadSerializer})
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def create_upload(self, request, pk=None):
+        """
+        Start a resumable upload of the recipe's image, for clients on
+        flaky networks. Send the file in parts to the returned location.
+        """
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = uploads.create(
+            request.user, recipe, **serializer.validated_data
+        )
+
+        return Response(
+            self.get_serializer(upload).data,
+            status=status.HTTP_201_CREATED,
+            headers={'Location': reverse('recipe:upload', args=[upload.id])},
+        )
+
+    @extend_schema(responses={201: DirectUploadSerializer})
+    @action(methods=['POST'], detail=True, url_path='image-upload-url')
+    def image_upload_url(self, request, pk=None):
+        """
+        Get a URL to upload the recipe's image straight to object
+        storage, then confirm the upload with the returned token.
+        """
+        if not direct_uploads.enabled():
+            raise NotFound('Direct uploads are not enabled.')
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = direct_uploads.presign(
+            recipe, 'image', serializer.validated_data['content_type'],
+        )
+
+        return Response(
+            self.get_serializer(upload).data, status=status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(responses=serializers.RecipeImageSerializer)
+    @action(methods=['POST'], detail=True, url_path='confirm-image-upload')
+    def confirm_image_upload(self, request, pk=None):
+        """Validate an image uploaded to object storage and attach it."""
+        if not direct_uploads.enabled():
+            raise NotFound('Direct uploads are not enabled.')
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            direct_uploads.confirm(
+                recipe, 'image', serializer.validated_data['token'],
+            )
+        except direct_uploads.InvalidUpload as exc:
+            raise ValidationError({'token': [str(exc)]})
+
+        return Response(serializers.RecipeImageSerializer(
+            recipe, context=self.get_serializer_context(),
+        ).data)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -101,11 +342,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes'
-            )
+            ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Autocomplete names starting with, or similar '
+                            'to, this. Returns the best matches only.'
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of matches for q, 10 by default'
+            ),
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            CoalescedReadMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
@@ -126,10 +380,20 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
         # Add additional filter of recipe associated with value
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
+        queryset = queryset.filter(user=self.request.user)
+
+        if self.action == 'list':
+            params = serializers.RecipeAttrFilterSerializer(
+                data=self.request.query_params
+            )
+            params.is_valid(raise_exception=True)
+            q = params.validated_data.get('q')
+            if q:
+                return autocomplete.complete(
+                    queryset, q, params.validated_data['limit'],
+                )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+        return queryset.order_by('-name').distinct()
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -142,3 +406,310 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.STR,
+            description='Token of the last sync, omit to get all objects'
+        )
+    ],
+    responses=serializers.SyncSerializer,
+)
+class SyncView(APIView):
+    """Return the user's objects changed or deleted since the last sync."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    # Response field -> model of the synced objects
+    synced_models = {
+        'recipes': Recipe,
+        'tags': Tag,
+        'ingredients': Ingredient,
+    }
+
+    def _parse_since(self, request):
+        """Return the time of the 'since' token, None for a full sync."""
+        token = request.query_params.get('since')
+        if not token:
+            return None
+        try:
+            return sync.parse_token(token)
+        except (ValueError, OverflowError):
+            raise ValidationError({'since': 'Invalid sync token.'})
+
+    def _any_changed(self, querysets):
+        """Check for any rows in one round trip of index probes."""
+        first, *rest = [queryset.values('pk')[:1] for queryset in querysets]
+        return first.union(*rest, all=True).exists()
+
+    def get(self, request):
+        token = sync.current_token()
+        since = self._parse_since(request)
+        # Tombstones before the horizon may be pruned, so start over
+        reset = since is None or since < sync.tombstone_horizon()
+
+        serializer = serializers.SyncSerializer(
+            {
+                'token': token,
+                'reset': reset,
+                **self.changes(request.user, None if reset else since),
+            },
+            context={'request': request},
+        )
+        return Response(serializer.data)
+
+    def changes(self, user, since):
+        """Return objects changed and IDs deleted since a time, or all."""
+        changed = {
+            name: model.objects.filter(user=user)
+            for name, model in self.synced_models.items()
+        }
+        deleted = {name: [] for name in self.synced_models}
+        if since is not None:
+            changed = {
+                name: queryset.filter(updated_at__gt=since)
+                for name, queryset in changed.items()
+            }
+            tombstones = Tombstone.objects.filter(
+                user=user, deleted_at__gt=since,
+            )
+            if not self._any_changed([*changed.values(), tombstones]):
+                return {**{name: [] for name in changed}, 'deleted': deleted}
+
+            names = {
+                model._meta.model_name: name
+                for name, model in self.synced_models.items()
+            }
+            for model_name, object_id in tombstones.values_list(
+                'model', 'object_id',
+            ):
+                deleted[names[model_name]].append(object_id)
+
+        changed['recipes'] = changed['recipes'].prefetch_related(
+            'tags', 'ingredients',
+        )
+        return {**changed, 'deleted': deleted}
+
+
+class RecipeStatsView(APIView):
+    """
+    Return the user's recipe count, average time and price, recipes
+    per price range and most used tags and ingredients.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses=serializers.RecipeStatsSerializer)
+    def get(self, request):
+        return Response(serializers.RecipeStatsSerializer(
+            stats.user_stats(request.user),
+        ).data)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'recipes',
+            OpenApiTypes.STR,
+            required=True,
+            description='Comma separated list of recipe IDs to shop for'
+        )
+    ],
+    responses=serializers.ShoppingListItemSerializer(many=True),
+)
+class ShoppingListView(APIView):
+    """
+    Return the ingredients of several of the user's recipes, each once
+    with the recipes needing it, ordered by name.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = serializers.ShoppingListFilterSerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        # One grouped query over the links, instead of a recipe at a time
+        items = Recipe.ingredients.through.objects.filter(
+            recipe_id__in=params.validated_data['recipes'],
+            recipe__user=request.user,
+        ).values(
+            'ingredient_id', 'ingredient__name',
+        ).annotate(
+            recipes=ArrayAgg('recipe_id', ordering='recipe_id'),
+        ).order_by('ingredient__name', 'ingredient_id')
+
+        return Response(
+            serializers.ShoppingListItemSerializer(items, many=True).data
+        )
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renders errors for clients asking for server-sent events."""
+    media_type = 'text/event-stream'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f'event: error\ndata: {json.dumps(data)}\n\n'
+
+
+@extend_schema(responses={(200, 'text/event-stream'): OpenApiTypes.STR})
+class EventStreamView(APIView):
+    """
+    Stream the user's recipe, tag and ingredient changes as server-sent
+    events, instead of polling. Sync after (re)connecting and on
+    'resync' events to catch up on changes while disconnected.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        try:
+            subscription = events.subscribe(request.user.pk)
+        except events.TooManyStreams:
+            return Response(
+                {'detail': 'Too many event streams, please retry later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '10'},
+            )
+        # Streaming runs no queries, don't hold connections for minutes
+        for conn in connections.all(initialized_only=True):
+            if not conn.in_atomic_block:
+                conn.close()
+        response = StreamingHttpResponse(
+            events.EventStream(
+                subscription,
+                settings.EVENTS_HEARTBEAT,
+                settings.EVENTS_MAX_STREAM_SECONDS,
+            ),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx to pass events on instead of buffering them
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@extend_schema_view(
+    patch=extend_schema(
+        request={'application/offset+octet-stream': OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                'Upload-Offset',
+                OpenApiTypes.INT,
+                location=OpenApiParameter.HEADER,
+                required=True,
+                description='Offset of the part, the upload\'s offset'
+            )
+        ],
+        responses=serializers.UploadSerializer,
+    ),
+    delete=extend_schema(responses={204: None}),
+)
+class UploadView(APIView):
+    """
+    Resumable upload of a recipe image. GET (or HEAD) tells how much
+    was received, PATCH appends the next part and attaches the image
+    once complete, DELETE cancels.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = serializers.UploadSerializer
+    load_shedding_priority = 'bulk'
+
+    def get_object(self, pk):
+        return get_object_or_404(Upload, pk=pk, user=self.request.user)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, uploads.UploadGone):
+            return Response(
+                {'detail': 'The upload expired, start a new one.'},
+                status=status.HTTP_410_GONE,
+            )
+        return super().handle_exception(exc)
+
+    def upload_response(self, upload):
+        return Response(
+            self.serializer_class(upload).data,
+            headers={
+                'Upload-Offset': str(uploads.offset(upload)),
+                'Upload-Length': str(upload.length),
+            },
+        )
+
+    def get(self, request, pk):
+        return self.upload_response(self.get_object(pk))
+
+    def patch(self, request, pk):
+        upload = self.get_object(pk)
+        if request.content_type != 'application/offset+octet-stream':
+            return Response(
+                {'detail': 'Send parts as application/offset+octet-stream.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        try:
+            at_offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            raise ValidationError({'Upload-Offset': 'Must be an integer.'})
+        if upload.completed_at:
+            return self.upload_response(upload)
+
+        try:
+            received = uploads.append(
+                upload,
+                request.stream,
+                at_offset,
+                int(request.META.get('CONTENT_LENGTH') or 0),
+            )
+        except uploads.OffsetMismatch:
+            response = self.upload_response(upload)
+            response.status_code = status.HTTP_409_CONFLICT
+            return response
+        except uploads.UploadBusy:
+            return Response(
+                {'detail': 'Another part is being received.'},
+                status=status.HTTP_423_LOCKED,
+            )
+
+        if received == upload.length:
+            return self.attach(upload)
+        return self.upload_response(upload)
+
+    def attach(self, upload):
+        """Validate the assembled file and set it as the recipe image."""
+        with transaction.atomic():
+            # Concurrent final parts wait here, then find it attached
+            upload = Upload.objects.select_for_update().filter(
+                pk=upload.pk,
+            ).first()
+            if upload is None:
+                raise uploads.UploadGone()
+            if upload.completed_at:
+                return self.upload_response(upload)
+
+            with uploads.open_part(upload) as part:
+                serializer = serializers.RecipeImageSerializer(
+                    upload.recipe, data={'image': part},
+                )
+                if not serializer.is_valid():
+                    uploads.expire_upload(upload.id)
+                    return Response(
+                        serializer.errors,
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                serializer.save()
+
+            uploads.finish(upload)
+        # Like writes through the recipe API, the owner sees the image
+        if settings.DATABASE_REPLICAS:
+            routers.pin_to_primary(self.request.user)
+        coalescing.invalidate(self.request.user)
+        return self.upload_response(upload)
+
+    def delete(self, request, pk):
+        uploads.expire_upload(self.get_object(pk).id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
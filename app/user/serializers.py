@@ -8,9 +8,12 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from core.serializers import ImageUploadField
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object."""
+    image = ImageUploadField(required=False, allow_null=True)
 
     class Meta:
         model = get_user_model()
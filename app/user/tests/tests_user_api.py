@@ -1,7 +1,12 @@
 """
 Tests for the user API.
 """
-from django.test import TestCase
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -12,6 +17,8 @@ from rest_framework import status
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+IMAGE_UPLOAD_URL = reverse('user:image-upload-url')
+CONFIRM_IMAGE_UPLOAD_URL = reverse('user:confirm-image-upload')
 
 
 def create_user(**params):
@@ -151,3 +158,39 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='media')
+class UserImageUploadApiTests(TestCase):
+    """Test uploading the user's image straight to object storage."""
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @patch('core.direct_uploads.client')
+    @patch('core.direct_uploads.bucket')
+    def test_upload_user_image(self, mock_bucket, mock_client):
+        """Test presigning then confirming an upload sets the image."""
+        image_file = BytesIO()
+        Image.new('RGB', (10, 10)).save(image_file, format='PNG')
+        obj = mock_bucket.return_value.Object.return_value
+        obj.content_length = len(image_file.getvalue())
+        obj.get.return_value = {'Body': image_file}
+        image_file.seek(0)
+
+        upload = self.client.post(
+            IMAGE_UPLOAD_URL, {'content_type': 'image/png'},
+        ).data
+        res = self.client.post(
+            CONFIRM_IMAGE_UPLOAD_URL, {'token': upload['token']},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.image.name.startswith('direct/'))
+        self.assertTrue(self.user.image.name.endswith('.png'))
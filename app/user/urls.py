@@ -12,4 +12,14 @@ urlpatterns = [
     path('create/', views.CreateUserView().as_view(), name='create'),
     path('token/', views.CreateTokenView().as_view(), name='token'),
     path('me/', views.ManageUserView().as_view(), name='me'),
+    path(
+        'me/image-upload-url/',
+        views.UserImageUploadURLView.as_view(),
+        name='image-upload-url',
+    ),
+    path(
+        'me/confirm-image-upload/',
+        views.ConfirmUserImageUploadView.as_view(),
+        name='confirm-image-upload',
+    ),
 ]
@@ -1,10 +1,18 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, authentication, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import direct_uploads
+from core.serializers import (
+    DirectUploadSerializer,
+    DirectUploadConfirmSerializer,
+)
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
@@ -20,6 +28,8 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
@@ -27,7 +37,56 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     authentication_class = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    load_shedding_priority = 'critical'
 
     def get_object(self):
         """Retrieve and return the authenticated user."""
         return self.request.user
+
+
+class UserImageUploadURLView(generics.GenericAPIView):
+    """
+    Get a URL to upload the user's image straight to object storage,
+    then confirm the upload with the returned token.
+    """
+    serializer_class = DirectUploadSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses={201: DirectUploadSerializer})
+    def post(self, request):
+        if not direct_uploads.enabled():
+            raise NotFound('Direct uploads are not enabled.')
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = direct_uploads.presign(
+            request.user, 'image', serializer.validated_data['content_type'],
+        )
+
+        return Response(
+            self.get_serializer(upload).data, status=status.HTTP_201_CREATED,
+        )
+
+
+class ConfirmUserImageUploadView(generics.GenericAPIView):
+    """Validate an image uploaded to object storage and attach it."""
+    serializer_class = DirectUploadConfirmSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=UserSerializer)
+    def post(self, request):
+        if not direct_uploads.enabled():
+            raise NotFound('Direct uploads are not enabled.')
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            direct_uploads.confirm(
+                request.user, 'image', serializer.validated_data['token'],
+            )
+        except direct_uploads.InvalidUpload as exc:
+            raise ValidationError({'token': [str(exc)]})
+
+        return Response(UserSerializer(
+            request.user, context=self.get_serializer_context(),
+        ).data)
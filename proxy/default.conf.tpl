@@ -1,10 +1,43 @@
 server {
     listen ${LISTEN_PORT};
 
+    # Content-hashed assets from collectstatic (see staticfiles.json),
+    # served from their precompressed '.gz' siblings and cached forever
+    location ~ "^/static/static/.+\.[0-9a-f]{12}\.[A-Za-z0-9]+$" {
+        root            /vol;
+        gzip_static     on;
+        expires         max;
+        add_header      Cache-Control "public, immutable";
+    }
+
+    # Uploaded images are private, served to their owners only through
+    # the app at /api/media/
+    location /static/media/ {
+        return 404;
+    }
+
+    # Sent once the app authorized the request with X-Accel-Redirect,
+    # keeping the Cache-Control header it set
+    location /protected-media/ {
+        internal;
+        alias           /vol/static/media/;
+        sendfile        on;
+        tcp_nopush      on;
+    }
+
     location /static {
         alias /vol/static;
     }
 
+    # Upload parts go straight to the app, which writes them as they
+    # arrive, so an interrupted part still counts
+    location /api/recipe/uploads/ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        uwsgi_request_buffering off;
+        client_max_body_size    20M;
+    }
+
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
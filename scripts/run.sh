@@ -6,4 +6,10 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+# The master loads and warms up the app once, then forks the workers.
+# Set UWSGI_LAZY_APPS=1 to load the app separately in every worker instead.
+# The 'throttle' cache holds rate limit buckets shared by all workers.
+# Threads let long-lived event streams wait without holding a whole worker.
+# Keep LOAD_SHEDDING_MAX_IN_FLIGHT in line with --threads.
+uwsgi --socket :9000 --workers 4 --threads 8 --master --enable-threads --need-app --module app.wsgi \
+    --cache2 name=throttle,items=100000,blocksize=16